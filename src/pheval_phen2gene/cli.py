@@ -1,6 +1,14 @@
 import click
 
-from pheval_phen2gene.cli_phen2gene import prepare_commands_command, prepare_inputs_command
+from pheval_phen2gene.cli_phen2gene import (
+    enqueue_command,
+    incremental_rescore_command,
+    load_test_command,
+    prepare_commands_command,
+    prepare_inputs_command,
+    serve_command,
+    worker_command,
+)
 
 
 @click.group()
@@ -10,6 +18,11 @@ def main():
 
 main.add_command(prepare_inputs_command)
 main.add_command(prepare_commands_command)
+main.add_command(enqueue_command)
+main.add_command(worker_command)
+main.add_command(serve_command)
+main.add_command(load_test_command)
+main.add_command(incremental_rescore_command)
 
 if __name__ == "__main__":
     main()
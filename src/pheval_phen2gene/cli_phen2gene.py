@@ -1,10 +1,24 @@
+from functools import partial
 from pathlib import Path
 
 import click
+from pheval.config_parser import parse_input_dir_config
+from pheval.post_processing.post_processing import SortOrder
 from pheval.prepare.custom_exceptions import MutuallyExclusiveOptionError
+from pheval.utils.phenopacket_utils import GeneIdentifierUpdater, create_gene_identifier_map
 
-from pheval_phen2gene.prepare.prepare_commands import prepare_commands
+from pheval_phen2gene.prepare.normalise_hpo import (
+    DEFAULT_CACHE_FILE,
+    HpoNormaliser,
+    load_hpo_lookup,
+)
+from pheval_phen2gene.prepare.prepare_commands import iter_case_records, prepare_commands
 from pheval_phen2gene.prepare.prepare_inputs import prepare_inputs
+from pheval_phen2gene.run.fused import load_scorer
+from pheval_phen2gene.run.incremental import run_incremental_rescore
+from pheval_phen2gene.run.serve import MicroBatcher, create_server, load_test, request_score
+from pheval_phen2gene.run.work_queue import WorkQueue, default_worker_id, run_worker
+from pheval_phen2gene.tool_specific_configuration_parser import Phen2GeneToolSpecificConfigurations
 
 
 @click.command("prepare-inputs")
@@ -24,14 +38,51 @@ from pheval_phen2gene.prepare.prepare_inputs import prepare_inputs
     help="Path to output directory.",
     type=Path,
 )
-def prepare_inputs_command(phenopacket_dir: Path, output_dir: Path):
+@click.option(
+    "--compression",
+    "-c",
+    required=False,
+    default=None,
+    help="Compression for the output files.",
+    type=click.Choice(["gzip", "zstd"]),
+)
+@click.option(
+    "--normalise-hpo",
+    is_flag=True,
+    default=False,
+    help="Resolve alternate and obsolete HPO ids to current terms and drop unknown ids.",
+)
+@click.option(
+    "--hpo-lookup",
+    required=False,
+    default=DEFAULT_CACHE_FILE,
+    show_default=True,
+    metavar="PATH",
+    type=Path,
+    help="Path to the cached HPO lookup table, built from the HPO on first use.",
+)
+def prepare_inputs_command(
+    phenopacket_dir: Path,
+    output_dir: Path,
+    compression: str or None = None,
+    normalise_hpo: bool = False,
+    hpo_lookup: Path = DEFAULT_CACHE_FILE,
+):
     """
     Prepare input for Phen2Gene from a phenopacket directory.
     Args:
         phenopacket_dir (Path): Path to the phenopacket directory.
         output_dir (Path): Path to the directory to write the input txt files.
+        compression (str or None): Compression for the input txt files.
+        normalise_hpo (bool): Resolve alternate and obsolete HPO ids and drop unknown ids.
+        hpo_lookup (Path): Path to the cached HPO lookup table.
     """
-    prepare_inputs(output_dir=output_dir, phenopacket_dir=phenopacket_dir)
+    prepare_inputs(
+        output_dir=output_dir,
+        phenopacket_dir=phenopacket_dir,
+        compression=compression,
+        normaliser=HpoNormaliser(load_hpo_lookup(hpo_lookup)) if normalise_hpo else None,
+    )
 
 
 @click.command("prepare-commands")
@@ -102,6 +153,29 @@ def prepare_inputs_command(phenopacket_dir: Path, output_dir: Path):
     type=Path,
     help="Path to Phen2Gene python executable - not required if running with docker.",
 )
+@click.option(
+    "--compression",
+    "-c",
+    required=False,
+    default=None,
+    help="Compression for the batch file.",
+    type=click.Choice(["gzip", "zstd"]),
+)
+@click.option(
+    "--normalise-hpo",
+    is_flag=True,
+    default=False,
+    help="Resolve alternate and obsolete HPO ids to current terms and drop unknown ids.",
+)
+@click.option(
+    "--hpo-lookup",
+    required=False,
+    default=DEFAULT_CACHE_FILE,
+    show_default=True,
+    metavar="PATH",
+    type=Path,
+    help="Path to the cached HPO lookup table, built from the HPO on first use.",
+)
 def prepare_commands_command(
     environment: str,
     file_prefix: str,
@@ -111,6 +185,9 @@ def prepare_commands_command(
     phenopacket_dir: Path or None = None,
     input_dir: Path or None = None,
     phen2gene_py: Path or None = None,
+    compression: str or None = None,
+    normalise_hpo: bool = False,
+    hpo_lookup: Path = DEFAULT_CACHE_FILE,
 ):
     """
     Prepare commands for Phen2Gene.
@@ -123,6 +200,9 @@ def prepare_commands_command(
         phenopacket_dir (Path or None): Path to the Phenopacket directory.
         input_dir (Path or None): Path to the input file directory.
         phen2gene_py (Path or None): Path to the Phen2Gene python executable file.
+        compression (str or None): Compression for the batch file.
+        normalise_hpo (bool): Resolve alternate and obsolete HPO ids and drop unknown ids.
+        hpo_lookup (Path): Path to the cached HPO lookup table.
     """
     output_dir.joinpath("tool_input_commands").mkdir(parents=True, exist_ok=True)
     prepare_commands(
@@ -134,4 +214,308 @@ def prepare_commands_command(
         phenopacket_dir,
         input_dir,
         phen2gene_py,
+        compression,
+        normaliser=HpoNormaliser(load_hpo_lookup(hpo_lookup)) if normalise_hpo else None,
+    )
+
+
+@click.command("enqueue")
+@click.option(
+    "--batch-file",
+    "-b",
+    required=True,
+    metavar="PATH",
+    type=Path,
+    help="Path to the Phen2Gene batch file to enqueue.",
+)
+@click.option(
+    "--queue-dir",
+    "-q",
+    required=True,
+    metavar="PATH",
+    type=Path,
+    help="Path to the shared work queue directory.",
+)
+def enqueue_command(batch_file: Path, queue_dir: Path):
+    """
+    Enqueue the commands of a local Phen2Gene batch file into a shared work queue.
+    Args:
+        batch_file (Path): Path to the Phen2Gene batch file.
+        queue_dir (Path): Path to the shared work queue directory.
+    """
+    enqueued = WorkQueue(queue_dir).enqueue_batch(batch_file)
+    print(f"enqueued {enqueued} commands")
+
+
+@click.command("worker")
+@click.option(
+    "--queue-dir",
+    "-q",
+    required=True,
+    metavar="PATH",
+    type=Path,
+    help="Path to the shared work queue directory.",
+)
+@click.option(
+    "--lease-seconds",
+    "-l",
+    required=False,
+    default=300,
+    show_default=True,
+    type=float,
+    help="Seconds without a heartbeat before a claimed command is re-queued.",
+)
+@click.option(
+    "--worker-id",
+    "-w",
+    required=False,
+    type=str,
+    help="Identifier for this worker, defaults to hostname and process id. Must not contain @.",
+)
+@click.option(
+    "--compression",
+    "-c",
+    required=False,
+    default=None,
+    help="Compression for the raw results.",
+    type=click.Choice(["gzip", "zstd"]),
+)
+def worker_command(
+    queue_dir: Path,
+    lease_seconds: float,
+    worker_id: str or None = None,
+    compression: str or None = None,
+):
+    """
+    Claim and run Phen2Gene commands from a shared work queue until it is drained.
+    Args:
+        queue_dir (Path): Path to the shared work queue directory.
+        lease_seconds (float): Seconds without a heartbeat before a claimed command is re-queued.
+        worker_id (str or None): Identifier for this worker.
+        compression (str or None): Compression for the raw results.
+    """
+    worker_id = default_worker_id() if worker_id is None else worker_id
+    completed = run_worker(
+        WorkQueue(queue_dir, lease_seconds=lease_seconds), worker_id, compression=compression
+    )
+    print(f"worker {worker_id} completed {completed} commands")
+
+
+@click.command("serve")
+@click.option(
+    "--scorer",
+    "-s",
+    required=True,
+    type=str,
+    help="In-process Phen2Gene scoring function as module:function.",
+)
+@click.option(
+    "--score-order",
+    required=False,
+    default="descending",
+    show_default=True,
+    type=click.Choice(["ascending", "descending"]),
+    help="The order of the scores.",
+)
+@click.option(
+    "--host", required=False, default="127.0.0.1", show_default=True, type=str, help="Host."
+)
+@click.option("--port", required=False, default=8080, show_default=True, type=int, help="Port.")
+@click.option(
+    "--unix-socket",
+    "-u",
+    required=False,
+    type=str,
+    help="Path to a Unix socket to listen on instead of a port.",
+)
+@click.option(
+    "--max-batch-size",
+    required=False,
+    default=32,
+    show_default=True,
+    type=int,
+    help="Maximum number of concurrent requests scored together.",
+)
+@click.option(
+    "--max-wait-ms",
+    required=False,
+    default=5.0,
+    show_default=True,
+    type=float,
+    help="Milliseconds to wait for concurrent requests to fill a batch.",
+)
+def serve_command(
+    scorer: str,
+    score_order: str,
+    host: str,
+    port: int,
+    unix_socket: str or None,
+    max_batch_size: int,
+    max_wait_ms: float,
+):
+    """
+    Serve warm Phen2Gene rankings of single patients over local HTTP or a Unix socket.
+    Args:
+        scorer (str): In-process Phen2Gene scoring function as module:function.
+        score_order (str): The order of the scores, either ascending or descending.
+        host (str): The host to listen on.
+        port (int): The port to listen on.
+        unix_socket (str or None): Path to a Unix socket to listen on instead of a port.
+        max_batch_size (int): Maximum number of concurrent requests scored together.
+        max_wait_ms (float): Milliseconds to wait for concurrent requests to fill a batch.
+    """
+    batcher = MicroBatcher(
+        scorer=load_scorer(scorer),
+        gene_identifier_updator=GeneIdentifierUpdater(
+            identifier_map=create_gene_identifier_map(), gene_identifier="ensembl_id"
+        ),
+        sort_order=SortOrder.ASCENDING if score_order == "ascending" else SortOrder.DESCENDING,
+        max_batch_size=max_batch_size,
+        max_wait_seconds=max_wait_ms / 1000,
+    )
+    server = create_server(batcher, host=host, port=port, unix_socket=unix_socket)
+    print(f"serving phen2gene on {unix_socket or f'http://{host}:{port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+@click.command("load-test")
+@click.option(
+    "--phenopacket-dir",
+    "-p",
+    metavar="Path",
+    required=True,
+    type=Path,
+    help="Path to a phenopacket directory or archive to take patient HPO ids from.",
+)
+@click.option(
+    "--host", required=False, default="127.0.0.1", show_default=True, type=str, help="Host."
+)
+@click.option("--port", required=False, default=8080, show_default=True, type=int, help="Port.")
+@click.option(
+    "--unix-socket",
+    "-u",
+    required=False,
+    type=str,
+    help="Path to the Unix socket of the server.",
+)
+@click.option(
+    "--requests",
+    "-n",
+    required=False,
+    default=1000,
+    show_default=True,
+    type=int,
+    help="Number of requests to send.",
+)
+@click.option(
+    "--concurrency",
+    "-c",
+    required=False,
+    default=16,
+    show_default=True,
+    type=int,
+    help="Number of requests in flight at once.",
+)
+def load_test_command(
+    phenopacket_dir: Path,
+    host: str,
+    port: int,
+    unix_socket: str or None,
+    requests: int,
+    concurrency: int,
+):
+    """
+    Load test a Phen2Gene scoring server, reporting p50/p99 latency and throughput.
+    Args:
+        phenopacket_dir (Path): Path to a phenopacket directory or archive.
+        host (str): The host of the server.
+        port (int): The port of the server.
+        unix_socket (str or None): Path to the Unix socket of the server.
+        requests (int): Number of requests to send.
+        concurrency (int): Number of requests in flight at once.
+    """
+    hpo_id_sets = [case.hpo_ids for case in iter_case_records(phenopacket_dir, None)]
+    report = load_test(
+        partial(request_score, host=host, port=port, unix_socket=unix_socket),
+        hpo_id_sets,
+        requests,
+        concurrency,
+    )
+    print(
+        f"{report.requests} requests, {report.failed} failed, p50 {report.p50_ms:.1f} ms, "
+        f"p99 {report.p99_ms:.1f} ms, {report.throughput:.1f} requests/s"
+    )
+
+
+@click.command("incremental-rescore")
+@click.option(
+    "--input-dir",
+    "-i",
+    metavar="Path",
+    required=True,
+    type=Path,
+    help="Path to the PhEval input directory with the upgraded Phen2Gene data directory and config.yaml.",
+)
+@click.option(
+    "--testdata-dir",
+    "-t",
+    metavar="Path",
+    required=True,
+    type=Path,
+    help="Path to the test data directory.",
+)
+@click.option(
+    "--old-data-dir",
+    metavar="Path",
+    required=True,
+    type=Path,
+    help="Path to the Phen2Gene data directory used by the previous run.",
+)
+@click.option(
+    "--previous-run-dir",
+    metavar="Path",
+    required=True,
+    type=Path,
+    help="Path to the output directory of the previous run.",
+)
+@click.option(
+    "--output-dir",
+    "-o",
+    metavar="Path",
+    required=True,
+    type=Path,
+    help="Path to the output directory of the new run.",
+)
+def incremental_rescore_command(
+    input_dir: Path,
+    testdata_dir: Path,
+    old_data_dir: Path,
+    previous_run_dir: Path,
+    output_dir: Path,
+):
+    """
+    Re-run a corpus after a Phen2Gene data or gene identifier upgrade, re-scoring only affected cases.
+    Affected cases are re-scored with the tool specific configuration of the input directory.
+    Args:
+        input_dir (Path): Path to the PhEval input directory with the upgraded Phen2Gene data directory.
+        testdata_dir (Path): Path to the test data directory.
+        old_data_dir (Path): Path to the Phen2Gene data directory used by the previous run.
+        previous_run_dir (Path): Path to the output directory of the previous run.
+        output_dir (Path): Path to the output directory of the new run.
+    """
+    run_incremental_rescore(
+        config=Phen2GeneToolSpecificConfigurations.parse_obj(
+            parse_input_dir_config(input_dir).tool_specific_configuration_options
+        ),
+        input_dir=input_dir,
+        testdata_dir=testdata_dir,
+        old_data_dir=old_data_dir,
+        previous_run_dir=previous_run_dir,
+        output_dir=output_dir,
     )
@@ -0,0 +1,87 @@
+import gzip
+import os
+import shutil
+from pathlib import Path
+from typing import IO
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def compressed_path(path: Path, compression: str or None) -> Path:
+    """
+    Get the path of a file once compressed with the given compression.
+    Args:
+        path (Path): Path to the uncompressed file.
+        compression (str or None): The compression, either gzip, zstd or None.
+    Returns:
+        Path: Path to the compressed file.
+    """
+    if compression is None:
+        return path
+    return path.with_name(path.name + COMPRESSION_SUFFIXES[compression])
+
+
+def is_compressed(path: Path) -> bool:
+    """
+    Check whether a file is compressed, judging by its suffix.
+    Args:
+        path (Path): Path to the file.
+    Returns:
+        bool: True if the file is compressed.
+    """
+    return path.suffix in COMPRESSION_SUFFIXES.values()
+
+
+def uncompressed_path(path: Path) -> Path:
+    """
+    Get the path of a file with any compression suffix removed.
+    Args:
+        path (Path): Path to the file.
+    Returns:
+        Path: Path to the file without the compression suffix.
+    """
+    return path.with_suffix("") if is_compressed(path) else path
+
+
+def open_file(path: Path, mode: str = "rt") -> IO:
+    """
+    Open a file, transparently compressing or decompressing it as a stream based on its suffix.
+    Args:
+        path (Path): Path to the file.
+        mode (str): The mode to open the file with.
+    Returns:
+        IO: The opened file.
+    """
+    if path.suffix == COMPRESSION_SUFFIXES["gzip"]:
+        return gzip.open(path, mode)
+    if path.suffix == COMPRESSION_SUFFIXES["zstd"]:
+        if zstandard is None:
+            raise ImportError(
+                "zstandard must be installed to read or write zstd compressed files, "
+                "install pheval-phen2gene[zstd]."
+            )
+        return zstandard.open(path, mode)
+    return open(path, mode)
+
+
+def compress_file(path: Path, compression: str) -> Path:
+    """
+    Compress a file in place, replacing the uncompressed file.
+    Args:
+        path (Path): Path to the uncompressed file.
+        compression (str): The compression, either gzip or zstd.
+    Returns:
+        Path: Path to the compressed file.
+    """
+    output_path = compressed_path(path, compression)
+    tmp_path = output_path.with_name(f".tmp-{output_path.name}")
+    with open(path, "rb") as uncompressed, open_file(tmp_path, "wb") as compressed:
+        shutil.copyfileobj(uncompressed, compressed)
+    os.replace(tmp_path, output_path)
+    path.unlink()
+    return output_path
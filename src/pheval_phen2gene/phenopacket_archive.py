@@ -0,0 +1,175 @@
+import json
+import os
+import shutil
+import tarfile
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple, Union
+
+from google.protobuf.json_format import ParseDict
+from phenopackets import Family, Phenopacket
+from pheval.post_processing.phenopacket_truth_set import PhenopacketTruthSet
+from pheval.utils.phenopacket_utils import (
+    PhenopacketUtil,
+    ProbandCausativeGene,
+    phenopacket_reader,
+)
+
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".zip")
+
+
+def is_archive(path: Path) -> bool:
+    """
+    Check whether a path is a tar or zip archive, judging by its suffix.
+    Args:
+        path (Path): Path to check.
+    Returns:
+        bool: True if the path is an archive.
+    """
+    return path.name.endswith(ARCHIVE_SUFFIXES)
+
+
+def resolve_phenopacket_dir(testdata_dir: Path) -> Path:
+    """
+    Find the phenopackets of a testdata directory, either as a directory or as an archive.
+    Args:
+        testdata_dir (Path): Path to the testdata directory.
+    Returns:
+        Path: Path to the phenopacket directory or archive.
+    """
+    phenopacket_dir = Path(testdata_dir).joinpath("phenopackets")
+    if phenopacket_dir.is_dir():
+        return phenopacket_dir
+    for suffix in ARCHIVE_SUFFIXES:
+        phenopacket_archive = phenopacket_dir.with_name(phenopacket_dir.name + suffix)
+        if phenopacket_archive.exists():
+            return phenopacket_archive
+    return phenopacket_dir
+
+
+def parse_phenopacket(contents: bytes) -> Union[Phenopacket, Family]:
+    """
+    Parse the contents of a Phenopacket file as a Phenopacket or Family object.
+    Args:
+        contents (bytes): Contents of the Phenopacket file.
+    Returns:
+        Union[Phenopacket, Family]: Contents of the Phenopacket file as a Phenopacket or Family object
+    """
+    phenopacket = json.loads(contents)
+    if "proband" in phenopacket:
+        return ParseDict(phenopacket, Family())
+    return ParseDict(phenopacket, Phenopacket())
+
+
+def iter_archive_members(phenopacket_archive: Path) -> Iterator[Tuple[str, bytes]]:
+    """
+    Stream the JSON members of a tar or zip archive without extracting them to disk.
+    Args:
+        phenopacket_archive (Path): Path to the archive.
+    Yields:
+        Tuple[str, bytes]: File name and contents of each JSON member.
+    """
+    if phenopacket_archive.suffix == ".zip":
+        with zipfile.ZipFile(phenopacket_archive) as archive:
+            for member in archive.infolist():
+                if not member.is_dir() and member.filename.endswith(".json"):
+                    yield Path(member.filename).name, archive.read(member)
+        return
+    with tarfile.open(phenopacket_archive, "r|*") as archive:
+        for member in archive:
+            if member.isfile() and member.name.endswith(".json"):
+                yield Path(member.name).name, archive.extractfile(member).read()
+
+
+def iter_phenopackets(
+    phenopacket_dir: Path,
+) -> Iterator[Tuple[str, Union[Phenopacket, Family]]]:
+    """
+    Yield the phenopackets of a phenopacket directory or archive.
+    Args:
+        phenopacket_dir (Path): Path to the phenopacket directory or archive.
+    Yields:
+        Tuple[str, Union[Phenopacket, Family]]: File name and contents of each phenopacket.
+    """
+    if is_archive(phenopacket_dir):
+        for file_name, contents in iter_archive_members(phenopacket_dir):
+            yield file_name, parse_phenopacket(contents)
+        return
+    with os.scandir(phenopacket_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(".json"):
+                yield entry.name, phenopacket_reader(Path(entry.path))
+
+
+class ArchivePhenopacketTruthSet(PhenopacketTruthSet):
+    """Class for finding the causative genes of the phenopackets in an archive."""
+
+    def __init__(self, phenopacket_archive: Path):
+        """
+        Initialise the ArchivePhenopacketTruthSet class, reading the archive in a single pass.
+        Args:
+            phenopacket_archive (Path): Path to the phenopacket archive.
+        """
+        super().__init__(phenopacket_archive)
+        self.causative_genes: Dict[str, List[ProbandCausativeGene]] = {
+            Path(file_name).stem: PhenopacketUtil(phenopacket).diagnosed_genes()
+            for file_name, phenopacket in iter_phenopackets(phenopacket_archive)
+        }
+
+    def _get_causative_genes(self, phenopacket_name: str) -> List[ProbandCausativeGene]:
+        """
+        Get the causative genes for a given phenopacket.
+        Args:
+            phenopacket_name (str): Name of the phenopacket.
+        Returns:
+            List[ProbandCausativeGene]: List of ProbandCausativeGene.
+        """
+        if phenopacket_name not in self.causative_genes:
+            raise FileNotFoundError(phenopacket_name + " not found in corpus!")
+        return self.causative_genes[phenopacket_name]
+
+
+def archive_directory(directory: Path) -> Path:
+    """
+    Move the files of a directory, including those of any partition subdirectories, into a tar.gz
+    archive beside it.
+    Args:
+        directory (Path): Path to the directory.
+    Returns:
+        Path: Path to the archive.
+    """
+    archive_path = directory.with_name(directory.name + ".tar.gz")
+    with tarfile.open(archive_path, "w:gz") as archive:
+        for root, _dirs, files in os.walk(directory, topdown=False):
+            for file_name in files:
+                file_path = os.path.join(root, file_name)
+                archive.add(file_path, arcname=os.path.relpath(file_path, directory))
+                os.unlink(file_path)
+            if root != str(directory):
+                os.rmdir(root)
+    return archive_path
+
+
+def restore_archived_directory(directory: Path) -> bool:
+    """
+    Move the files of a directory archived by archive_directory back into the directory, so that
+    they can be read again. Nothing is done if the directory still holds files or has no archive.
+    Args:
+        directory (Path): Path to the directory.
+    Returns:
+        bool: True if the directory was restored from its archive.
+    """
+    archive_path = directory.with_name(directory.name + ".tar.gz")
+    if not archive_path.is_file() or (directory.is_dir() and any(directory.iterdir())):
+        return False
+    with tarfile.open(archive_path, "r:gz") as archive:
+        for member in archive:
+            member_path = Path(member.name)
+            if not member.isfile() or member_path.is_absolute() or ".." in member_path.parts:
+                continue
+            restored_file = directory.joinpath(member_path)
+            restored_file.parent.mkdir(parents=True, exist_ok=True)
+            with archive.extractfile(member) as source, open(restored_file, "wb") as destination:
+                shutil.copyfileobj(source, destination)
+    archive_path.unlink()
+    return True
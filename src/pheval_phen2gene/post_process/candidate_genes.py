@@ -0,0 +1,86 @@
+from pathlib import Path
+from typing import Set
+
+from pheval_phen2gene.file_io import open_file
+
+CANDIDATE_GENE_SUFFIXES = (".txt", ".vcf", ".vcf.gz")
+
+
+def find_candidate_genes_file(case_id: str, candidate_genes_dir: Path) -> Path or None:
+    """
+    Find the candidate gene list or VCF of a case.
+    Args:
+        case_id (str): Name of the case.
+        candidate_genes_dir (Path): Path to the directory of candidate gene files.
+    Returns:
+        Path or None: Path to the candidate gene file, or None if the case has none.
+    """
+    for suffix in CANDIDATE_GENE_SUFFIXES:
+        candidate_genes_file = candidate_genes_dir.joinpath(case_id + suffix)
+        if candidate_genes_file.is_file():
+            return candidate_genes_file
+    return None
+
+
+def _annotation_genes(annotations: str, symbol_index: int) -> Set[str]:
+    """Extract the gene symbols at a position of pipe separated ANN or CSQ annotations."""
+    genes = set()
+    for annotation in annotations.split(","):
+        fields = annotation.split("|")
+        if len(fields) > symbol_index:
+            genes.add(fields[symbol_index])
+    return genes
+
+
+def _vcf_info_genes(info: str, csq_symbol_index: int or None) -> Set[str]:
+    """Extract the gene symbols annotated in the INFO column of a VCF record."""
+    genes = set()
+    for field in info.split(";"):
+        key, _, value = field.partition("=")
+        if key == "ANN":
+            genes.update(_annotation_genes(value, 3))
+        elif key == "CSQ" and csq_symbol_index is not None:
+            genes.update(_annotation_genes(value, csq_symbol_index))
+        elif key == "GENE":
+            genes.update(value.split(","))
+        elif key == "GENEINFO":
+            genes.update(gene.split(":")[0] for gene in value.split("|"))
+    return genes
+
+
+def read_vcf_candidate_genes(vcf_path: Path) -> Set[str]:
+    """
+    Read the genes of the variants in a VCF, from SnpEff ANN, VEP CSQ, GENE or GENEINFO annotations.
+    Args:
+        vcf_path (Path): Path to the VCF, optionally gzip compressed.
+    Returns:
+        Set[str]: The candidate gene symbols.
+    """
+    genes = set()
+    csq_symbol_index = None
+    with open_file(vcf_path) as vcf:
+        for line in vcf:
+            if line.startswith("##INFO=<ID=CSQ") and "Format: " in line:
+                csq_format = line.split("Format: ")[1].split('"')[0].split("|")
+                csq_symbol_index = csq_format.index("SYMBOL") if "SYMBOL" in csq_format else None
+            if line.startswith("#"):
+                continue
+            columns = line.rstrip("\n").split("\t")
+            if len(columns) > 7:
+                genes.update(_vcf_info_genes(columns[7], csq_symbol_index))
+    genes.discard("")
+    return genes
+
+
+def read_candidate_genes(candidate_genes_file: Path) -> Set[str]:
+    """
+    Read the candidate genes of a case from a gene list, with one gene symbol per line, or a VCF.
+    Args:
+        candidate_genes_file (Path): Path to the candidate gene file.
+    Returns:
+        Set[str]: The candidate gene symbols.
+    """
+    if candidate_genes_file.name.endswith((".vcf", ".vcf.gz")):
+        return read_vcf_candidate_genes(candidate_genes_file)
+    with open_file(candidate_genes_file) as gene_list:
+        return {gene.strip() for gene in gene_list if gene.strip()}
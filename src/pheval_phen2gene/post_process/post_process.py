@@ -1,9 +1,55 @@
 from pathlib import Path
 
-from pheval_phen2gene.post_process.post_process_results_format import create_standardised_results
+from pheval.post_processing.post_processing import SortOrder
+from pheval.utils.phenopacket_utils import GeneIdentifierUpdater, create_gene_identifier_map
+
+from pheval_phen2gene.phenopacket_archive import is_archive
+from pheval_phen2gene.post_process.post_process_results_format import (
+    create_standardised_results,
+    load_phenopacket_truth_set,
+    write_standardised_results,
+)
+from pheval_phen2gene.result_index import create_result_index
 from pheval_phen2gene.tool_specific_configuration_parser import Phen2GeneToolSpecificConfigurations
 
 
+def candidate_genes_dir(
+    phenopacket_dir: Path, config: Phen2GeneToolSpecificConfigurations
+) -> Path or None:
+    """
+    Get the directory of per-case candidate gene files, if candidate genes are configured.
+    Candidate gene files are only looked up next to the phenopackets when these are a directory,
+    an archive of phenopackets requires an explicit candidate genes directory.
+    Args:
+        phenopacket_dir (Path): Path to the phenopacket directory, or a tar or zip archive.
+        config (Phen2GeneToolSpecificConfigurations): Phen2Gene tool configurations.
+    Returns:
+        Path or None: Path to the candidate genes directory.
+    """
+    candidate_genes = config.post_process.candidate_genes
+    if candidate_genes is None:
+        return None
+    if candidate_genes.candidate_genes_dir is not None:
+        return candidate_genes.candidate_genes_dir
+    if is_archive(phenopacket_dir):
+        raise ValueError(
+            f"candidate_genes_dir must be set when the phenopackets are an archive: {phenopacket_dir}"
+        )
+    return phenopacket_dir
+
+
+def preserve_candidate_ranks(config: Phen2GeneToolSpecificConfigurations) -> bool:
+    """
+    Check whether the genome-wide ranks of candidate genes should be preserved.
+    Args:
+        config (Phen2GeneToolSpecificConfigurations): Phen2Gene tool configurations.
+    Returns:
+        bool: True if the genome-wide ranks are preserved.
+    """
+    candidate_genes = config.post_process.candidate_genes
+    return candidate_genes is not None and candidate_genes.ranks == "preserve"
+
+
 def post_process_results_format(
     raw_results_dir: Path,
     output_dir: Path,
@@ -24,5 +70,53 @@ def post_process_results_format(
         output_dir=output_dir,
         phenopacket_dir=phenopacket_dir,
         sort_order=config.post_process.score_order,
+        presorted_fast_path=config.post_process.presorted_fast_path,
+        candidate_genes_dir=candidate_genes_dir(phenopacket_dir, config),
+        preserve_candidate_ranks=preserve_candidate_ranks(config),
+        result_layout=config.result_layout,
+        batch_size=config.post_process.batch_size,
+    )
+    print("done")
+
+
+def post_process_sweep_results_format(
+    raw_results_dir: Path,
+    output_dir: Path,
+    phenopacket_dir: Path,
+    config: Phen2GeneToolSpecificConfigurations,
+):
+    """
+    Create pheval gene results for every parameter set of a sweep.
+    The phenopacket truth set and gene identifier map are loaded once and shared by all sets.
+    Args:
+        raw_results_dir (Path): Path to the raw result directory.
+        output_dir (Path): Path to the output directory.
+        phenopacket_dir (Path): Path to the phenopacket directory.
+        config (Phen2GeneToolSpecificConfigurations): Phen2Gene tool configurations.
+    """
+    gene_identifier_updator = GeneIdentifierUpdater(
+        identifier_map=create_gene_identifier_map(), gene_identifier="ensembl_id"
+    )
+    phenopacket_truth_set = load_phenopacket_truth_set(phenopacket_dir)
+    sort_order = (
+        SortOrder.ASCENDING
+        if config.post_process.score_order == "ascending"
+        else SortOrder.DESCENDING
     )
+    for parameter_set in config.sweep:
+        print(f"...creating pheval gene results format for {parameter_set.name}...")
+        write_standardised_results(
+            results_dir=raw_results_dir.joinpath(parameter_set.name),
+            output_dir=output_dir.joinpath(parameter_set.name),
+            phenopacket_truth_set=phenopacket_truth_set,
+            gene_identifier_updator=gene_identifier_updator,
+            sort_order=sort_order,
+            presorted_fast_path=config.post_process.presorted_fast_path,
+            candidate_genes_dir=candidate_genes_dir(phenopacket_dir, config),
+            preserve_candidate_ranks=preserve_candidate_ranks(config),
+            result_index=create_result_index(
+                raw_results_dir.joinpath(parameter_set.name), config.result_layout
+            ),
+            batch_size=config.post_process.batch_size,
+        )
     print("done")
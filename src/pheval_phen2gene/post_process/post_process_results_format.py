@@ -1,22 +1,64 @@
+from itertools import islice
 from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Set
 
 import polars as pl
-from pheval.post_processing.post_processing import SortOrder, generate_gene_result
+from pheval.post_processing.phenopacket_truth_set import PhenopacketTruthSet
+from pheval.post_processing.post_processing import SortOrder, _rank_results, _write_gene_result
+from pheval.post_processing.validate_result_format import ResultSchema
 from pheval.utils.file_utils import all_files
 from pheval.utils.phenopacket_utils import GeneIdentifierUpdater, create_gene_identifier_map
 
+from pheval_phen2gene.file_io import is_compressed, open_file, uncompressed_path
+from pheval_phen2gene.phenopacket_archive import ArchivePhenopacketTruthSet, is_archive
+from pheval_phen2gene.post_process.candidate_genes import (
+    find_candidate_genes_file,
+    read_candidate_genes,
+)
+from pheval_phen2gene.result_index import (
+    COMPLETE,
+    STANDARDISED,
+    ResultIndex,
+    create_result_index,
+)
+
+PHEN2GENE_RESULT_SCHEMA = {
+    "Rank": pl.Int64,
+    "Gene": pl.String,
+    "ID": pl.String,
+    "Score": pl.Float64,
+    "Status": pl.String,
+}
+
 
 def read_phen2gene_result(phen2gene_result: Path) -> pl.DataFrame:
     """
-    Read Phen2Gene tsv output.
+    Read Phen2Gene tsv output, decompressing gzip or zstd compressed results as a stream.
     Args:
         phen2gene_result (Path): Path to the Phen2Gene raw result
     Returns:
         pd.DataFrame: Dataframe containing the Phen2Gene result.
     """
+    if is_compressed(phen2gene_result):
+        with open_file(phen2gene_result, "rb") as result:
+            return pl.read_csv(result, separator="\t")
     return pl.read_csv(phen2gene_result, separator="\t")
 
 
+def filter_candidate_genes(
+    phen2gene_result: pl.DataFrame, candidate_genes: Set[str]
+) -> pl.DataFrame:
+    """
+    Restrict a Phen2Gene result to the candidate genes of a case.
+    Args:
+        phen2gene_result (pl.DataFrame): Dataframe containing the Phen2Gene result.
+        candidate_genes (Set[str]): The candidate gene symbols.
+    Returns:
+        pl.DataFrame: The Phen2Gene result of the candidate genes.
+    """
+    return phen2gene_result.filter(pl.col("Gene").is_in(list(candidate_genes)))
+
+
 def extract_gene_results(
     phen2gene_result: pl.DataFrame, gene_identifier_updator: GeneIdentifierUpdater
 ) -> pl.DataFrame:
@@ -31,28 +73,456 @@ def extract_gene_results(
     )
 
 
+def is_presorted(phen2gene_result: pl.DataFrame, sort_order: SortOrder) -> bool:
+    """
+    Check whether a Phen2Gene result is already ordered by rank and by score in the sort order.
+    Args:
+        phen2gene_result (pl.DataFrame): Dataframe containing the Phen2Gene result.
+        sort_order (SortOrder): The sort order.
+    Returns:
+        bool: True if the result is already sorted.
+    """
+    scores = phen2gene_result["Score"].cast(pl.Float64)
+    if scores.null_count() > 0 or scores.is_nan().any():
+        return False
+    return phen2gene_result["Rank"].is_sorted() and scores.is_sorted(
+        descending=sort_order == SortOrder.DESCENDING
+    )
+
+
+def rank_presorted_results(pheval_gene_result: pl.DataFrame) -> pl.DataFrame:
+    """
+    Rank already sorted gene results without sorting them again.
+    Tied scores share the lowest rank of their run, matching pheval's ranking.
+    Args:
+        pheval_gene_result (pl.DataFrame): Gene results sorted by score in the sort order.
+    Returns:
+        pl.DataFrame: The ranked gene results.
+    """
+    return pheval_gene_result.with_columns(
+        pl.int_range(1, pl.len() + 1, dtype=pl.UInt32).alias("rank")
+    ).with_columns(pl.col("rank").max().over(pl.col("score").rle_id()))
+
+
+def load_phenopacket_truth_set(phenopacket_dir: Path) -> PhenopacketTruthSet:
+    """
+    Load the truth set of a phenopacket directory or archive.
+    Args:
+        phenopacket_dir (Path): Path to the phenopacket directory, or a tar or zip archive.
+    Returns:
+        PhenopacketTruthSet: The phenopacket truth set.
+    """
+    if is_archive(phenopacket_dir):
+        return ArchivePhenopacketTruthSet(phenopacket_dir)
+    return PhenopacketTruthSet(phenopacket_dir)
+
+
+def create_empty_gene_results(phenopacket_truth_set: PhenopacketTruthSet, output_dir: Path) -> None:
+    """
+    Write an empty gene result, holding only the known causative genes, for every phenopacket.
+    Cases without a Phen2Gene result are then still counted as false negatives when benchmarking.
+    Args:
+        phenopacket_truth_set (PhenopacketTruthSet): The phenopacket truth set.
+        output_dir (Path): Path to the gene results output directory.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if isinstance(phenopacket_truth_set, ArchivePhenopacketTruthSet):
+        phenopacket_names = phenopacket_truth_set.causative_genes.keys()
+    else:
+        phenopacket_names = [
+            file.stem
+            for file in all_files(phenopacket_truth_set.phenopacket_dir)
+            if file.suffix == ".json"
+        ]
+    for phenopacket_name in phenopacket_names:
+        _write_gene_result(
+            phenopacket_truth_set.classified_gene(phenopacket_name),
+            output_dir.joinpath(f"{phenopacket_name}-gene_result.parquet"),
+        )
+
+
+def write_ranked_gene_result(
+    ranked_results: pl.DataFrame,
+    output_dir: Path,
+    result_path: Path,
+    phenopacket_truth_set: PhenopacketTruthSet,
+) -> None:
+    """
+    Write ranked gene results in the same way as pheval's generate_gene_result.
+    Args:
+        ranked_results (pl.DataFrame): The ranked gene results.
+        output_dir (Path): Path to the output directory.
+        result_path (Path): Path to the Phen2Gene raw result.
+        phenopacket_truth_set (PhenopacketTruthSet): The phenopacket truth set.
+    """
+    ResultSchema.GENE_RESULT_SCHEMA.validate(ranked_results)
+    output_file = output_dir.joinpath(f"pheval_gene_results/{result_path.stem}-gene_result.parquet")
+    classified_results = phenopacket_truth_set.merge_gene_results(ranked_results, output_file)
+    _write_gene_result(classified_results, output_file)
+
+
+def rank_phen2gene_result(
+    phen2gene_result: pl.DataFrame,
+    gene_identifier_updator: GeneIdentifierUpdater,
+    sort_order: SortOrder,
+    presorted_fast_path: bool = True,
+    candidate_genes: Set[str] or None = None,
+    preserve_candidate_ranks: bool = False,
+) -> pl.DataFrame:
+    """
+    Rank a Phen2Gene result, optionally restricted to the candidate genes of the case.
+    Candidate genes are filtered before identifier mapping, so only the candidates are mapped.
+    Args:
+        phen2gene_result (pl.DataFrame): Dataframe containing the Phen2Gene result.
+        gene_identifier_updator (GeneIdentifierUpdater): The gene identifier updater.
+        sort_order (SortOrder): The sort order.
+        presorted_fast_path (bool): Rank results already sorted by Phen2Gene without re-sorting.
+        candidate_genes (Set[str] or None): Gene symbols to restrict the result to.
+        preserve_candidate_ranks (bool): Keep the genome-wide ranks of the candidate genes.
+    Returns:
+        pl.DataFrame: The ranked gene results.
+    """
+
+    def rank(results: pl.DataFrame) -> pl.DataFrame:
+        if presorted_fast_path and is_presorted(phen2gene_result, sort_order):
+            return rank_presorted_results(results)
+        return _rank_results(results, sort_order)
+
+    if candidate_genes is None:
+        return rank(extract_gene_results(phen2gene_result, gene_identifier_updator))
+    if not preserve_candidate_ranks:
+        return rank(
+            extract_gene_results(
+                filter_candidate_genes(phen2gene_result, candidate_genes), gene_identifier_updator
+            )
+        )
+    ranked_candidates = filter_candidate_genes(
+        rank(phen2gene_result.with_columns(pl.col("Score").cast(pl.Float64).alias("score"))),
+        candidate_genes,
+    )
+    return extract_gene_results(ranked_candidates, gene_identifier_updator).with_columns(
+        ranked_candidates["rank"]
+    )
+
+
+def write_standardised_result(
+    result: Path,
+    output_dir: Path,
+    phenopacket_truth_set: PhenopacketTruthSet,
+    gene_identifier_updator: GeneIdentifierUpdater,
+    sort_order: SortOrder,
+    presorted_fast_path: bool = True,
+    candidate_genes_dir: Path or None = None,
+    preserve_candidate_ranks: bool = False,
+) -> None:
+    """
+    Write the standardised gene result of a single Phen2Gene TSV output.
+    Args:
+        result (Path): Path to the raw result.
+        output_dir (Path): Path to the output directory.
+        phenopacket_truth_set (PhenopacketTruthSet): The phenopacket truth set.
+        gene_identifier_updator (GeneIdentifierUpdater): The gene identifier updater.
+        sort_order (SortOrder): The sort order.
+        presorted_fast_path (bool): Rank results already sorted by Phen2Gene without re-sorting.
+        candidate_genes_dir (Path or None): Path to the directory of per-case candidate gene files.
+        preserve_candidate_ranks (bool): Keep the genome-wide ranks of the candidate genes.
+    """
+    result_path = uncompressed_path(result)
+    candidate_genes_file = (
+        None
+        if candidate_genes_dir is None
+        else find_candidate_genes_file(result_path.stem, candidate_genes_dir)
+    )
+    write_ranked_gene_result(
+        ranked_results=rank_phen2gene_result(
+            phen2gene_result=read_phen2gene_result(result),
+            gene_identifier_updator=gene_identifier_updator,
+            sort_order=sort_order,
+            presorted_fast_path=presorted_fast_path,
+            candidate_genes=(
+                None if candidate_genes_file is None else read_candidate_genes(candidate_genes_file)
+            ),
+            preserve_candidate_ranks=preserve_candidate_ranks,
+        ),
+        output_dir=output_dir,
+        result_path=result_path,
+        phenopacket_truth_set=phenopacket_truth_set,
+    )
+
+
+def iter_batches(results: Iterable[Path], batch_size: int) -> Iterator[List[Path]]:
+    """
+    Lazily group raw results into batches.
+    Args:
+        results (Iterable[Path]): Paths to the raw results.
+        batch_size (int): The number of raw results in a batch.
+    Yields:
+        List[Path]: A batch of raw results.
+    """
+    results = iter(results)
+    while batch := list(islice(results, batch_size)):
+        yield batch
+
+
+def read_phen2gene_results(results: List[Path]) -> pl.DataFrame:
+    """
+    Read a batch of Phen2Gene tsv outputs into one frame with a case_id column.
+    Uncompressed results are read together by a multithreaded scan with a pinned schema,
+    compressed results are read one by one.
+    Args:
+        results (List[Path]): Paths to the raw results.
+    Returns:
+        pl.DataFrame: Dataframe containing the Phen2Gene results of the batch.
+    """
+    uncompressed = [str(result) for result in results if not is_compressed(result)]
+    frames = []
+    if uncompressed:
+        frames.append(
+            pl.scan_csv(
+                uncompressed,
+                separator="\t",
+                schema=PHEN2GENE_RESULT_SCHEMA,
+                include_file_paths="case_id",
+            ).with_columns(
+                pl.col("case_id").replace_strict(
+                    uncompressed, [Path(result).stem for result in uncompressed]
+                )
+            )
+        )
+    for result in results:
+        if is_compressed(result):
+            frames.append(
+                read_phen2gene_result(result)
+                .cast(PHEN2GENE_RESULT_SCHEMA)
+                .with_columns(pl.lit(uncompressed_path(result).stem).alias("case_id"))
+                .lazy()
+            )
+    return pl.concat(frames).collect()
+
+
+def filter_batch_candidate_genes(
+    phen2gene_results: pl.DataFrame, candidate_genes: Dict[str, Set[str]]
+) -> pl.DataFrame:
+    """
+    Restrict the Phen2Gene results of a batch to the candidate genes of each case.
+    Cases without candidate genes keep their full results.
+    Args:
+        phen2gene_results (pl.DataFrame): Dataframe containing the Phen2Gene results of the batch.
+        candidate_genes (Dict[str, Set[str]]): The candidate gene symbols by case.
+    Returns:
+        pl.DataFrame: The Phen2Gene results of the candidate genes.
+    """
+    if not candidate_genes:
+        return phen2gene_results
+    return phen2gene_results.filter(
+        ~pl.col("case_id").is_in(list(candidate_genes))
+        | pl.concat_str(["case_id", "Gene"], separator="\t").is_in(
+            [f"{case_id}\t{gene}" for case_id, genes in candidate_genes.items() for gene in genes]
+        )
+    )
+
+
+def rank_phen2gene_results(
+    phen2gene_results: pl.DataFrame,
+    gene_identifier_updator: GeneIdentifierUpdater,
+    sort_order: SortOrder,
+    candidate_genes: Dict[str, Set[str]] or None = None,
+    preserve_candidate_ranks: bool = False,
+) -> pl.DataFrame:
+    """
+    Rank the Phen2Gene results of a batch of cases in one pass.
+    Gene identifiers are mapped once per distinct gene and ranks are computed per case.
+    Args:
+        phen2gene_results (pl.DataFrame): Dataframe containing the Phen2Gene results of the batch.
+        gene_identifier_updator (GeneIdentifierUpdater): The gene identifier updater.
+        sort_order (SortOrder): The sort order.
+        candidate_genes (Dict[str, Set[str]] or None): The candidate gene symbols by case.
+        preserve_candidate_ranks (bool): Keep the genome-wide ranks of the candidate genes.
+    Returns:
+        pl.DataFrame: The ranked gene results with a case_id column.
+    """
+    descending = sort_order == SortOrder.DESCENDING
+    if not preserve_candidate_ranks:
+        phen2gene_results = filter_batch_candidate_genes(phen2gene_results, candidate_genes or {})
+    genes = phen2gene_results.get_column("Gene").unique().drop_nulls().to_list()
+    ranked_results = (
+        phen2gene_results.select(
+            pl.col("case_id"),
+            pl.col("Gene").alias("gene_symbol"),
+            pl.col("Gene")
+            .replace_strict(
+                genes,
+                [gene_identifier_updator.find_identifier(gene) for gene in genes],
+                default=None,
+                return_dtype=pl.String,
+            )
+            .alias("gene_identifier"),
+            pl.col("Score").alias("score"),
+        )
+        .sort(["case_id", "score"], descending=[False, descending], maintain_order=True)
+        .with_columns(
+            pl.col("score").rank(method="max", descending=descending).over("case_id").alias("rank")
+        )
+    )
+    if preserve_candidate_ranks:
+        ranked_results = filter_batch_candidate_genes(
+            ranked_results.rename({"gene_symbol": "Gene"}), candidate_genes or {}
+        ).rename({"Gene": "gene_symbol"})
+    return ranked_results
+
+
+def write_standardised_batch(
+    results: List[Path],
+    output_dir: Path,
+    phenopacket_truth_set: PhenopacketTruthSet,
+    gene_identifier_updator: GeneIdentifierUpdater,
+    sort_order: SortOrder,
+    candidate_genes_dir: Path or None = None,
+    preserve_candidate_ranks: bool = False,
+) -> None:
+    """
+    Write the standardised gene results of a batch of Phen2Gene TSV outputs.
+    Args:
+        results (List[Path]): Paths to the raw results.
+        output_dir (Path): Path to the output directory.
+        phenopacket_truth_set (PhenopacketTruthSet): The phenopacket truth set.
+        gene_identifier_updator (GeneIdentifierUpdater): The gene identifier updater.
+        sort_order (SortOrder): The sort order.
+        candidate_genes_dir (Path or None): Path to the directory of per-case candidate gene files.
+        preserve_candidate_ranks (bool): Keep the genome-wide ranks of the candidate genes.
+    """
+    candidate_genes = {}
+    if candidate_genes_dir is not None:
+        for result in results:
+            case_id = uncompressed_path(result).stem
+            candidate_genes_file = find_candidate_genes_file(case_id, candidate_genes_dir)
+            if candidate_genes_file is not None:
+                candidate_genes[case_id] = read_candidate_genes(candidate_genes_file)
+    ranked_results = rank_phen2gene_results(
+        phen2gene_results=read_phen2gene_results(results),
+        gene_identifier_updator=gene_identifier_updator,
+        sort_order=sort_order,
+        candidate_genes=candidate_genes,
+        preserve_candidate_ranks=preserve_candidate_ranks,
+    )
+    for (case_id,), case_results in ranked_results.group_by("case_id", maintain_order=True):
+        write_ranked_gene_result(
+            ranked_results=case_results.drop("case_id"),
+            output_dir=output_dir,
+            result_path=Path(case_id),
+            phenopacket_truth_set=phenopacket_truth_set,
+        )
+
+
+def write_standardised_results(
+    results_dir: Path,
+    output_dir: Path,
+    phenopacket_truth_set: PhenopacketTruthSet,
+    gene_identifier_updator: GeneIdentifierUpdater,
+    sort_order: SortOrder,
+    presorted_fast_path: bool = True,
+    candidate_genes_dir: Path or None = None,
+    preserve_candidate_ranks: bool = False,
+    result_index: ResultIndex or None = None,
+    batch_size: int or None = None,
+) -> None:
+    """
+    Write standardised gene results from a directory of Phen2Gene TSV output.
+    With a result index, the raw results are looked up in the index instead of listing the directory.
+    With a batch size, the raw results are post-processed in batches of one frame each.
+    Args:
+        results_dir (Path): Path to the raw result directory.
+        output_dir (Path): Path to the output directory.
+        phenopacket_truth_set (PhenopacketTruthSet): The phenopacket truth set.
+        gene_identifier_updator (GeneIdentifierUpdater): The gene identifier updater.
+        sort_order (SortOrder): The sort order.
+        presorted_fast_path (bool): Rank results already sorted by Phen2Gene without re-sorting.
+        candidate_genes_dir (Path or None): Path to the directory of per-case candidate gene files.
+        preserve_candidate_ranks (bool): Keep the genome-wide ranks of the candidate genes.
+        result_index (ResultIndex or None): Index of a partitioned raw results directory.
+        batch_size (int or None): The number of raw results to post-process together.
+    """
+    create_empty_gene_results(phenopacket_truth_set, output_dir.joinpath("pheval_gene_results"))
+    if result_index is None:
+        results = all_files(results_dir)
+    else:
+        entries = [
+            entry
+            for entry in result_index.read().values()
+            if entry.status in (COMPLETE, STANDARDISED)
+        ]
+        results = [results_dir.joinpath(entry.raw_result) for entry in entries]
+    if batch_size is None:
+        for result in results:
+            write_standardised_result(
+                result=result,
+                output_dir=output_dir,
+                phenopacket_truth_set=phenopacket_truth_set,
+                gene_identifier_updator=gene_identifier_updator,
+                sort_order=sort_order,
+                presorted_fast_path=presorted_fast_path,
+                candidate_genes_dir=candidate_genes_dir,
+                preserve_candidate_ranks=preserve_candidate_ranks,
+            )
+    else:
+        for batch in iter_batches(results, batch_size):
+            write_standardised_batch(
+                results=batch,
+                output_dir=output_dir,
+                phenopacket_truth_set=phenopacket_truth_set,
+                gene_identifier_updator=gene_identifier_updator,
+                sort_order=sort_order,
+                candidate_genes_dir=candidate_genes_dir,
+                preserve_candidate_ranks=preserve_candidate_ranks,
+            )
+    if result_index is not None:
+        for entry in entries:
+            entry.standardised_result = (
+                f"pheval_gene_results/{uncompressed_path(Path(entry.raw_result)).stem}"
+                "-gene_result.parquet"
+            )
+            entry.status = STANDARDISED
+        result_index.write(
+            (result_index.read() | {entry.case_id: entry for entry in entries}).values()
+        )
+
+
 def create_standardised_results(
-    results_dir: Path, output_dir: Path, phenopacket_dir: Path, sort_order: str
+    results_dir: Path,
+    output_dir: Path,
+    phenopacket_dir: Path,
+    sort_order: str,
+    presorted_fast_path: bool = True,
+    candidate_genes_dir: Path or None = None,
+    preserve_candidate_ranks: bool = False,
+    result_layout: str = "flat",
+    batch_size: int or None = None,
 ) -> None:
     """
     Write standardised gene results from default Phen2Gene TSV output.
     Args:
         results_dir (Path): Path to the raw result directory.
         output_dir (Path): Path to the output directory.
-        phenopacket_dir (Path): The path to the phenopacket directory.
+        phenopacket_dir (Path): The path to the phenopacket directory, or a tar or zip archive.
         sort_order (str): The sort order.
+        presorted_fast_path (bool): Rank results already sorted by Phen2Gene without re-sorting.
+        candidate_genes_dir (Path or None): Path to the directory of per-case candidate gene files.
+        preserve_candidate_ranks (bool): Keep the genome-wide ranks of the candidate genes.
+        result_layout (str): Layout of the raw results directory, either flat or partitioned.
+        batch_size (int or None): The number of raw results to post-process together.
     """
     gene_identifier_updator = GeneIdentifierUpdater(
         identifier_map=create_gene_identifier_map(), gene_identifier="ensembl_id"
     )
-    sort_order = SortOrder.ASCENDING if sort_order == "ascending" else SortOrder.DESCENDING
-    for result in all_files(results_dir):
-        phen2gene_tsv_result = read_phen2gene_result(result)
-        pheval_gene_result = extract_gene_results(phen2gene_tsv_result, gene_identifier_updator)
-        generate_gene_result(
-            results=pheval_gene_result,
-            sort_order=sort_order,
-            output_dir=output_dir,
-            result_path=result,
-            phenopacket_dir=phenopacket_dir,
-        )
+    write_standardised_results(
+        results_dir=results_dir,
+        output_dir=output_dir,
+        phenopacket_truth_set=load_phenopacket_truth_set(phenopacket_dir),
+        gene_identifier_updator=gene_identifier_updator,
+        sort_order=SortOrder.ASCENDING if sort_order == "ascending" else SortOrder.DESCENDING,
+        presorted_fast_path=presorted_fast_path,
+        candidate_genes_dir=candidate_genes_dir,
+        preserve_candidate_ranks=preserve_candidate_ranks,
+        result_index=create_result_index(results_dir, result_layout),
+        batch_size=batch_size,
+    )
@@ -0,0 +1,202 @@
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+from pheval_phen2gene.tool_specific_configuration_parser import HpoNormalisation
+
+HPO_ONTOLOGY = "sqlite:obo:hp"
+TERM_REPLACED_BY = "IAO:0100001"
+HAS_ALTERNATIVE_ID = "oio:hasAlternativeId"
+ONTOLOGY_HEADER = "# ontology: "
+DEFAULT_CACHE_FILE = Path.home().joinpath(".cache/pheval_phen2gene/hpo-lookup.tsv")
+
+
+def build_hpo_lookup(adapter) -> Dict[str, str]:
+    """
+    Build the table mapping every known HPO id, including alternate and obsolete ids, to its
+    current term. Obsolete terms are resolved through chains of term replaced by, and obsolete
+    terms without a replacement are left out, as are ids outside of the HPO.
+    Args:
+        adapter (BasicOntologyInterface): The oaklib ontology adapter.
+    Returns:
+        Dict[str, str]: Current HPO terms by HPO id.
+    """
+    lookup = {
+        entity: entity
+        for entity in adapter.entities(filter_obsoletes=True)
+        if entity.startswith("HP:")
+    }
+    for term in list(lookup):
+        for alternative_id in adapter.entity_metadata_map(term).get(HAS_ALTERNATIVE_ID, []):
+            lookup.setdefault(alternative_id, term)
+    replaced_by = {
+        entity: replacement
+        for entity, predicate, replacement in adapter.obsoletes_migration_relationships(
+            adapter.obsoletes()
+        )
+        if predicate == TERM_REPLACED_BY and entity.startswith("HP:")
+    }
+    for obsolete in replaced_by:
+        term, seen = obsolete, set()
+        while term in replaced_by and term not in seen:
+            seen.add(term)
+            term = replaced_by[term]
+        if term in lookup:
+            lookup[obsolete] = lookup[term]
+    return lookup
+
+
+def read_hpo_lookup_ontology(cache_file: Path) -> str or None:
+    """
+    Read the ontology a cached HPO lookup table was built from.
+    Args:
+        cache_file (Path): Path to the cached lookup table.
+    Returns:
+        str or None: The oaklib selector of the ontology, or None for a cache without a header.
+    """
+    with open(cache_file) as lookup_file:
+        header = lookup_file.readline().rstrip("\n")
+    return header.removeprefix(ONTOLOGY_HEADER) if header.startswith(ONTOLOGY_HEADER) else None
+
+
+def read_hpo_lookup(cache_file: Path) -> Dict[str, str]:
+    """
+    Read a cached HPO lookup table.
+    Args:
+        cache_file (Path): Path to the cached lookup table.
+    Returns:
+        Dict[str, str]: Current HPO terms by HPO id.
+    """
+    with open(cache_file) as lookup_file:
+        return dict(
+            line.rstrip("\n").split("\t")
+            for line in lookup_file
+            if line.strip() and not line.startswith("#")
+        )
+
+
+def write_hpo_lookup(
+    lookup: Dict[str, str], cache_file: Path, ontology: str = HPO_ONTOLOGY
+) -> None:
+    """
+    Write the HPO lookup table to its cache, replacing any previous cache atomically.
+    Args:
+        lookup (Dict[str, str]): Current HPO terms by HPO id.
+        cache_file (Path): Path to the cached lookup table.
+        ontology (str): The oaklib selector of the ontology the table was built from.
+    """
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_name(f".{cache_file.name}.{os.getpid()}.tmp")
+    with open(tmp_file, "w") as lookup_file:
+        lookup_file.write(f"{ONTOLOGY_HEADER}{ontology}\n")
+        for hpo_id, term in sorted(lookup.items()):
+            lookup_file.write(f"{hpo_id}\t{term}\n")
+    os.replace(tmp_file, cache_file)
+
+
+def load_hpo_lookup(
+    cache_file: Path = DEFAULT_CACHE_FILE, ontology: str = HPO_ONTOLOGY
+) -> Dict[str, str]:
+    """
+    Load the HPO lookup table from its cache, building it from the ontology on first use or when
+    the cache was built from another ontology. Delete the cache file to rebuild it after an
+    upgrade of the same ontology.
+    Args:
+        cache_file (Path): Path to the cached lookup table.
+        ontology (str): The oaklib selector of the ontology.
+    Returns:
+        Dict[str, str]: Current HPO terms by HPO id.
+    """
+    if cache_file.exists() and read_hpo_lookup_ontology(cache_file) == ontology:
+        return read_hpo_lookup(cache_file)
+    # oaklib takes seconds to import, so it is only imported when the cache has to be built.
+    from oaklib import get_adapter
+
+    print(f"building HPO lookup table from {ontology}")
+    lookup = build_hpo_lookup(get_adapter(ontology))
+    write_hpo_lookup(lookup, cache_file, ontology)
+    return lookup
+
+
+class HpoNormaliser:
+    """Class for resolving alternate and obsolete HPO ids to current terms and dropping unknown ids."""
+
+    def __init__(self, lookup: Dict[str, str]):
+        """
+        Initialise the HpoNormaliser class.
+        Args:
+            lookup (Dict[str, str]): Current HPO terms by HPO id.
+        """
+        self.lookup = lookup
+        self.replaced: Counter = Counter()
+        self.dropped: Counter = Counter()
+        self.skipped_cases: List[str] = []
+
+    def normalise(self, hpo_ids: List[str], case_id: str or None = None) -> List[str]:
+        """
+        Normalise the HPO ids of a case, keeping the first occurrence of every current term.
+        A case left without any HPO ids is recorded as skipped, as Phen2Gene cannot score it.
+        Args:
+            hpo_ids (List[str]): List of HPO ids.
+            case_id (str or None): Name of the case.
+        Returns:
+            List[str]: List of current HPO terms.
+        """
+        terms = {}
+        for hpo_id in hpo_ids:
+            term = self.lookup.get(hpo_id)
+            if term is None:
+                self.dropped[hpo_id] += 1
+                continue
+            if term != hpo_id:
+                self.replaced[(hpo_id, term)] += 1
+            terms.setdefault(term)
+        if not terms and case_id is not None:
+            self.skipped_cases.append(case_id)
+        return list(terms)
+
+    def report(self) -> None:
+        """Print a summary of the replaced HPO ids, every dropped HPO id and every skipped case."""
+        print(
+            f"replaced {sum(self.replaced.values())} alternate or obsolete HPO ids "
+            f"and dropped {sum(self.dropped.values())} unknown HPO ids"
+        )
+        for hpo_id, count in sorted(self.dropped.items()):
+            print(f"dropped unknown HPO id {hpo_id} {count} times")
+        for case_id in self.skipped_cases:
+            print(f"skipped {case_id} as none of its HPO ids are known")
+
+    def write_report(self, report_file: Path) -> None:
+        """
+        Write every replaced and dropped HPO id with the number of times it occurred, followed by
+        every skipped case.
+        Args:
+            report_file (Path): Path to the report file.
+        """
+        with open(report_file, "w") as report:
+            report.write("hpo_id\tterm\tstatus\tcount\n")
+            for (hpo_id, term), count in sorted(self.replaced.items()):
+                report.write(f"{hpo_id}\t{term}\treplaced\t{count}\n")
+            for hpo_id, count in sorted(self.dropped.items()):
+                report.write(f"{hpo_id}\t\tdropped\t{count}\n")
+            for case_id in self.skipped_cases:
+                report.write(f"{case_id}\t\tskipped_case\t1\n")
+
+
+def create_hpo_normaliser(normalisation: HpoNormalisation or None) -> HpoNormaliser or None:
+    """
+    Create the HPO normaliser of a run.
+    Args:
+        normalisation (HpoNormalisation or None): The HPO normalisation configurations.
+    Returns:
+        HpoNormaliser or None: The HPO normaliser, or None if normalisation is not configured.
+    """
+    if normalisation is None:
+        return None
+    return HpoNormaliser(
+        load_hpo_lookup(
+            DEFAULT_CACHE_FILE if normalisation.cache_file is None else normalisation.cache_file,
+            normalisation.ontology,
+        )
+    )
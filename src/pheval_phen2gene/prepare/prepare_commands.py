@@ -1,11 +1,16 @@
 import os
+from array import array
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Iterator, List
 
-from pheval.utils.file_utils import all_files
 from pheval.utils.phenopacket_utils import PhenopacketUtil, phenopacket_reader
 
+from pheval_phen2gene.file_io import compressed_path, is_compressed, open_file, uncompressed_path
+from pheval_phen2gene.phenopacket_archive import iter_phenopackets
+from pheval_phen2gene.prepare.normalise_hpo import HpoNormaliser
+from pheval_phen2gene.result_index import ResultIndex, create_result_index
+
 
 @dataclass
 class Phen2GeneCommandLineArguments:
@@ -17,6 +22,7 @@ class Phen2GeneCommandLineArguments:
         output_file_name (Path): Name of the output file.
         input_file_path (Path): Path to the input file.
         hpo_ids (List[str]): List of hpo ids.
+        extra_arguments (List[str]): Additional Phen2Gene arguments, such as the weighting model.
     """
 
     path_to_phen2gene_dir: Path
@@ -24,6 +30,7 @@ class Phen2GeneCommandLineArguments:
     output_file_name: Path
     input_file_path: [Path] = None
     hpo_ids: List[str] = None
+    extra_arguments: List[str] = None
 
 
 @dataclass
@@ -35,12 +42,16 @@ class Phen2GeneDockerArguments:
         output_file_name (Path): Name of the output file.
         input_file_path (Path): Path to the input file
         hpo_ids (List[str]): List of hpo ids.
+        extra_arguments (List[str]): Additional Phen2Gene arguments, such as the weighting model.
+        output_subdir (str): Subdirectory of the mounted results directory to write the result to.
     """
 
     output_dir: Path
     output_file_name: Path
     input_file_path: [Path] = None
     hpo_ids: List[str] = None
+    extra_arguments: List[str] = None
+    output_subdir: str = None
 
 
 def create_command_line_arguments(
@@ -49,6 +60,7 @@ def create_command_line_arguments(
     output_file_name: Path,
     input_file_path: Path or None = None,
     phenopacket_path: Path or None = None,
+    normaliser: HpoNormaliser or None = None,
 ) -> Phen2GeneCommandLineArguments:
     """
     Create command line arguments required for Phen2Gene.
@@ -58,10 +70,19 @@ def create_command_line_arguments(
         output_file_name (Path): Name of the output file.
         input_file_path (Path or None): Path to the input file.
         phenopacket_path (Path or None): Path to the phenopacket.
+        normaliser (HpoNormaliser or None): Normaliser of alternate, obsolete and unknown HPO ids.
     Returns:
         Phen2GeneCommandLineArguments: Arguments required to run Phen2Gene.
     """
     if phenopacket_path is None:
+        if normaliser is not None:
+            # Phen2Gene reads input files itself, so normalised HPO ids are passed manually.
+            return Phen2GeneCommandLineArguments(
+                path_to_phen2gene_dir=path_to_phen2gene_dir,
+                output_dir=output_dir,
+                output_file_name=output_file_name,
+                hpo_ids=normaliser.normalise(read_hpo_ids(input_file_path), output_file_name.name),
+            )
         return Phen2GeneCommandLineArguments(
             path_to_phen2gene_dir=path_to_phen2gene_dir,
             output_dir=output_dir,
@@ -70,13 +91,18 @@ def create_command_line_arguments(
         )
     if input_file_path is None:
         phenopacket = phenopacket_reader(phenopacket_path)
+        hpo_ids = [
+            hpo.type.id for hpo in PhenopacketUtil(phenopacket).observed_phenotypic_features()
+        ]
         return Phen2GeneCommandLineArguments(
             path_to_phen2gene_dir=path_to_phen2gene_dir,
             output_dir=output_dir,
             output_file_name=output_file_name,
-            hpo_ids=[
-                hpo.type.id for hpo in PhenopacketUtil(phenopacket).observed_phenotypic_features()
-            ],
+            hpo_ids=(
+                hpo_ids
+                if normaliser is None
+                else normaliser.normalise(hpo_ids, output_file_name.name)
+            ),
         )
 
 
@@ -85,6 +111,7 @@ def create_docker_arguments(
     output_file_name: Path,
     input_file_path: Path or None = None,
     phenopacket_path: Path or None = None,
+    normaliser: HpoNormaliser or None = None,
 ) -> Phen2GeneDockerArguments:
     """
     Create the docker arguments required for Phen2Gene.
@@ -93,8 +120,15 @@ def create_docker_arguments(
         output_file_name (Path): Name of the output file.
         input_file_path (Path or None): Path to the input file.
         phenopacket_path (Path or None): Path to the phenopacket.
+        normaliser (HpoNormaliser or None): Normaliser of alternate, obsolete and unknown HPO ids.
     """
     if phenopacket_path is None:
+        if normaliser is not None:
+            return Phen2GeneDockerArguments(
+                output_dir=output_dir,
+                output_file_name=output_file_name,
+                hpo_ids=normaliser.normalise(read_hpo_ids(input_file_path), output_file_name.name),
+            )
         return Phen2GeneDockerArguments(
             output_dir=output_dir,
             output_file_name=output_file_name,
@@ -102,15 +136,151 @@ def create_docker_arguments(
         )
     if input_file_path is None:
         phenopacket = phenopacket_reader(phenopacket_path)
+        hpo_ids = [
+            hpo.type.id for hpo in PhenopacketUtil(phenopacket).observed_phenotypic_features()
+        ]
         return Phen2GeneDockerArguments(
             output_dir=output_dir,
             output_file_name=output_file_name,
-            hpo_ids=[
-                hpo.type.id for hpo in PhenopacketUtil(phenopacket).observed_phenotypic_features()
-            ],
+            hpo_ids=(
+                hpo_ids
+                if normaliser is None
+                else normaliser.normalise(hpo_ids, output_file_name.name)
+            ),
         )
 
 
+def read_hpo_ids(input_file: Path) -> List[str]:
+    """
+    Read the HPO ids of a prepared, optionally compressed, input file.
+    Args:
+        input_file (Path): Path to the input file.
+    Returns:
+        List[str]: List of HPO ids.
+    """
+    with open_file(input_file) as hpo_ids:
+        return hpo_ids.read().split()
+
+
+def iter_files(directory: Path) -> Iterator[Path]:
+    """
+    Lazily yield the files in a directory without materialising a listing.
+    Args:
+        directory (Path): Path to the directory.
+    Yields:
+        Path: Path to a file in the directory.
+    """
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file():
+                yield Path(entry.path)
+
+
+class HpoIdInterner:
+    """Class for interning HPO ids to compact integer codes."""
+
+    def __init__(self):
+        """Initialise the HpoIdInterner class."""
+        self.codes = {}
+        self.hpo_ids = []
+
+    def encode(self, hpo_ids: List[str]) -> array:
+        """
+        Encode HPO ids to an array of integer codes.
+        Args:
+            hpo_ids (List[str]): List of HPO ids.
+        Returns:
+            array: Array of integer codes.
+        """
+        codes = array("I")
+        for hpo_id in hpo_ids:
+            code = self.codes.get(hpo_id)
+            if code is None:
+                code = self.codes[hpo_id] = len(self.hpo_ids)
+                self.hpo_ids.append(hpo_id)
+            codes.append(code)
+        return codes
+
+    def decode(self, codes: array or None) -> List[str] or None:
+        """
+        Decode an array of integer codes back to HPO ids.
+        Args:
+            codes (array or None): Array of integer codes.
+        Returns:
+            List[str] or None: List of HPO ids.
+        """
+        return None if codes is None else [self.hpo_ids[code] for code in codes]
+
+
+@dataclass(slots=True)
+class CaseRecord:
+    """
+    Compact record of a single case to run with Phen2Gene.
+    Args:
+        output_file_name (str): Name of the output file.
+        input_file_path (Path or None): Path to the input file.
+        hpo_ids (List[str] or None): The observed HPO ids, when they are not interned.
+        hpo_codes (array or None): Interned codes of the observed HPO ids.
+    """
+
+    output_file_name: str
+    input_file_path: Path or None = None
+    hpo_ids: List[str] or None = None
+    hpo_codes: array or None = None
+
+
+def iter_case_records(
+    phenopacket_dir: Path or None,
+    input_dir: Path or None,
+    interner: HpoIdInterner or None = None,
+    normaliser: HpoNormaliser or None = None,
+) -> Iterator[CaseRecord]:
+    """
+    Lazily yield case records from either a directory or archive of phenopackets or of input files.
+    Cases left without any HPO ids by the normaliser are skipped.
+    HPO ids are only interned when an interner is given, which pays off when the cases are held in
+    memory rather than streamed.
+    Args:
+        phenopacket_dir (Path or None): Path to the phenopacket directory, or a tar or zip archive.
+        input_dir (Path or None): Path to the input file directory.
+        interner (HpoIdInterner or None): Interner for the observed HPO ids.
+        normaliser (HpoNormaliser or None): Normaliser of alternate, obsolete and unknown HPO ids.
+    Yields:
+        CaseRecord: Record of a single case.
+    """
+
+    def case_record(case_id: str, hpo_ids: List[str]) -> CaseRecord:
+        if interner is None:
+            return CaseRecord(output_file_name=case_id, hpo_ids=hpo_ids)
+        return CaseRecord(output_file_name=case_id, hpo_codes=interner.encode(hpo_ids))
+
+    if input_dir is not None:
+        for input_file in iter_files(input_dir):
+            if is_compressed(input_file) or normaliser is not None:
+                # Phen2Gene cannot read compressed input, nor normalise HPO ids, so the HPO ids
+                # are passed manually.
+                case_id = uncompressed_path(input_file).stem
+                hpo_ids = read_hpo_ids(input_file)
+                if normaliser is not None:
+                    hpo_ids = normaliser.normalise(hpo_ids, case_id)
+                    if not hpo_ids:
+                        continue
+                yield case_record(case_id, hpo_ids)
+            else:
+                yield CaseRecord(output_file_name=input_file.stem, input_file_path=input_file)
+        return
+    for phenopacket_name, phenopacket in iter_phenopackets(phenopacket_dir):
+        case_id = Path(phenopacket_name).stem
+        hpo_ids = [
+            hpo.type.id for hpo in PhenopacketUtil(phenopacket).observed_phenotypic_features()
+        ]
+        if normaliser is not None:
+            hpo_ids = normaliser.normalise(hpo_ids, case_id)
+            if not hpo_ids:
+                continue
+        yield case_record(case_id, hpo_ids)
+
+
 class CommandWriter:
     """Class for writing all commands to a text file."""
 
@@ -118,9 +288,64 @@ class CommandWriter:
         """
         Initialise the CommandWriter class.
         Args:
-            output_file (Path): Path to the output file to write commands.
+            output_file (Path): Path to the output file to write commands, compressed by suffix.
+        """
+        self.file = open_file(output_file, "wt")
+
+    @staticmethod
+    def local_command(
+        command_arguments: Phen2GeneCommandLineArguments, data_dir: Path
+    ) -> List[str]:
+        """
+        Create the arguments of a Phen2Gene command to run locally.
+        Args:
+            command_arguments (Phen2GeneCommandLineArguments): Phen2Gene command line arguments.
+            data_dir (Path): Path to Phen2Gene input data directory.
+        Returns:
+            List[str]: The Phen2Gene command.
+        """
+        return (
+            ["python3", str(command_arguments.path_to_phen2gene_dir)]
+            + CommandWriter._input_arguments(command_arguments)
+            + ["-out", f"{str(command_arguments.output_dir)}{os.sep}"]
+            + ["--name", str(command_arguments.output_file_name)]
+            + ["-d", str(data_dir)]
+            + (command_arguments.extra_arguments or [])
+        )
+
+    @staticmethod
+    def docker_command(command_arguments: Phen2GeneDockerArguments) -> List[str]:
+        """
+        Create the arguments of a Phen2Gene command to run with docker.
+        Args:
+            command_arguments (Phen2GeneDockerArguments): Arguments passed to docker command for Phen2Gene.
+        Returns:
+            List[str]: The Phen2Gene command.
         """
-        self.file = open(output_file, "w")
+        return (
+            CommandWriter._input_arguments(command_arguments)
+            + [
+                "-out",
+                "/phen2gene-results"
+                + (
+                    ""
+                    if command_arguments.output_subdir is None
+                    else f"/{command_arguments.output_subdir}"
+                ),
+            ]
+            + ["--name", str(command_arguments.output_file_name)]
+            + ["-d", "/phen2gene-data"]
+            + (command_arguments.extra_arguments or [])
+        )
+
+    @staticmethod
+    def _input_arguments(
+        command_arguments: Phen2GeneCommandLineArguments or Phen2GeneDockerArguments,
+    ) -> List[str]:
+        """Create the input file or manual HPO id arguments of a Phen2Gene command."""
+        if command_arguments.hpo_ids is None:
+            return ["--file", str(command_arguments.input_file_path)]
+        return ["--manual"] + command_arguments.hpo_ids
 
     def write_local_command(
         self, command_arguments: Phen2GeneCommandLineArguments, data_dir: Path
@@ -132,36 +357,7 @@ class CommandWriter:
             data_dir (Path): Path to Phen2Gene input data directory.
         """
         try:
-            if command_arguments.hpo_ids is None:
-                # TODO create this as a list instead in another method and then do "\n".join here
-                # TODO so that I can test that it was done correctly
-                self.file.write(
-                    "python3 "
-                    + str(command_arguments.path_to_phen2gene_dir)
-                    + " --file "
-                    + str(command_arguments.input_file_path)
-                    + " -out "
-                    + f"{str(command_arguments.output_dir)}{os.sep}"
-                    + " --name "
-                    + str(command_arguments.output_file_name)
-                    + " -d "
-                    + str(data_dir)
-                    + "\n"
-                )
-            if command_arguments.input_file_path is None:
-                self.file.write(
-                    "python3 "
-                    + str(command_arguments.path_to_phen2gene_dir)
-                    + " --manual "
-                    + " ".join(command_arguments.hpo_ids)
-                    + " -out "
-                    + f"{str(command_arguments.output_dir)}{os.sep}"
-                    + " --name "
-                    + str(command_arguments.output_file_name)
-                    + " -d "
-                    + str(data_dir)
-                    + "\n"
-                )
+            self.file.write(" ".join(self.local_command(command_arguments, data_dir)) + "\n")
         except IOError:
             print("Error writing ", self.file)
 
@@ -172,30 +368,7 @@ class CommandWriter:
             command_arguments (Phen2GeneDockerArguments): Arguments passed to docker command for Phen2Gene.
         """
         try:
-            if command_arguments.hpo_ids is None:
-                self.file.write(
-                    " --file "
-                    + str(command_arguments.input_file_path)
-                    + " -out "
-                    + "/phen2gene-results"
-                    + " --name "
-                    + str(command_arguments.output_file_name)
-                    + " -d "
-                    + "/phen2gene-data"
-                    + "\n"
-                )
-            if command_arguments.input_file_path is None:
-                self.file.write(
-                    " --manual "
-                    + " ".join(command_arguments.hpo_ids)
-                    + " -out "
-                    + "/phen2gene-results"
-                    + " --name "
-                    + str(command_arguments.output_file_name)
-                    + " -d "
-                    + "/phen2gene-data"
-                    + "\n"
-                )
+            self.file.write(" ".join(self.docker_command(command_arguments)) + "\n")
         except IOError:
             print("Error writing ", self.file)
 
@@ -212,9 +385,11 @@ def write_single_local_command(
     command_writer: CommandWriter,
     input_file_path: Path or None = None,
     phenopacket_path: Path or None = None,
+    normaliser: HpoNormaliser or None = None,
 ) -> None:
     """
     Write a single command locally when given either a phenopacket or prepared input file.
+    No command is written for a case left without any HPO ids by the normaliser.
     Args:
         path_to_phen2gene_dir (Path): Path to the Phen2Gene directory.
         output_dir (Path): Path to the output directory.
@@ -223,6 +398,7 @@ def write_single_local_command(
         command_writer (CommandWriter): CommandWriter instance.
         input_file_path (Path or None): Path to the input file.
         phenopacket_path (Path or None): Path to the phenopacket.
+        normaliser (HpoNormaliser or None): Normaliser of alternate, obsolete and unknown HPO ids.
     """
     arguments = create_command_line_arguments(
         path_to_phen2gene_dir=path_to_phen2gene_dir,
@@ -230,7 +406,10 @@ def write_single_local_command(
         output_file_name=output_file_name,
         input_file_path=input_file_path,
         phenopacket_path=phenopacket_path,
+        normaliser=normaliser,
     )
+    if normaliser is not None and not arguments.hpo_ids:
+        return
     command_writer.write_local_command(arguments, data_dir)
 
 
@@ -240,22 +419,28 @@ def write_single_docker_command(
     command_writer: CommandWriter,
     input_file_path: Path or None = None,
     phenopacket_path: Path or None = None,
+    normaliser: HpoNormaliser or None = None,
 ) -> None:
     """
     Write a docker command when given either a phenopacket or prepared input file.
+    No command is written for a case left without any HPO ids by the normaliser.
     Args:
         output_dir (Path): Path to the output directory.
         output_file_name (Path): Name of the output file.
         command_writer (CommandWriter): CommandWriter instance.
         input_file_path (Path or None): Path to the input file.
         phenopacket_path (Path or None): Path to the phenopacket.
+        normaliser (HpoNormaliser or None): Normaliser of alternate, obsolete and unknown HPO ids.
     """
     arguments = create_docker_arguments(
         output_dir=output_dir,
         output_file_name=output_file_name,
         input_file_path=input_file_path,
         phenopacket_path=phenopacket_path,
+        normaliser=normaliser,
     )
+    if normaliser is not None and not arguments.hpo_ids:
+        return
     command_writer.write_docker_command(arguments)
 
 
@@ -266,38 +451,37 @@ def write_local_commands(
     data_dir: Path,
     phenopacket_dir: Path or None,
     input_dir: Path or None,
+    result_index: ResultIndex or None = None,
+    normaliser: HpoNormaliser or None = None,
 ) -> None:
     """
     Write all commands to run locally when given either directory containing phenopackets or input files.
+    Cases are streamed from discovery to command emission, so memory does not grow with the corpus.
     Args:
         path_to_phen2gene_dir (Path): Path to the Phen2Gene directory.
         command_file_path (Path): Path to the file to write commands.
         output_dir (Path): Path to the output directory.
         data_dir (Path): Path to the Phen2Gene data directory.
-        phenopacket_dir (Path or None): Path to the phenopacket directory.
+        phenopacket_dir (Path or None): Path to the phenopacket directory, or a tar or zip archive.
         input_dir (Path or None): Path to the input file directory.
+        result_index (ResultIndex or None): Index of a partitioned output directory to record cases in.
+        normaliser (HpoNormaliser or None): Normaliser of alternate, obsolete and unknown HPO ids.
     """
-    input_files = all_files(phenopacket_dir) if input_dir is None else all_files(input_dir)
     command_writer = CommandWriter(command_file_path)
-    for input_file in input_files:
-        (
-            write_single_local_command(
+    for case in iter_case_records(phenopacket_dir, input_dir, normaliser=normaliser):
+        command_writer.write_local_command(
+            Phen2GeneCommandLineArguments(
                 path_to_phen2gene_dir=path_to_phen2gene_dir,
-                output_dir=output_dir,
-                output_file_name=Path(input_file.stem),
-                command_writer=command_writer,
-                input_file_path=input_file,
-                data_dir=data_dir,
-            )
-            if phenopacket_dir is None
-            else write_single_local_command(
-                path_to_phen2gene_dir=path_to_phen2gene_dir,
-                output_dir=output_dir,
-                output_file_name=Path(input_file.stem),
-                command_writer=command_writer,
-                phenopacket_path=input_file,
-                data_dir=data_dir,
-            )
+                output_dir=(
+                    output_dir
+                    if result_index is None
+                    else result_index.add_pending(case.output_file_name)
+                ),
+                output_file_name=Path(case.output_file_name),
+                input_file_path=case.input_file_path,
+                hpo_ids=case.hpo_ids,
+            ),
+            data_dir,
         )
     command_writer.close()
 
@@ -307,33 +491,36 @@ def write_docker_commands(
     output_dir: Path,
     phenopacket_dir: Path or None,
     input_dir: Path or None,
+    result_index: ResultIndex or None = None,
+    normaliser: HpoNormaliser or None = None,
 ) -> None:
     """
     Write all commands to run with docker when given either directory containing phenopackets or input files.
+    Cases are streamed from discovery to command emission, so memory does not grow with the corpus.
     Args:
         command_file_path (Path): Path to the file to write commands.
         output_dir (Path): Path to the output directory.
-        phenopacket_dir (Path or None): Path to the phenopacket directory.
+        phenopacket_dir (Path or None): Path to the phenopacket directory, or a tar or zip archive.
         input_dir (Path or None): Path to the input file directory.
+        result_index (ResultIndex or None): Index of a partitioned output directory to record cases in.
+        normaliser (HpoNormaliser or None): Normaliser of alternate, obsolete and unknown HPO ids.
     """
-    input_files = all_files(phenopacket_dir) if input_dir is None else all_files(input_dir)
     command_writer = CommandWriter(command_file_path)
-    for input_file in input_files:
-        (
-            write_single_docker_command(
+    for case in iter_case_records(phenopacket_dir, input_dir, normaliser=normaliser):
+        if result_index is not None:
+            result_index.add_pending(case.output_file_name)
+        command_writer.write_docker_command(
+            Phen2GeneDockerArguments(
                 output_dir=output_dir,
-                output_file_name=Path(input_file.stem),
-                command_writer=command_writer,
-                phenopacket_path=input_file,
-            )
-            if input_dir is None
-            else write_single_docker_command(
-                output_dir=output_dir,
-                output_file_name=Path(input_file.stem),
-                command_writer=command_writer,
-                input_file_path=input_file,
+                output_file_name=Path(case.output_file_name),
+                input_file_path=case.input_file_path,
+                hpo_ids=case.hpo_ids,
+                output_subdir=(
+                    None if result_index is None else ResultIndex.partition(case.output_file_name)
+                ),
             )
         )
+    command_writer.close()
 
 
 def prepare_commands(
@@ -345,6 +532,9 @@ def prepare_commands(
     phenopacket_dir: Path or None = None,
     input_dir: Path or None = None,
     path_to_phen2gene_dir: Path or None = None,
+    compression: str or None = None,
+    result_layout: str = "flat",
+    normaliser: HpoNormaliser or None = None,
 ) -> None:
     """
     Prepare all commands to run with Phen2Gene.
@@ -354,11 +544,19 @@ def prepare_commands(
         output_dir (Path): Path to the directory to write command file.
         results_dir (Path): Path to the directory to write Phen2Gene results.
         data_dir (Path): Path to the Phen2Gene data directory.
-        phenopacket_dir (Path or None): Path to the phenopacket directory.
+        phenopacket_dir (Path or None): Path to the phenopacket directory, or a tar or zip archive.
         input_dir (Path or None): Path to the input file directory.
         path_to_phen2gene_dir (Path or None): Path to the Phen2Gene directory.
+        compression (str or None): Compression for the command file, either gzip, zstd or None.
+        result_layout (str): Layout of the results directory, either flat or partitioned.
+        normaliser (HpoNormaliser or None): Normaliser of alternate, obsolete and unknown HPO ids.
     """
-    command_file_path = output_dir.joinpath(f"{file_prefix}-phen2gene-batch.txt")
+    result_index = create_result_index(results_dir, result_layout)
+    if result_index is not None:
+        result_index.write([])
+    command_file_path = compressed_path(
+        output_dir.joinpath(f"{file_prefix}-phen2gene-batch.txt"), compression
+    )
     if environment == "local":
         write_local_commands(
             path_to_phen2gene_dir=path_to_phen2gene_dir,
@@ -367,6 +565,8 @@ def prepare_commands(
             input_dir=input_dir,
             output_dir=results_dir,
             data_dir=data_dir,
+            result_index=result_index,
+            normaliser=normaliser,
         )
     if environment == "docker":
         write_docker_commands(
@@ -374,4 +574,11 @@ def prepare_commands(
             output_dir=results_dir,
             phenopacket_dir=phenopacket_dir,
             input_dir=input_dir,
+            result_index=result_index,
+            normaliser=normaliser,
         )
+    if result_index is not None:
+        result_index.close()
+    if normaliser is not None:
+        normaliser.report()
+        normaliser.write_report(output_dir.joinpath(f"{file_prefix}-hpo-normalisation.tsv"))
@@ -1,45 +1,93 @@
 from pathlib import Path
-from typing import List
+from typing import List, Union
 
-from phenopackets import PhenotypicFeature
-from pheval.utils.file_utils import all_files
+from phenopackets import Family, Phenopacket, PhenotypicFeature
 from pheval.utils.phenopacket_utils import PhenopacketUtil, phenopacket_reader
 
+from pheval_phen2gene.file_io import compressed_path, open_file, uncompressed_path
+from pheval_phen2gene.phenopacket_archive import iter_phenopackets
+from pheval_phen2gene.prepare.normalise_hpo import HpoNormaliser
+
 
 def write_hpo_ids_to_output_file(
-    output_file: Path, phenotypic_profile: List[PhenotypicFeature]
+    output_file: Path,
+    phenotypic_profile: List[PhenotypicFeature],
+    normaliser: HpoNormaliser or None = None,
 ) -> None:
     """
     Write a list of HPO ids to a new text file for input into Phen2Gene.
+    No file is written for a case left without any HPO ids by the normaliser.
     Args:
         output_file (Path): Path to the file to write text file containing HPO ids.
         phenotypic_profile (List[PhenotypicFeature]): List of phenotypic features.
+        normaliser (HpoNormaliser or None): Normaliser of alternate, obsolete and unknown HPO ids.
     """
-    with open(output_file, "w") as output:
-        output.write("\n".join([hpo.type.id for hpo in phenotypic_profile]))
+    hpo_ids = [hpo.type.id for hpo in phenotypic_profile]
+    if normaliser is not None:
+        hpo_ids = normaliser.normalise(hpo_ids, Path(uncompressed_path(output_file).stem).stem)
+        if not hpo_ids:
+            return
+    with open_file(output_file, "wt") as output:
+        output.write("\n".join(hpo_ids))
     output.close()
 
 
-def prepare_input(output_dir: Path, phenopacket_path: Path) -> None:
+def write_phenopacket_input(
+    output_dir: Path,
+    phenopacket_name: str,
+    phenopacket: Union[Phenopacket, Family],
+    compression: str or None = None,
+    normaliser: HpoNormaliser or None = None,
+) -> None:
+    """
+    Write a text file input for Phen2Gene from parsed phenopacket contents.
+    Args:
+        output_dir (Path): Path to the output directory to write text file.
+        phenopacket_name (str): File name of the phenopacket.
+        phenopacket (Union[Phenopacket, Family]): Contents of the phenopacket.
+        compression (str or None): Compression for the text file, either gzip, zstd or None.
+        normaliser (HpoNormaliser or None): Normaliser of alternate, obsolete and unknown HPO ids.
+    """
+    phenotypic_profile = PhenopacketUtil(phenopacket).observed_phenotypic_features()
+    output_file_path = compressed_path(output_dir.joinpath(phenopacket_name + ".txt"), compression)
+    write_hpo_ids_to_output_file(output_file_path, phenotypic_profile, normaliser)
+
+
+def prepare_input(
+    output_dir: Path,
+    phenopacket_path: Path,
+    compression: str or None = None,
+    normaliser: HpoNormaliser or None = None,
+) -> None:
     """
     Prepare a text file input for Phen2Gene from a phenopacket.
     Args:
         output_dir (Path): Path to the output directory to write text file.
         phenopacket_path (Path): Path to the phenopacket file.
+        compression (str or None): Compression for the text file, either gzip, zstd or None.
+        normaliser (HpoNormaliser or None): Normaliser of alternate, obsolete and unknown HPO ids.
     """
     output_dir.mkdir(exist_ok=True)
     phenopacket = phenopacket_reader(phenopacket_path)
-    phenotypic_profile = PhenopacketUtil(phenopacket).observed_phenotypic_features()
-    output_file_path = output_dir.joinpath(phenopacket_path.name + ".txt")
-    write_hpo_ids_to_output_file(output_file_path, phenotypic_profile)
+    write_phenopacket_input(output_dir, phenopacket_path.name, phenopacket, compression, normaliser)
 
 
-def prepare_inputs(output_dir: Path, phenopacket_dir: Path) -> None:
+def prepare_inputs(
+    output_dir: Path,
+    phenopacket_dir: Path,
+    compression: str or None = None,
+    normaliser: HpoNormaliser or None = None,
+) -> None:
     """
-    Prepare text files input for Phen2Gene from a directory of phenopackets.
+    Prepare text files input for Phen2Gene from a directory or archive of phenopackets.
     Args:
         output_dir (Path): Path to the output directory to write text files.
-        phenopacket_dir (Path): Path to the phenopacket directory.
+        phenopacket_dir (Path): Path to the phenopacket directory, or a tar or zip archive.
+        compression (str or None): Compression for the text files, either gzip, zstd or None.
+        normaliser (HpoNormaliser or None): Normaliser of alternate, obsolete and unknown HPO ids.
     """
-    for phenopacket_path in all_files(phenopacket_dir):
-        prepare_input(output_dir, phenopacket_path)
+    output_dir.mkdir(exist_ok=True)
+    for phenopacket_name, phenopacket in iter_phenopackets(phenopacket_dir):
+        write_phenopacket_input(output_dir, phenopacket_name, phenopacket, compression, normaliser)
+    if normaliser is not None:
+        normaliser.report()
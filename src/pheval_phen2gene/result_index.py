@@ -0,0 +1,184 @@
+import csv
+import hashlib
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable
+
+from pheval_phen2gene.file_io import compress_file, compressed_path
+
+RESULT_INDEX = "result-index.tsv"
+PARTITIONS = 256
+
+PENDING = "pending"
+COMPLETE = "complete"
+FAILED = "failed"
+STANDARDISED = "standardised"
+
+
+@dataclass
+class IndexEntry:
+    """
+    Entry of a result index, with paths relative to the raw results and output directories.
+    Args:
+        case_id (str): Name of the case.
+        raw_result (str): Path to the raw Phen2Gene result, relative to the raw results directory.
+        standardised_result (str): Path to the standardised result, relative to the output directory.
+        status (str): Either pending, complete, failed or standardised.
+    """
+
+    case_id: str
+    raw_result: str
+    standardised_result: str = ""
+    status: str = PENDING
+
+
+class ResultIndex:
+    """Class for a hash-partitioned raw results directory and its index of cases."""
+
+    def __init__(self, results_dir: Path):
+        """
+        Initialise the ResultIndex class.
+        Args:
+            results_dir (Path): Path to the raw results directory.
+        """
+        self.results_dir = results_dir
+        self.index_path = results_dir.joinpath(RESULT_INDEX)
+        self._partition_dirs = set()
+        self._file = None
+
+    @staticmethod
+    def partition(case_id: str) -> str:
+        """
+        Get the partition of a case from a stable hash of its name.
+        Args:
+            case_id (str): Name of the case.
+        Returns:
+            str: Name of the partition subdirectory.
+        """
+        return f"{hashlib.md5(case_id.encode()).digest()[0] % PARTITIONS:02x}"
+
+    def partition_dir(self, case_id: str) -> Path:
+        """
+        Get the partition subdirectory of a case, creating it on first use.
+        Args:
+            case_id (str): Name of the case.
+        Returns:
+            Path: Path to the partition subdirectory.
+        """
+        partition_dir = self.results_dir.joinpath(self.partition(case_id))
+        if partition_dir not in self._partition_dirs:
+            partition_dir.mkdir(parents=True, exist_ok=True)
+            self._partition_dirs.add(partition_dir)
+        return partition_dir
+
+    def raw_result(self, case_id: str) -> Path:
+        """
+        Get the path Phen2Gene writes the raw result of a case to.
+        Args:
+            case_id (str): Name of the case.
+        Returns:
+            Path: Path to the raw result.
+        """
+        return self.partition_dir(case_id).joinpath(case_id)
+
+    def add(self, entry: IndexEntry) -> None:
+        """
+        Append an entry to the index, superseding any earlier entry of the case.
+        Args:
+            entry (IndexEntry): The index entry.
+        """
+        if self._file is None:
+            self.results_dir.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.index_path, "a", newline="")
+        csv.writer(self._file, delimiter="\t").writerow(
+            [entry.case_id, entry.raw_result, entry.standardised_result, entry.status]
+        )
+
+    def close(self) -> None:
+        """Close the index file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def read(self) -> Dict[str, IndexEntry]:
+        """
+        Read the index, keeping the latest entry of every case.
+        Returns:
+            Dict[str, IndexEntry]: The index entries by case name.
+        """
+        self.close()
+        entries = {}
+        if not self.index_path.exists():
+            return entries
+        with open(self.index_path, newline="") as index:
+            for row in csv.reader(index, delimiter="\t"):
+                if len(row) == 4:
+                    entries[row[0]] = IndexEntry(*row)
+        return entries
+
+    def write(self, entries: Iterable[IndexEntry]) -> None:
+        """
+        Atomically replace the index with the given entries.
+        Args:
+            entries (Iterable[IndexEntry]): The index entries.
+        """
+        self.close()
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_name(f".tmp-{RESULT_INDEX}")
+        with open(tmp_path, "w", newline="") as index:
+            writer = csv.writer(index, delimiter="\t")
+            for entry in entries:
+                writer.writerow(
+                    [entry.case_id, entry.raw_result, entry.standardised_result, entry.status]
+                )
+        os.replace(tmp_path, self.index_path)
+
+    def add_pending(self, case_id: str) -> Path:
+        """
+        Record a case about to be run, returning the partition subdirectory to write its result to.
+        Args:
+            case_id (str): Name of the case.
+        Returns:
+            Path: Path to the partition subdirectory.
+        """
+        partition_dir = self.partition_dir(case_id)
+        self.add(IndexEntry(case_id, f"{self.partition(case_id)}/{case_id}"))
+        return partition_dir
+
+
+def create_result_index(results_dir: Path, result_layout: str) -> ResultIndex or None:
+    """
+    Get the result index of a raw results directory for the configured layout.
+    Args:
+        results_dir (Path): Path to the raw results directory.
+        result_layout (str): The raw results layout, either flat or partitioned.
+    Returns:
+        ResultIndex or None: The result index, or None for a flat layout.
+    """
+    return ResultIndex(results_dir) if result_layout == "partitioned" else None
+
+
+def update_result_statuses(index: ResultIndex, compression: str or None = None) -> None:
+    """
+    Mark the cases of an index complete or failed by checking for their raw results directly,
+    compressing the raw results if configured.
+    Args:
+        index (ResultIndex): The result index.
+        compression (str or None): The compression, either gzip, zstd or None.
+    """
+    entries = index.read()
+    for entry in entries.values():
+        if entry.status != PENDING:
+            continue
+        raw_result = index.results_dir.joinpath(entry.raw_result)
+        if compression is not None and raw_result.is_file():
+            raw_result = compress_file(raw_result, compression)
+        elif compression is not None:
+            raw_result = compressed_path(raw_result, compression)
+        if raw_result.is_file():
+            entry.raw_result = raw_result.relative_to(index.results_dir).as_posix()
+            entry.status = COMPLETE
+        else:
+            entry.status = FAILED
+    index.write(entries.values())
@@ -0,0 +1,151 @@
+import importlib
+from pathlib import Path
+from typing import Callable, List
+
+import polars as pl
+from pheval.post_processing.post_processing import SortOrder
+from pheval.utils.phenopacket_utils import GeneIdentifierUpdater, create_gene_identifier_map
+
+from pheval_phen2gene.file_io import compressed_path, open_file
+from pheval_phen2gene.phenopacket_archive import resolve_phenopacket_dir
+from pheval_phen2gene.post_process.candidate_genes import (
+    find_candidate_genes_file,
+    read_candidate_genes,
+)
+from pheval_phen2gene.post_process.post_process import candidate_genes_dir, preserve_candidate_ranks
+from pheval_phen2gene.post_process.post_process_results_format import (
+    create_empty_gene_results,
+    load_phenopacket_truth_set,
+    rank_phen2gene_result,
+    write_ranked_gene_result,
+)
+from pheval_phen2gene.prepare.normalise_hpo import create_hpo_normaliser
+from pheval_phen2gene.prepare.prepare_commands import iter_case_records
+from pheval_phen2gene.result_index import STANDARDISED, IndexEntry, create_result_index
+from pheval_phen2gene.tool_specific_configuration_parser import Phen2GeneToolSpecificConfigurations
+
+
+def load_scorer(scorer: str) -> Callable[[List[str]], pl.DataFrame]:
+    """
+    Import an in-process Phen2Gene scoring function.
+    Args:
+        scorer (str): The scoring function as module:function.
+    Returns:
+        Callable[[List[str]], pl.DataFrame]: Function scoring a list of HPO ids.
+    """
+    module_name, _, function_name = scorer.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def score_case(scorer: Callable, hpo_ids: List[str]) -> pl.DataFrame:
+    """
+    Score a case in process, accepting either a polars or an Arrow frame from the scorer.
+    Args:
+        scorer (Callable): Function scoring a list of HPO ids in the Phen2Gene output format.
+        hpo_ids (List[str]): The observed HPO ids of the case.
+    Returns:
+        pl.DataFrame: Dataframe containing the Phen2Gene result.
+    """
+    phen2gene_result = scorer(hpo_ids)
+    if isinstance(phen2gene_result, pl.DataFrame):
+        return phen2gene_result
+    return pl.from_arrow(phen2gene_result)
+
+
+def write_raw_result(phen2gene_result: pl.DataFrame, raw_result: Path):
+    """
+    Write a Phen2Gene result in the Phen2Gene TSV format.
+    Args:
+        phen2gene_result (pl.DataFrame): Dataframe containing the Phen2Gene result.
+        raw_result (Path): Path to the raw result, compressed by suffix.
+    """
+    with open_file(raw_result, "wb") as raw_result_file:
+        phen2gene_result.write_csv(raw_result_file, separator="\t")
+
+
+def run_fused_pipeline(
+    config: Phen2GeneToolSpecificConfigurations,
+    testdata_dir: Path,
+    raw_results_dir: Path,
+    output_dir: Path,
+) -> None:
+    """
+    Score every case in process and standardise the results straight from memory.
+    Raw TSV results are only written when keep_raw_results is enabled.
+    Args:
+        config (Phen2GeneToolSpecificConfigurations): Phen2Gene tool configurations.
+        testdata_dir (Path): Path to the test data directory.
+        raw_results_dir (Path): Path to the raw results directory.
+        output_dir (Path): Path to the output directory.
+    """
+    scorer = load_scorer(config.scorer)
+    phenopacket_dir = resolve_phenopacket_dir(testdata_dir)
+    gene_identifier_updator = GeneIdentifierUpdater(
+        identifier_map=create_gene_identifier_map(), gene_identifier="ensembl_id"
+    )
+    sort_order = (
+        SortOrder.ASCENDING
+        if config.post_process.score_order == "ascending"
+        else SortOrder.DESCENDING
+    )
+    phenopacket_truth_set = load_phenopacket_truth_set(phenopacket_dir)
+    create_empty_gene_results(phenopacket_truth_set, output_dir.joinpath("pheval_gene_results"))
+    candidates_dir = candidate_genes_dir(phenopacket_dir, config)
+    result_index = create_result_index(raw_results_dir, config.result_layout)
+    if result_index is not None:
+        result_index.write([])
+    normaliser = create_hpo_normaliser(config.hpo_normalisation)
+    print("running phen2gene in process")
+    for case in iter_case_records(phenopacket_dir, None, normaliser=normaliser):
+        phen2gene_result = score_case(scorer, case.hpo_ids)
+        raw_result = compressed_path(
+            (
+                raw_results_dir.joinpath(case.output_file_name)
+                if result_index is None
+                else result_index.raw_result(case.output_file_name)
+            ),
+            config.compression,
+        )
+        if config.keep_raw_results:
+            write_raw_result(phen2gene_result, raw_result)
+        candidate_genes_file = (
+            None
+            if candidates_dir is None
+            else find_candidate_genes_file(case.output_file_name, candidates_dir)
+        )
+        write_ranked_gene_result(
+            ranked_results=rank_phen2gene_result(
+                phen2gene_result=phen2gene_result,
+                gene_identifier_updator=gene_identifier_updator,
+                sort_order=sort_order,
+                presorted_fast_path=config.post_process.presorted_fast_path,
+                candidate_genes=(
+                    None
+                    if candidate_genes_file is None
+                    else read_candidate_genes(candidate_genes_file)
+                ),
+                preserve_candidate_ranks=preserve_candidate_ranks(config),
+            ),
+            output_dir=output_dir,
+            result_path=Path(case.output_file_name),
+            phenopacket_truth_set=phenopacket_truth_set,
+        )
+        if result_index is not None:
+            result_index.add(
+                IndexEntry(
+                    case_id=case.output_file_name,
+                    raw_result=(
+                        raw_result.relative_to(raw_results_dir).as_posix()
+                        if config.keep_raw_results
+                        else ""
+                    ),
+                    standardised_result=(
+                        f"pheval_gene_results/{case.output_file_name}-gene_result.parquet"
+                    ),
+                    status=STANDARDISED,
+                )
+            )
+    if result_index is not None:
+        result_index.close()
+    if normaliser is not None:
+        normaliser.report()
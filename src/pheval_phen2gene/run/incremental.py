@@ -0,0 +1,405 @@
+import os
+import re
+import shutil
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Set
+
+import polars as pl
+from pheval.utils.phenopacket_utils import GeneIdentifierUpdater, create_gene_identifier_map
+
+from pheval_phen2gene.file_io import COMPRESSION_SUFFIXES, compressed_path
+from pheval_phen2gene.phenopacket_archive import (
+    archive_directory,
+    resolve_phenopacket_dir,
+    restore_archived_directory,
+)
+from pheval_phen2gene.post_process.post_process import (
+    candidate_genes_dir,
+    preserve_candidate_ranks,
+)
+from pheval_phen2gene.post_process.post_process_results_format import (
+    create_empty_gene_results,
+    load_phenopacket_truth_set,
+    write_standardised_result,
+)
+from pheval_phen2gene.prepare.normalise_hpo import create_hpo_normaliser
+from pheval_phen2gene.prepare.prepare_commands import (
+    CaseRecord,
+    CommandWriter,
+    HpoIdInterner,
+    iter_case_records,
+)
+from pheval_phen2gene.result_index import (
+    RESULT_INDEX,
+    ResultIndex,
+    create_result_index,
+    update_result_statuses,
+)
+from pheval_phen2gene.run.parallel import run_jobs
+from pheval_phen2gene.run.stage_data import file_checksum, use_staged_data_dir
+from pheval_phen2gene.run.sweep import create_job_runner, write_case_job
+from pheval_phen2gene.tool_specific_configuration_parser import Phen2GeneToolSpecificConfigurations
+
+HPO_TERM_FILE = re.compile(r"^HP[:_](\d{7})")
+
+
+@dataclass
+class KnowledgeBaseDiff:
+    """
+    Differences between two versions of the Phen2Gene data directory.
+    Args:
+        changed_terms (Set[str]): HPO terms whose term-specific files were added, removed or changed.
+        global_change (bool): Whether any file not specific to an HPO term changed.
+    """
+
+    changed_terms: Set[str] = field(default_factory=set)
+    global_change: bool = False
+
+
+@dataclass
+class RescorePlan:
+    """
+    Plan of which cases to re-run after a knowledge base upgrade.
+    Args:
+        rescore (List[str]): Cases to run with Phen2Gene again.
+        repost_process (List[str]): Cases whose previous raw result is post-processed again,
+            because their gene identifier mappings changed.
+        carry_over (List[str]): Cases whose previous raw and standardised results are kept.
+    """
+
+    rescore: List[str] = field(default_factory=list)
+    repost_process: List[str] = field(default_factory=list)
+    carry_over: List[str] = field(default_factory=list)
+
+
+def knowledge_base_manifest(data_dir: Path) -> Dict[str, str]:
+    """
+    Checksum every file of a Phen2Gene data directory.
+    Args:
+        data_dir (Path): Path to the Phen2Gene data directory.
+    Returns:
+        Dict[str, str]: SHA-256 checksums by path relative to the data directory.
+    """
+    manifest = {}
+    for root, _dirs, files in os.walk(data_dir, followlinks=True):
+        for file_name in files:
+            file_path = Path(root, file_name)
+            manifest[file_path.relative_to(data_dir).as_posix()] = file_checksum(file_path)
+    return manifest
+
+
+def diff_knowledge_bases(
+    old_manifest: Dict[str, str], new_manifest: Dict[str, str]
+) -> KnowledgeBaseDiff:
+    """
+    Diff two versions of the Phen2Gene data directory at the HPO term level.
+    Files named after an HPO term, such as Knowledgebase/HP_0000256.candidate_gene_list, only
+    affect cases with that term; a change to any other file affects every case.
+    Args:
+        old_manifest (Dict[str, str]): Checksums of the previous data directory.
+        new_manifest (Dict[str, str]): Checksums of the upgraded data directory.
+    Returns:
+        KnowledgeBaseDiff: The differences between the versions.
+    """
+    kb_diff = KnowledgeBaseDiff()
+    for relative_path in old_manifest.keys() | new_manifest.keys():
+        if old_manifest.get(relative_path) == new_manifest.get(relative_path):
+            continue
+        term = HPO_TERM_FILE.match(Path(relative_path).name)
+        if term is None:
+            kb_diff.global_change = True
+        else:
+            kb_diff.changed_terms.add(f"HP:{term.group(1)}")
+    return kb_diff
+
+
+def find_raw_result(raw_results_dir: Path, case_id: str) -> Path or None:
+    """
+    Find the raw result of a case in a flat or partitioned raw results directory.
+    Args:
+        raw_results_dir (Path): Path to the raw results directory.
+        case_id (str): Name of the case.
+    Returns:
+        Path or None: Path to the raw result, or None if the case has none.
+    """
+    if raw_results_dir.joinpath(RESULT_INDEX).exists():
+        raw_results_dir = raw_results_dir.joinpath(ResultIndex.partition(case_id))
+    for suffix in ["", *COMPRESSION_SUFFIXES.values()]:
+        raw_result = raw_results_dir.joinpath(case_id + suffix)
+        if raw_result.is_file():
+            return raw_result
+    return None
+
+
+class CurrentIdentifiers:
+    """Class for looking up the current gene identifier of every distinct gene symbol only once."""
+
+    def __init__(self, gene_identifier_updator: GeneIdentifierUpdater):
+        """
+        Initialise the CurrentIdentifiers class.
+        Args:
+            gene_identifier_updator (GeneIdentifierUpdater): The current gene identifier updater.
+        """
+        self.gene_identifier_updator = gene_identifier_updator
+        self.identifiers: Dict[str, str] = {}
+
+    def get(self, gene_symbol: str) -> str or None:
+        """
+        Get the current gene identifier of a gene symbol.
+        Args:
+            gene_symbol (str): The gene symbol.
+        Returns:
+            str or None: The current gene identifier.
+        """
+        if gene_symbol not in self.identifiers:
+            self.identifiers[gene_symbol] = self.gene_identifier_updator.find_identifier(
+                gene_symbol
+            )
+        return self.identifiers[gene_symbol]
+
+
+def identifiers_changed(standardised_result: Path, current_identifiers: CurrentIdentifiers) -> bool:
+    """
+    Check whether the gene identifiers of a standardised result differ from the current mapping.
+    Args:
+        standardised_result (Path): Path to the standardised gene result.
+        current_identifiers (CurrentIdentifiers): The current gene identifiers.
+    Returns:
+        bool: True if any ranked gene maps to a different identifier now.
+    """
+    ranked_genes = (
+        pl.read_parquet(standardised_result, columns=["rank", "gene_symbol", "gene_identifier"])
+        .filter(pl.col("rank") > 0)
+        .select(["gene_symbol", "gene_identifier"])
+        .unique()
+    )
+    return any(
+        current_identifiers.get(gene_symbol) != gene_identifier
+        for gene_symbol, gene_identifier in ranked_genes.iter_rows()
+    )
+
+
+def plan_incremental_rescore(
+    cases: Iterable[CaseRecord],
+    interner: HpoIdInterner,
+    kb_diff: KnowledgeBaseDiff,
+    previous_run_dir: Path,
+    gene_identifier_updator: GeneIdentifierUpdater,
+) -> RescorePlan:
+    """
+    Plan which cases to re-run, re-post-process or carry over after a knowledge base upgrade.
+    Args:
+        cases (Iterable[CaseRecord]): The cases of the corpus.
+        interner (HpoIdInterner): Interner of the observed HPO ids of the cases.
+        kb_diff (KnowledgeBaseDiff): The differences between the data directory versions.
+        previous_run_dir (Path): Path to the output directory of the previous run.
+        gene_identifier_updator (GeneIdentifierUpdater): The current gene identifier updater.
+    Returns:
+        RescorePlan: The plan.
+    """
+    changed_codes = {
+        interner.codes[term] for term in kb_diff.changed_terms if term in interner.codes
+    }
+    current_identifiers = CurrentIdentifiers(gene_identifier_updator)
+    plan = RescorePlan()
+    for case in cases:
+        case_id = case.output_file_name
+        standardised_result = previous_run_dir.joinpath(
+            f"pheval_gene_results/{case_id}-gene_result.parquet"
+        )
+        if (
+            kb_diff.global_change
+            or case.hpo_codes is None
+            or not changed_codes.isdisjoint(case.hpo_codes)
+            or find_raw_result(previous_run_dir.joinpath("raw_results"), case_id) is None
+            or not standardised_result.exists()
+        ):
+            plan.rescore.append(case_id)
+        elif identifiers_changed(standardised_result, current_identifiers):
+            plan.repost_process.append(case_id)
+        else:
+            plan.carry_over.append(case_id)
+    return plan
+
+
+def carry_over_file(source: Path, destination: Path, hard_link: bool = False) -> None:
+    """
+    Carry a result over from the previous run.
+    Only files that are never rewritten in place, such as raw results, should be hard linked.
+    Args:
+        source (Path): Path to the previous result.
+        destination (Path): Path to the result in the new run.
+        hard_link (bool): Hard link the file where the filesystem allows it instead of copying it.
+    """
+    if destination.exists():
+        destination.unlink()
+    if hard_link:
+        try:
+            os.link(source, destination)
+            return
+        except OSError:
+            pass
+    shutil.copy2(source, destination)
+
+
+def run_incremental_rescore(
+    config: Phen2GeneToolSpecificConfigurations,
+    input_dir: Path,
+    testdata_dir: Path,
+    old_data_dir: Path,
+    previous_run_dir: Path,
+    output_dir: Path,
+) -> RescorePlan:
+    """
+    Re-run a corpus after a knowledge base upgrade, scoring only the cases with an HPO term whose
+    data changed and carrying over the previous results of the rest.
+    Cases are rescored with the same configuration as a full run, so the previous run must have
+    used the same configuration for its carried over results to match.
+    Raw results of the previous run that were archived are restored for the run and archived again
+    afterwards.
+    Args:
+        config (Phen2GeneToolSpecificConfigurations): Phen2Gene tool configurations of the run.
+        input_dir (Path): Path to the input directory with the upgraded Phen2Gene data directory.
+        testdata_dir (Path): Path to the test data directory.
+        old_data_dir (Path): Path to the Phen2Gene data directory of the previous run.
+        previous_run_dir (Path): Path to the output directory of the previous run.
+        output_dir (Path): Path to the output directory of the new run.
+    Returns:
+        RescorePlan: The executed plan.
+    """
+    if config.scorer is not None or config.sweep is not None:
+        raise ValueError("incremental rescoring does not support a scorer or a sweep")
+    previous_raw_results_dir = previous_run_dir.joinpath("raw_results")
+    restored = restore_archived_directory(previous_raw_results_dir)
+    try:
+        with (
+            nullcontext()
+            if config.staging is None
+            else use_staged_data_dir(input_dir.joinpath("lib"), config.staging)
+        ) as staged_data_dir:
+            return _run_incremental_rescore(
+                config,
+                input_dir,
+                testdata_dir,
+                old_data_dir,
+                previous_run_dir,
+                output_dir,
+                staged_data_dir,
+            )
+    finally:
+        if restored:
+            archive_directory(previous_raw_results_dir)
+
+
+def _run_incremental_rescore(
+    config: Phen2GeneToolSpecificConfigurations,
+    input_dir: Path,
+    testdata_dir: Path,
+    old_data_dir: Path,
+    previous_run_dir: Path,
+    output_dir: Path,
+    staged_data_dir: Path or None,
+) -> RescorePlan:
+    kb_diff = diff_knowledge_bases(
+        knowledge_base_manifest(old_data_dir),
+        knowledge_base_manifest(input_dir.joinpath("lib")),
+    )
+    print(
+        f"{len(kb_diff.changed_terms)} HPO terms changed"
+        + (", including changes affecting every term" if kb_diff.global_change else "")
+    )
+    gene_identifier_updator = GeneIdentifierUpdater(
+        identifier_map=create_gene_identifier_map(), gene_identifier="ensembl_id"
+    )
+    phenopacket_dir = resolve_phenopacket_dir(testdata_dir)
+    tool_input_commands_dir = output_dir.joinpath("tool_input_commands")
+    tool_input_commands_dir.mkdir(parents=True, exist_ok=True)
+    file_prefix = os.path.basename(testdata_dir)
+    interner = HpoIdInterner()
+    normaliser = create_hpo_normaliser(config.hpo_normalisation)
+    cases = {
+        case.output_file_name: case
+        for case in iter_case_records(phenopacket_dir, None, interner, normaliser)
+    }
+    if normaliser is not None:
+        normaliser.report()
+        normaliser.write_report(
+            tool_input_commands_dir.joinpath(f"{file_prefix}-hpo-normalisation.tsv")
+        )
+    plan = plan_incremental_rescore(
+        cases.values(), interner, kb_diff, previous_run_dir, gene_identifier_updator
+    )
+    print(
+        f"rescoring {len(plan.rescore)}, re-post-processing {len(plan.repost_process)} "
+        f"and carrying over {len(plan.carry_over)} cases"
+    )
+    raw_results_dir = output_dir.joinpath("raw_results")
+    raw_results_dir.mkdir(parents=True, exist_ok=True)
+    result_index = create_result_index(raw_results_dir, config.result_layout)
+    if result_index is not None:
+        result_index.write([])
+    command_writer = CommandWriter(
+        compressed_path(
+            tool_input_commands_dir.joinpath(f"{file_prefix}-incremental-phen2gene-batch.txt"),
+            config.compression,
+        )
+    )
+    jobs = [
+        write_case_job(
+            config=config,
+            case_id=case_id,
+            hpo_ids=interner.decode(cases[case_id].hpo_codes),
+            output_dir=(
+                raw_results_dir if result_index is None else result_index.add_pending(case_id)
+            ),
+            path_to_phen2gene_dir=input_dir.joinpath(config.phen2gene_python_executable),
+            data_dir=input_dir.joinpath("lib") if staged_data_dir is None else staged_data_dir,
+            command_writer=command_writer,
+        )
+        for case_id in plan.rescore
+    ]
+    command_writer.close()
+    failed = run_jobs(
+        jobs,
+        create_job_runner(config, input_dir, staged_data_dir),
+        config.max_workers,
+        config.speculation,
+    )
+    if failed:
+        print(f"{failed} phen2gene commands failed")
+    for case_id in plan.repost_process + plan.carry_over:
+        previous_raw_result = find_raw_result(previous_run_dir.joinpath("raw_results"), case_id)
+        carry_over_file(
+            previous_raw_result,
+            (
+                raw_results_dir if result_index is None else result_index.add_pending(case_id)
+            ).joinpath(previous_raw_result.name),
+            hard_link=True,
+        )
+    if result_index is not None:
+        result_index.close()
+        update_result_statuses(result_index, config.compression)
+    phenopacket_truth_set = load_phenopacket_truth_set(phenopacket_dir)
+    gene_results_dir = output_dir.joinpath("pheval_gene_results")
+    create_empty_gene_results(phenopacket_truth_set, gene_results_dir)
+    for case_id in plan.carry_over:
+        carry_over_file(
+            previous_run_dir.joinpath(f"pheval_gene_results/{case_id}-gene_result.parquet"),
+            gene_results_dir.joinpath(f"{case_id}-gene_result.parquet"),
+        )
+    for case_id in plan.rescore + plan.repost_process:
+        raw_result = find_raw_result(raw_results_dir, case_id)
+        if raw_result is not None:
+            write_standardised_result(
+                result=raw_result,
+                output_dir=output_dir,
+                phenopacket_truth_set=phenopacket_truth_set,
+                gene_identifier_updator=gene_identifier_updator,
+                sort_order=config.post_process.score_order,
+                presorted_fast_path=config.post_process.presorted_fast_path,
+                candidate_genes_dir=candidate_genes_dir(phenopacket_dir, config),
+                preserve_candidate_ranks=preserve_candidate_ranks(config),
+            )
+    return plan
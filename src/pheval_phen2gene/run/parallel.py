@@ -0,0 +1,481 @@
+import dataclasses
+import os
+import queue
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterable, List, Set
+
+import docker
+
+from pheval_phen2gene.file_io import compress_file
+from pheval_phen2gene.run.resources import docker_resource_options, run_limited
+from pheval_phen2gene.run.run import mount_docker
+from pheval_phen2gene.tool_specific_configuration_parser import Resources, Speculation
+
+ATTEMPTS_DIR = ".attempts"
+
+
+@dataclass
+class Phen2GeneJob:
+    """
+    A single Phen2Gene command to run in a parallel worker pool.
+    Args:
+        case_id (str): Name of the case.
+        hpo_count (int): The number of HPO ids of the case.
+        command (List[str]): The Phen2Gene command.
+        output_dir (Path): Path to the directory Phen2Gene writes the result to.
+    """
+
+    case_id: str
+    hpo_count: int
+    command: List[str]
+    output_dir: Path
+
+
+class Cancellation:
+    """Class for killing a running job attempt from another thread."""
+
+    def __init__(self):
+        """Initialise the Cancellation class."""
+        self.kill: Callable[[], None] or None = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    def register(self, kill: Callable[[], None]) -> None:
+        """
+        Register how to kill the started attempt, killing it straight away if already cancelled.
+        Args:
+            kill (Callable[[], None]): Function killing the attempt.
+        """
+        with self.lock:
+            self.kill = kill
+            if self.cancelled:
+                kill()
+
+    def cancel(self) -> None:
+        """Kill the attempt, or kill it as soon as it has started."""
+        with self.lock:
+            self.cancelled = True
+            if self.kill is not None:
+                self.kill()
+
+
+def run_local_job(
+    job: Phen2GeneJob, worker_slot: int, cancellation: Cancellation or None = None
+) -> int:
+    """
+    Run a Phen2Gene job locally.
+    Args:
+        job (Phen2GeneJob): The Phen2Gene job.
+        worker_slot (int): Index of the worker slot running the job.
+        cancellation (Cancellation or None): Cancellation to register the process with.
+    Returns:
+        int: The exit code of the command.
+    """
+    process = subprocess.Popen(job.command, shell=False)
+    if cancellation is not None:
+        cancellation.register(process.kill)
+    return process.wait()
+
+
+def local_job_runner(resources: Resources or None = None) -> Callable[..., int]:
+    """
+    Create a function running Phen2Gene jobs locally, pinning each worker slot to its own CPUs.
+    Args:
+        resources (Resources or None): CPU pinning, NUMA placement, memory limits and priorities.
+    Returns:
+        Callable[..., int]: Function running a job in a worker slot, optionally with a
+            cancellation, and returning its exit code.
+    """
+    if resources is None:
+        return run_local_job
+
+    def run_limited_local_job(
+        job: Phen2GeneJob, worker_slot: int, cancellation: Cancellation or None = None
+    ) -> int:
+        return run_limited(
+            job.command,
+            worker_slot,
+            resources,
+            on_start=(
+                None
+                if cancellation is None
+                else lambda process: cancellation.register(process.kill)
+            ),
+        )
+
+    return run_limited_local_job
+
+
+def compressing_job_runner(run_job: Callable[..., int], compression: str) -> Callable[..., int]:
+    """
+    Wrap a job runner to compress the raw result of every job as soon as its command succeeds.
+    Args:
+        run_job (Callable[..., int]): Function running a job and returning its exit code.
+        compression (str): The compression, either gzip or zstd.
+    Returns:
+        Callable[..., int]: Function running a job in a worker slot, optionally with a
+            cancellation, and returning its exit code.
+    """
+
+    def run_compressed_job(
+        job: Phen2GeneJob, worker_slot: int, cancellation: Cancellation or None = None
+    ) -> int:
+        exit_code = run_job(job, worker_slot, cancellation)
+        raw_result = job.output_dir.joinpath(job.case_id)
+        if exit_code == 0 and raw_result.is_file():
+            compress_file(raw_result, compression)
+        return exit_code
+
+    return run_compressed_job
+
+
+def docker_job_runner(
+    data_dir: Path, read_only: bool = False, resources: Resources or None = None
+) -> Callable[..., int]:
+    """
+    Create a function running Phen2Gene jobs with docker.
+    Args:
+        data_dir (Path): Path to the directory mounted as the Phen2Gene data directory.
+        read_only (bool): Mount the data directory read-only.
+        resources (Resources or None): CPU pinning, NUMA placement and memory limits of containers.
+    Returns:
+        Callable[..., int]: Function running a job in a worker slot, optionally with a
+            cancellation, and returning its exit code.
+    """
+    client = docker.from_env()
+
+    def run_docker_job(
+        job: Phen2GeneJob, worker_slot: int, cancellation: Cancellation or None = None
+    ) -> int:
+        mounts = mount_docker(output_dir=job.output_dir, input_dir=data_dir, read_only=read_only)
+        container = client.containers.run(
+            "genomicslab/phen2gene",
+            job.command,
+            volumes=[mounts.results_dir, mounts.input_dir],
+            detach=True,
+            **({} if resources is None else docker_resource_options(worker_slot, resources)),
+        )
+
+        def kill_container() -> None:
+            try:
+                container.kill()
+            except docker.errors.APIError:
+                # The container has already exited.
+                pass
+
+        if cancellation is not None:
+            cancellation.register(kill_container)
+        exit_code = container.wait()["StatusCode"]
+        container.remove()
+        return exit_code
+
+    return run_docker_job
+
+
+def _run_in_slot(
+    run_job: Callable[[Phen2GeneJob, int], int], job: Phen2GeneJob, worker_slots: queue.Queue
+) -> int:
+    """Run a job holding a worker slot for its duration."""
+    worker_slot = worker_slots.get()
+    try:
+        return run_job(job, worker_slot)
+    finally:
+        worker_slots.put(worker_slot)
+
+
+def runtime_bucket(hpo_count: int) -> int:
+    """
+    Bucket HPO counts of similar size by powers of two, such as 2-3, 4-7 and 8-15 HPO ids.
+    Args:
+        hpo_count (int): The number of HPO ids of a case.
+    Returns:
+        int: The bucket of the HPO count.
+    """
+    return hpo_count.bit_length()
+
+
+class RuntimeTracker:
+    """Class for tracking the runtimes of completed jobs by the HPO count of their cases."""
+
+    def __init__(self, speculation: Speculation, window: int = 1000):
+        """
+        Initialise the RuntimeTracker class.
+        Args:
+            speculation (Speculation): The speculative re-execution configurations.
+            window (int): The number of most recent runtimes kept per HPO count bucket.
+        """
+        self.speculation = speculation
+        self.runtimes: Dict[int, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self.medians: Dict[int, float] = {}
+        self.lock = threading.Lock()
+
+    def record(self, hpo_count: int, runtime: float) -> None:
+        """
+        Record the runtime of a completed job.
+        Args:
+            hpo_count (int): The number of HPO ids of the case.
+            runtime (float): The runtime of the job in seconds.
+        """
+        bucket = runtime_bucket(hpo_count)
+        with self.lock:
+            self.runtimes[bucket].append(runtime)
+            self.medians.pop(bucket, None)
+
+    def is_straggler(self, hpo_count: int, elapsed: float) -> bool:
+        """
+        Check whether a running job is far slower than completed jobs with a similar HPO count.
+        Args:
+            hpo_count (int): The number of HPO ids of the case.
+            elapsed (float): How long the job has been running in seconds.
+        Returns:
+            bool: True if the job is a straggler.
+        """
+        if elapsed < self.speculation.min_runtime_seconds:
+            return False
+        bucket = runtime_bucket(hpo_count)
+        with self.lock:
+            runtimes = self.runtimes.get(bucket)
+            if runtimes is None or len(runtimes) < self.speculation.min_samples:
+                return False
+            if bucket not in self.medians:
+                self.medians[bucket] = statistics.median(runtimes)
+            return elapsed > self.speculation.slowdown * self.medians[bucket]
+
+
+def retarget_job(job: Phen2GeneJob, output_dir: Path) -> Phen2GeneJob:
+    """
+    Copy a job to write its result to another output directory.
+    Args:
+        job (Phen2GeneJob): The Phen2Gene job.
+        output_dir (Path): Path to the other output directory.
+    Returns:
+        Phen2GeneJob: The retargeted job.
+    """
+    return dataclasses.replace(
+        job,
+        command=[
+            f"{output_dir}{os.sep}" if argument == f"{job.output_dir}{os.sep}" else argument
+            for argument in job.command
+        ],
+        output_dir=output_dir,
+    )
+
+
+def attempts_dir(output_dir: Path) -> Path:
+    """
+    Get the scratch directory of the job attempts writing to an output directory.
+    It is a sibling of the output directory, so attempts left behind by a crash never mix with the
+    results, while publishing them stays an atomic rename on the same filesystem.
+    Args:
+        output_dir (Path): Path to the output directory of the jobs.
+    Returns:
+        Path: Path to the scratch directory.
+    """
+    return output_dir.parent.joinpath(ATTEMPTS_DIR)
+
+
+def publish_results(attempt_dir: Path, output_dir: Path) -> None:
+    """
+    Atomically move the results of a job attempt into the output directory.
+    Args:
+        attempt_dir (Path): Path to the output directory of the attempt.
+        output_dir (Path): Path to the output directory of the job.
+    """
+    with os.scandir(attempt_dir) as entries:
+        for entry in entries:
+            if entry.is_file():
+                os.replace(entry.path, output_dir.joinpath(entry.name))
+
+
+@dataclass(eq=False)
+class _SpeculativeJob:
+    """A job with one or more attempts racing to produce its result."""
+
+    job: Phen2GeneJob
+    attempts: int = 1
+    failures: int = 0
+    started: float = None
+    exit_code: int = None
+    cancellations: List[Cancellation] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def cancel_attempts(self) -> None:
+        """Kill every running attempt of the job."""
+        for cancellation in self.cancellations:
+            cancellation.cancel()
+
+
+def _run_attempt(
+    run_job: Callable[..., int],
+    speculative_job: _SpeculativeJob,
+    worker_slots: queue.Queue,
+    tracker: RuntimeTracker,
+) -> None:
+    """Run an attempt of a job in its own output directory, publishing its results if it wins."""
+    job = speculative_job.job
+    worker_slot = worker_slots.get()
+    cancellation = Cancellation()
+    start = time.monotonic()
+    with speculative_job.lock:
+        if speculative_job.exit_code is not None:
+            worker_slots.put(worker_slot)
+            return
+        if speculative_job.started is None:
+            speculative_job.started = start
+        speculative_job.cancellations.append(cancellation)
+    scratch_dir = attempts_dir(job.output_dir)
+    scratch_dir.mkdir(exist_ok=True)
+    attempt_dir = Path(tempfile.mkdtemp(prefix=f"{job.case_id}.attempt-", dir=scratch_dir))
+    try:
+        exit_code = run_job(retarget_job(job, attempt_dir), worker_slot, cancellation)
+        with speculative_job.lock:
+            speculative_job.cancellations.remove(cancellation)
+            if speculative_job.exit_code is not None:
+                return
+            if exit_code == 0:
+                publish_results(attempt_dir, job.output_dir)
+                speculative_job.exit_code = 0
+                tracker.record(job.hpo_count, time.monotonic() - start)
+                speculative_job.cancel_attempts()
+            else:
+                speculative_job.failures += 1
+                if speculative_job.failures == speculative_job.attempts:
+                    speculative_job.exit_code = exit_code
+    finally:
+        shutil.rmtree(attempt_dir, ignore_errors=True)
+        worker_slots.put(worker_slot)
+
+
+def _claim_stragglers(
+    unfinished: Set[_SpeculativeJob], tracker: RuntimeTracker, idle_workers: int
+) -> List[_SpeculativeJob]:
+    """Claim a second attempt for the longest running stragglers, up to the number of idle workers."""
+    now = time.monotonic()
+    stragglers = []
+    for speculative_job in sorted(
+        unfinished, key=lambda job: now if job.started is None else job.started
+    ):
+        if len(stragglers) >= idle_workers:
+            break
+        with speculative_job.lock:
+            if (
+                speculative_job.exit_code is None
+                and speculative_job.attempts == 1
+                and speculative_job.started is not None
+                and tracker.is_straggler(
+                    speculative_job.job.hpo_count, now - speculative_job.started
+                )
+            ):
+                speculative_job.attempts += 1
+                stragglers.append(speculative_job)
+    return stragglers
+
+
+def run_speculative_jobs(
+    jobs: Iterable[Phen2GeneJob],
+    run_job: Callable[[Phen2GeneJob, int, Cancellation], int],
+    max_workers: int,
+    speculation: Speculation,
+) -> int:
+    """
+    Run Phen2Gene jobs over a pool of workers, re-running stragglers on idle workers.
+    Every attempt writes to its own temporary directory next to the output directory, and the
+    results of the first successful attempt are moved into place atomically, so a result is never written twice.
+    The other attempt is killed through the cancellation it registered with.
+    Args:
+        jobs (Iterable[Phen2GeneJob]): The Phen2Gene jobs.
+        run_job (Callable[[Phen2GeneJob, int, Cancellation], int]): Function running a job in a
+            worker slot, registering how to kill it with the cancellation.
+        max_workers (int): The number of jobs to run in parallel.
+        speculation (Speculation): The speculative re-execution configurations.
+    Returns:
+        int: The number of jobs that failed.
+    """
+    worker_slots = queue.Queue()
+    for worker_slot in range(max_workers):
+        worker_slots.put(worker_slot)
+    tracker = RuntimeTracker(speculation)
+    running: Dict[Future, _SpeculativeJob] = {}
+    unfinished: Set[_SpeculativeJob] = set()
+    failed = 0
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit(speculative_job: _SpeculativeJob) -> None:
+        running[executor.submit(_run_attempt, run_job, speculative_job, worker_slots, tracker)] = (
+            speculative_job
+        )
+
+    def reap(timeout: float or None) -> None:
+        nonlocal failed
+        for future in wait(running, timeout=timeout, return_when=FIRST_COMPLETED).done:
+            running.pop(future)
+            future.result()
+        for speculative_job in [job for job in unfinished if job.exit_code is not None]:
+            unfinished.remove(speculative_job)
+            failed += speculative_job.exit_code != 0
+
+    def speculate() -> None:
+        idle_workers = max_workers - sum(not future.done() for future in running)
+        for speculative_job in _claim_stragglers(unfinished, tracker, idle_workers):
+            print(f"speculatively re-running straggling case {speculative_job.job.case_id}")
+            submit(speculative_job)
+
+    try:
+        for job in jobs:
+            while len(running) >= 2 * max_workers:
+                reap(None)
+            speculative_job = _SpeculativeJob(job)
+            unfinished.add(speculative_job)
+            submit(speculative_job)
+        while unfinished:
+            reap(speculation.check_interval_seconds)
+            speculate()
+    finally:
+        for speculative_job in unfinished:
+            with speculative_job.lock:
+                speculative_job.cancel_attempts()
+        executor.shutdown(wait=True)
+    return failed
+
+
+def run_jobs(
+    jobs: Iterable[Phen2GeneJob],
+    run_job: Callable[..., int],
+    max_workers: int,
+    speculation: Speculation or None = None,
+) -> int:
+    """
+    Run Phen2Gene jobs over a pool of workers, consuming the jobs lazily.
+    Args:
+        jobs (Iterable[Phen2GeneJob]): The Phen2Gene jobs.
+        run_job (Callable[..., int]): Function running a job in a worker slot. With speculation,
+            it is also passed a cancellation to register how to kill the job with.
+        max_workers (int): The number of jobs to run in parallel.
+        speculation (Speculation or None): Speculatively re-run stragglers on idle workers.
+    Returns:
+        int: The number of jobs that failed.
+    """
+    if speculation is not None:
+        return run_speculative_jobs(jobs, run_job, max_workers, speculation)
+    worker_slots = queue.Queue()
+    for worker_slot in range(max_workers):
+        worker_slots.put(worker_slot)
+    failed = 0
+    running: Set[Future] = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for job in jobs:
+            if len(running) >= 2 * max_workers:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                failed += sum(future.result() != 0 for future in done)
+            running.add(executor.submit(_run_in_slot, run_job, job, worker_slots))
+        failed += sum(future.result() != 0 for future in wait(running).done)
+    return failed
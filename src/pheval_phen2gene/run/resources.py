@@ -0,0 +1,172 @@
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import IO, Callable, Dict, List
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from pheval_phen2gene.tool_specific_configuration_parser import IO_PRIORITY_CLASSES, Resources
+
+NUMA_NODES_DIR = Path("/sys/devices/system/node")
+
+
+def parse_cpu_list(cpu_list: str) -> List[int]:
+    """
+    Parse a kernel CPU list, such as 0-3,8,10-11.
+    Args:
+        cpu_list (str): The CPU list.
+    Returns:
+        List[int]: The CPUs in the list.
+    """
+    cpus = []
+    for cpu_range in cpu_list.strip().split(","):
+        if not cpu_range:
+            continue
+        start, _, end = cpu_range.partition("-")
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def available_cpus() -> List[int]:
+    """
+    Get the CPUs this process may run on.
+    Returns:
+        List[int]: The available CPUs.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def numa_nodes(nodes_dir: Path = NUMA_NODES_DIR) -> List[List[int]]:
+    """
+    Get the available CPUs of every NUMA node, or of a single node where NUMA is not exposed.
+    Args:
+        nodes_dir (Path): Path to the sysfs NUMA node directory.
+    Returns:
+        List[List[int]]: The available CPUs of every NUMA node.
+    """
+    cpus = set(available_cpus())
+    nodes = []
+    for node_dir in sorted(nodes_dir.glob("node[0-9]*"), key=lambda node: int(node.name[4:])):
+        node_cpus = [
+            cpu for cpu in parse_cpu_list(node_dir.joinpath("cpulist").read_text()) if cpu in cpus
+        ]
+        if node_cpus:
+            nodes.append(node_cpus)
+    return nodes or [sorted(cpus)]
+
+
+def worker_cpu_set(
+    worker_slot: int, resources: Resources, nodes: List[List[int]] or None = None
+) -> List[int] or None:
+    """
+    Get the CPUs to pin a worker slot to. With NUMA spreading, consecutive slots are placed on
+    different NUMA nodes and every slot stays within one node.
+    Args:
+        worker_slot (int): Index of the worker slot.
+        resources (Resources): The resource configurations.
+        nodes (List[List[int]] or None): The available CPUs of every NUMA node.
+    Returns:
+        List[int] or None: The CPUs of the worker slot, or None to leave the worker unpinned.
+    """
+    if resources.cpus_per_worker is None:
+        return None
+    if nodes is None:
+        nodes = numa_nodes() if resources.numa_spread else [available_cpus()]
+    if resources.numa_spread:
+        cpus = nodes[worker_slot % len(nodes)]
+        worker_slot //= len(nodes)
+    else:
+        cpus = [cpu for node in nodes for cpu in node]
+    start = worker_slot * resources.cpus_per_worker
+    return [
+        cpus[(start + offset) % len(cpus)]
+        for offset in range(min(resources.cpus_per_worker, len(cpus)))
+    ]
+
+
+def limit_process(pid: int, cpus: List[int] or None, resources: Resources) -> None:
+    """
+    Apply the CPU affinity, memory limit and nice value to a started process. Limits are applied
+    by process id rather than in a preexec_fn, which is not safe in threaded worker pools.
+    Args:
+        pid (int): Id of the process.
+        cpus (List[int] or None): The CPUs to pin the process to.
+        resources (Resources): The resource configurations.
+    """
+    if cpus is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(pid, cpus)
+    if resources.memory_limit_mb is not None and hasattr(resource, "prlimit"):
+        memory_limit = resources.memory_limit_mb * 1024 * 1024
+        resource.prlimit(pid, resource.RLIMIT_AS, (memory_limit, memory_limit))
+    if resources.nice is not None and hasattr(os, "setpriority"):
+        os.setpriority(os.PRIO_PROCESS, pid, os.getpriority(os.PRIO_PROCESS, 0) + resources.nice)
+
+
+def run_limited(
+    command: List[str],
+    worker_slot: int,
+    resources: Resources,
+    stdin: IO or None = None,
+    on_start: Callable[[subprocess.Popen], None] or None = None,
+) -> int:
+    """
+    Run a command in a worker slot, pinned to the CPUs of the slot with its limits and priorities.
+    Args:
+        command (List[str]): The command.
+        worker_slot (int): Index of the worker slot.
+        resources (Resources): The resource configurations.
+        stdin (IO or None): Binary stream to copy to the standard input of the command.
+        on_start (Callable[[subprocess.Popen], None] or None): Called with the started process.
+    Returns:
+        int: The exit code of the command.
+    """
+    process = subprocess.Popen(
+        ionice_prefix(resources) + command,
+        stdin=None if stdin is None else subprocess.PIPE,
+        shell=False,
+    )
+    limit_process(process.pid, worker_cpu_set(worker_slot, resources), resources)
+    if on_start is not None:
+        on_start(process)
+    if stdin is not None:
+        shutil.copyfileobj(stdin, process.stdin)
+        process.stdin.close()
+    return process.wait()
+
+
+def ionice_prefix(resources: Resources) -> List[str]:
+    """
+    Get the command prefix setting the IO scheduling class of a command, where ionice is installed.
+    Args:
+        resources (Resources): The resource configurations.
+    Returns:
+        List[str]: The ionice command prefix, empty if no IO priority is configured.
+    """
+    if resources.io_priority is None or shutil.which("ionice") is None:
+        return []
+    io_class, _, level = resources.io_priority.partition(":")
+    return ["ionice", "-c", IO_PRIORITY_CLASSES[io_class]] + (["-n", level] if level else [])
+
+
+def docker_resource_options(worker_slot: int, resources: Resources) -> Dict[str, str]:
+    """
+    Get the docker container options pinning a worker slot to its CPUs and limiting its memory.
+    Args:
+        worker_slot (int): Index of the worker slot.
+        resources (Resources): The resource configurations.
+    Returns:
+        Dict[str, str]: Keyword arguments for running the container.
+    """
+    options = {}
+    cpus = worker_cpu_set(worker_slot, resources)
+    if cpus is not None:
+        options["cpuset_cpus"] = ",".join(str(cpu) for cpu in cpus)
+    if resources.memory_limit_mb is not None:
+        options["mem_limit"] = f"{resources.memory_limit_mb}m"
+    return options
@@ -1,13 +1,22 @@
 import os
+import shlex
 import subprocess
 from dataclasses import dataclass
 from pathlib import Path
+from typing import List
 
 import docker
-from pheval.utils.file_utils import all_files
 
+from pheval_phen2gene.file_io import compress_file, compressed_path, open_file
+from pheval_phen2gene.phenopacket_archive import resolve_phenopacket_dir
+from pheval_phen2gene.prepare.normalise_hpo import create_hpo_normaliser
 from pheval_phen2gene.prepare.prepare_commands import prepare_commands
-from pheval_phen2gene.tool_specific_configuration_parser import Phen2GeneToolSpecificConfigurations
+from pheval_phen2gene.result_index import create_result_index, update_result_statuses
+from pheval_phen2gene.run.resources import docker_resource_options, run_limited
+from pheval_phen2gene.tool_specific_configuration_parser import (
+    Phen2GeneToolSpecificConfigurations,
+    Resources,
+)
 
 
 def prepare_phen2gene_commands(
@@ -16,6 +25,7 @@ def prepare_phen2gene_commands(
     testdata_dir: Path,
     data_dir: Path,
     raw_results_dir: Path,
+    staged_data_dir: Path or None = None,
 ):
     """
     Prepare commands to run Phen2Gene.
@@ -25,8 +35,9 @@ def prepare_phen2gene_commands(
         testdata_dir (Path): Path to the testdata directory.
         data_dir (Path): Path to the data directory.
         raw_results_dir (Path): Path to the directory to write raw results.
+        staged_data_dir (Path or None): Path to a node-local staged copy of the Phen2Gene data directory.
     """
-    phenopacket_dir = Path(testdata_dir).joinpath("phenopackets")
+    phenopacket_dir = resolve_phenopacket_dir(testdata_dir)
     prepare_commands(
         environment=config.environment,
         file_prefix=os.path.basename(testdata_dir),
@@ -37,27 +48,92 @@ def prepare_phen2gene_commands(
         ),
         phenopacket_dir=phenopacket_dir,
         path_to_phen2gene_dir=data_dir.joinpath(config.phen2gene_python_executable),
-        data_dir=data_dir.joinpath("lib"),
+        data_dir=data_dir.joinpath("lib") if staged_data_dir is None else staged_data_dir,
+        compression=config.compression,
+        result_layout=config.result_layout,
+        normaliser=create_hpo_normaliser(config.hpo_normalisation),
     )
 
 
-def run_phen2gene_local(testdata_dir: Path, tool_input_commands_dir: Path):
+def batch_file_path(
+    tool_input_commands_dir: Path, testdata_dir: Path, compression: str or None = None
+) -> Path:
     """
-    Run Phen2Gene locally.
+    Get the path of the batch file prepared for a test data directory, without listing the directory.
+    Args:
+        tool_input_commands_dir (Path): Path to the tool input commands directory.
+        testdata_dir (Path): Path to the test data directory.
+        compression (str or None): Compression of the batch file, either gzip, zstd or None.
+    Returns:
+        Path: Path to the batch file.
+    """
+    return compressed_path(
+        tool_input_commands_dir.joinpath(f"{os.path.basename(testdata_dir)}-phen2gene-batch.txt"),
+        compression,
+    )
+
+
+def command_raw_result(command: List[str], raw_results_dir: Path or None = None) -> Path:
+    """
+    Get the path of the raw result written by a Phen2Gene command.
+    Args:
+        command (List[str]): The Phen2Gene command.
+        raw_results_dir (Path or None): Path to the raw results directory mounted into docker
+            containers, or None for a local command.
+    Returns:
+        Path: Path to the raw result.
+    """
+    output_dir = command[command.index("-out") + 1]
+    if raw_results_dir is not None:
+        output_dir = raw_results_dir.joinpath(os.path.relpath(output_dir, "/phen2gene-results"))
+    return Path(output_dir, command[command.index("--name") + 1])
+
+
+def compress_command_result(
+    command: List[str], compression: str or None, raw_results_dir: Path or None = None
+) -> None:
+    """
+    Compress the raw result of a completed Phen2Gene command in place, if compression is configured.
+    Args:
+        command (List[str]): The Phen2Gene command.
+        compression (str or None): The compression, either gzip, zstd or None.
+        raw_results_dir (Path or None): Path to the raw results directory mounted into docker
+            containers, or None for a local command.
+    """
+    if compression is None:
+        return
+    raw_result = command_raw_result(command, raw_results_dir)
+    if raw_result.is_file():
+        compress_file(raw_result, compression)
+
+
+def run_phen2gene_local(
+    testdata_dir: Path,
+    tool_input_commands_dir: Path,
+    compression: str or None = None,
+    resources: Resources or None = None,
+):
+    """
+    Run Phen2Gene locally, compressing every raw result as soon as its command completes.
     Args:
         testdata_dir (Path): Path to the testdata directory.
         tool_input_commands_dir (Path): Path to the directory containing tool input commands file.
+        compression (str or None): Compression of the batch file and raw results, either gzip, zstd or None.
+        resources (Resources or None): CPU pinning, memory limit and priorities of the run.
     """
-    batch_file = [
-        file
-        for file in all_files(tool_input_commands_dir)
-        if file.name.startswith(Path(testdata_dir).name)
-    ][0]
+    batch_file = batch_file_path(tool_input_commands_dir, testdata_dir, compression)
     print("running phen2gene")
-    subprocess.run(
-        ["bash", str(batch_file)],
-        shell=False,
-    )
+    with open_file(batch_file) as batch:
+        for line in batch:
+            if not line.strip():
+                continue
+            command = shlex.split(line)
+            if resources is None:
+                subprocess.run(command, shell=False)
+            else:
+                # The batch runs serially, so it is limited as a single worker slot.
+                run_limited(command, 0, resources)
+            compress_command_result(command, compression)
 
 
 def read_docker_batch(batch_file: Path) -> [str]:
@@ -68,7 +144,7 @@ def read_docker_batch(batch_file: Path) -> [str]:
     Returns:
         List[str]: List of docker commands for Phen2Gene.
     """
-    with open(batch_file) as batch:
+    with open_file(batch_file) as batch:
         commands = batch.readlines()
     batch.close()
     return commands
@@ -87,22 +163,29 @@ class DockerMounts:
     input_dir: str
 
 
-def mount_docker(output_dir: Path, input_dir: Path) -> DockerMounts:
+def mount_docker(output_dir: Path, input_dir: Path, read_only: bool = False) -> DockerMounts:
     """
     Create Docker mounts for volumes.
     Args:
         output_dir (Path): Path to the output directory.
         input_dir (Path): Path to the input directory.
+        read_only (bool): Mount the input directory read-only.
     Returns:
         DockerMounts: Mount points for docker containers.
     """
     results_dir = f"{output_dir}{os.sep}:/phen2gene-results"
-    input_dir = f"{input_dir}{os.sep}:/phen2gene-data"
+    input_dir = f"{input_dir}{os.sep}:/phen2gene-data" + (":ro" if read_only else "")
     return DockerMounts(results_dir=results_dir, input_dir=input_dir)
 
 
 def run_phen2gene_docker(
-    input_dir: Path, testdata_dir: Path, tool_input_commands_dir: Path, raw_results_dir: Path
+    input_dir: Path,
+    testdata_dir: Path,
+    tool_input_commands_dir: Path,
+    raw_results_dir: Path,
+    staged_data_dir: Path or None = None,
+    compression: str or None = None,
+    resources: Resources or None = None,
 ):
     """
     Run Phen2Gene with docker.
@@ -111,17 +194,17 @@ def run_phen2gene_docker(
         testdata_dir (Path): Path to the test data directory.
         tool_input_commands_dir (Path): Path to the tool input commands directory.
         raw_results_dir (Path): Path to the raw results directory.
+        staged_data_dir (Path or None): Path to a node-local staged copy of the Phen2Gene data directory.
+        compression (str or None): Compression of the batch file and raw results, either gzip, zstd or None.
+        resources (Resources or None): CPU pinning and memory limit of the container.
     """
     client = docker.from_env()
-    batch_file = [
-        file
-        for file in all_files(tool_input_commands_dir)
-        if file.name.startswith(os.path.basename(testdata_dir))
-    ][0]
+    batch_file = batch_file_path(tool_input_commands_dir, testdata_dir, compression)
     batch_commands = read_docker_batch(batch_file)
     mounts = mount_docker(
         output_dir=raw_results_dir,
-        input_dir=input_dir,
+        input_dir=input_dir if staged_data_dir is None else staged_data_dir,
+        read_only=staged_data_dir is not None,
     )
     vol = [mounts.results_dir, mounts.input_dir]
     for command in batch_commands:
@@ -130,9 +213,12 @@ def run_phen2gene_docker(
             command,
             volumes=[str(x) for x in vol],
             detach=True,
+            **({} if resources is None else docker_resource_options(0, resources)),
         )
         for line in container.logs(stream=True):
             print(line.strip())
+        container.wait()
+        compress_command_result(shlex.split(command), compression, raw_results_dir)
         break
 
 
@@ -142,6 +228,7 @@ def run_phen2gene(
     testdata_dir: Path,
     tool_input_commands_dir: Path,
     raw_results_dir: Path,
+    staged_data_dir: Path or None = None,
 ):
     """
     Run Phen2Gene.
@@ -151,6 +238,7 @@ def run_phen2gene(
         testdata_dir (Path): Path to the test data directory.
         tool_input_commands_dir (Path): Path to the tool input commands directory.
         raw_results_dir (Path): Path to the raw results directory.
+        staged_data_dir (Path or None): Path to a node-local staged copy of the Phen2Gene data directory.
     """
     if config.environment == "docker":
         run_phen2gene_docker(
@@ -158,8 +246,17 @@ def run_phen2gene(
             testdata_dir=testdata_dir,
             tool_input_commands_dir=tool_input_commands_dir,
             raw_results_dir=raw_results_dir,
+            staged_data_dir=staged_data_dir,
+            compression=config.compression,
+            resources=config.resources,
         )
     if config.environment == "local":
         run_phen2gene_local(
-            testdata_dir=testdata_dir, tool_input_commands_dir=tool_input_commands_dir
+            testdata_dir=testdata_dir,
+            tool_input_commands_dir=tool_input_commands_dir,
+            compression=config.compression,
+            resources=config.resources,
         )
+    result_index = create_result_index(raw_results_dir, config.result_layout)
+    if result_index is not None:
+        update_result_statuses(result_index, config.compression)
@@ -0,0 +1,381 @@
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+
+import polars as pl
+from pheval.post_processing.post_processing import SortOrder
+from pheval.utils.phenopacket_utils import GeneIdentifierUpdater
+
+from pheval_phen2gene.post_process.post_process_results_format import rank_phen2gene_results
+from pheval_phen2gene.run.fused import score_case
+
+
+@dataclass
+class ScoreRequest:
+    """
+    A scoring request waiting to be scored in a micro-batch.
+    Args:
+        hpo_ids (List[str]): The observed HPO ids of the patient.
+        done (threading.Event): Set once the request has been scored.
+        result (pl.DataFrame): The standardised gene result.
+        error (Exception): The error raised scoring the request.
+    """
+
+    hpo_ids: List[str]
+    done: threading.Event = field(default_factory=threading.Event)
+    result: pl.DataFrame = None
+    error: Exception = None
+
+
+class MicroBatcher:
+    """Class for scoring concurrent requests together on a single warm scoring thread."""
+
+    def __init__(
+        self,
+        scorer: Callable,
+        gene_identifier_updator: GeneIdentifierUpdater,
+        sort_order: SortOrder,
+        max_batch_size: int = 32,
+        max_wait_seconds: float = 0.005,
+    ):
+        """
+        Initialise the MicroBatcher class.
+        Args:
+            scorer (Callable): Function scoring a list of HPO ids in the Phen2Gene output format.
+            gene_identifier_updator (GeneIdentifierUpdater): The gene identifier updater.
+            sort_order (SortOrder): The sort order.
+            max_batch_size (int): The maximum number of requests scored together.
+            max_wait_seconds (float): How long to wait for more requests to fill a batch.
+        """
+        self.scorer = scorer
+        self.gene_identifier_updator = gene_identifier_updator
+        self.sort_order = sort_order
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def score(self, hpo_ids: List[str]) -> pl.DataFrame:
+        """
+        Score the HPO ids of a patient, waiting for the batch it is scored in.
+        Args:
+            hpo_ids (List[str]): The observed HPO ids of the patient.
+        Returns:
+            pl.DataFrame: The standardised gene result.
+        """
+        request = ScoreRequest(hpo_ids)
+        self.requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def close(self) -> None:
+        """Stop the scoring thread once the queued requests are scored."""
+        self.requests.put(None)
+        self.thread.join()
+
+    def _next_batch(self) -> List[ScoreRequest] or None:
+        """Wait for a request, then collect more until the batch is full or the wait is over."""
+        request = self.requests.get()
+        if request is None:
+            return None
+        batch = [request]
+        deadline = time.monotonic() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            try:
+                request = self.requests.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if request is None:
+                self.requests.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self) -> None:
+        """Score batches of requests until closed."""
+        while (batch := self._next_batch()) is not None:
+            try:
+                results = self.score_batch(batch)
+            except Exception as error:
+                results = [error] * len(batch)
+            for request, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    request.error = result
+                else:
+                    request.result = result
+                request.done.set()
+
+    def score_batch(self, batch: List[ScoreRequest]) -> List[pl.DataFrame or Exception]:
+        """
+        Score a batch of requests, scoring identical HPO id sets once and ranking all of them together.
+        Args:
+            batch (List[ScoreRequest]): The requests.
+        Returns:
+            List[pl.DataFrame or Exception]: The standardised gene result of every request, or the
+                error raised scoring it.
+        """
+        case_ids: Dict[Tuple[str, ...], str] = {}
+        errors: Dict[Tuple[str, ...], Exception] = {}
+        frames = []
+        for request in batch:
+            hpo_ids = tuple(request.hpo_ids)
+            if hpo_ids in case_ids or hpo_ids in errors:
+                continue
+            try:
+                phen2gene_result = score_case(self.scorer, list(hpo_ids))
+            except Exception as error:
+                errors[hpo_ids] = error
+                continue
+            case_ids[hpo_ids] = str(len(case_ids))
+            frames.append(
+                phen2gene_result.select(
+                    pl.lit(case_ids[hpo_ids]).alias("case_id"),
+                    pl.col("Gene").cast(pl.String),
+                    pl.col("Score").cast(pl.Float64),
+                )
+            )
+        if not frames:
+            return [errors[tuple(request.hpo_ids)] for request in batch]
+        ranked_results = rank_phen2gene_results(
+            phen2gene_results=pl.concat(frames),
+            gene_identifier_updator=self.gene_identifier_updator,
+            sort_order=self.sort_order,
+        ).select(["case_id", "rank", "score", "gene_symbol", "gene_identifier"])
+        results = {
+            case_id: case_results.drop("case_id")
+            for (case_id,), case_results in ranked_results.group_by("case_id", maintain_order=True)
+        }
+        empty = ranked_results.clear().drop("case_id")
+        return [
+            (
+                errors[tuple(request.hpo_ids)]
+                if tuple(request.hpo_ids) in errors
+                else results.get(case_ids[tuple(request.hpo_ids)], empty)
+            )
+            for request in batch
+        ]
+
+
+class ScoreRequestHandler(BaseHTTPRequestHandler):
+    """Handler for scoring requests, POST /score with a JSON body of {"hpo_ids": [...]}."""
+
+    def do_GET(self):  # noqa: N802
+        """Respond to health checks."""
+        if self.path == "/health":
+            self._respond(200, {"status": "ok"})
+        else:
+            self._respond(404, {"error": "not found"})
+
+    def do_POST(self):  # noqa: N802
+        """Score the HPO ids of a patient."""
+        if self.path != "/score":
+            self._respond(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            hpo_ids = request["hpo_ids"]
+            if not isinstance(hpo_ids, list) or not all(isinstance(hpo, str) for hpo in hpo_ids):
+                raise TypeError(hpo_ids)
+        except (ValueError, KeyError, TypeError):
+            self._respond(400, {"error": 'expected a JSON body of {"hpo_ids": [...]}'})
+            return
+        try:
+            result = self.server.batcher.score(hpo_ids)
+        except Exception as error:
+            self._respond(500, {"error": str(error)})
+            return
+        self._respond(200, {"gene_results": result.to_dicts()})
+
+    def _respond(self, status: int, body: dict) -> None:
+        """Write a JSON response."""
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def address_string(self) -> str:
+        """Get the client address, which is empty for Unix socket clients."""
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        """Do not log every request."""
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    """HTTP server listening on a Unix socket."""
+
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        """Bind to the socket path, which has no host or port."""
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def create_server(
+    batcher: MicroBatcher,
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    unix_socket: str or None = None,
+) -> ThreadingHTTPServer:
+    """
+    Create the scoring server over local HTTP or a Unix socket.
+    Args:
+        batcher (MicroBatcher): The micro-batcher scoring requests.
+        host (str): The host to listen on.
+        port (int): The port to listen on.
+        unix_socket (str or None): Path to a Unix socket to listen on instead of a port.
+    Returns:
+        ThreadingHTTPServer: The scoring server.
+    """
+    if unix_socket is not None:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        server = UnixHTTPServer(unix_socket, ScoreRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ScoreRequestHandler)
+    server.daemon_threads = True
+    server.batcher = batcher
+    return server
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix socket."""
+
+    def __init__(self, unix_socket: str):
+        """
+        Initialise the UnixHTTPConnection class.
+        Args:
+            unix_socket (str): Path to the Unix socket.
+        """
+        super().__init__("localhost")
+        self.unix_socket = unix_socket
+
+    def connect(self):
+        """Connect to the Unix socket."""
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.unix_socket)
+
+
+def request_score(
+    hpo_ids: List[str], host: str = "127.0.0.1", port: int = 8080, unix_socket: str or None = None
+) -> dict:
+    """
+    Request the standardised gene result of a patient from a scoring server.
+    Args:
+        hpo_ids (List[str]): The observed HPO ids of the patient.
+        host (str): The host of the server.
+        port (int): The port of the server.
+        unix_socket (str or None): Path to the Unix socket of the server.
+    Returns:
+        dict: The response of the server.
+    """
+    connection = (
+        http.client.HTTPConnection(host, port)
+        if unix_socket is None
+        else UnixHTTPConnection(unix_socket)
+    )
+    try:
+        connection.request(
+            "POST",
+            "/score",
+            body=json.dumps({"hpo_ids": hpo_ids}),
+            headers={"Content-Type": "application/json"},
+        )
+        response = connection.getresponse()
+        body = json.loads(response.read())
+        if response.status != 200:
+            raise IOError(f"scoring request failed with {response.status}: {body.get('error')}")
+        return body
+    finally:
+        connection.close()
+
+
+@dataclass
+class LoadTestReport:
+    """
+    Latency and throughput of a load test.
+    Args:
+        requests (int): The number of requests sent.
+        failed (int): The number of failed requests.
+        p50_ms (float): The median latency in milliseconds.
+        p99_ms (float): The 99th percentile latency in milliseconds.
+        throughput (float): Requests completed per second.
+    """
+
+    requests: int
+    failed: int
+    p50_ms: float
+    p99_ms: float
+    throughput: float
+
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    """
+    Get a percentile of sorted latencies by the nearest rank.
+    Args:
+        latencies (List[float]): The sorted latencies.
+        fraction (float): The percentile as a fraction.
+    Returns:
+        float: The latency at the percentile.
+    """
+    if not latencies:
+        return float("nan")
+    return latencies[min(max(int(round(fraction * len(latencies))) - 1, 0), len(latencies) - 1)]
+
+
+def load_test(
+    send_request: Callable[[List[str]], dict],
+    hpo_id_sets: List[List[str]],
+    requests: int,
+    concurrency: int,
+) -> LoadTestReport:
+    """
+    Send concurrent scoring requests, cycling through the HPO id sets, and measure their latencies.
+    An empty corpus of HPO id sets is rejected with a ValueError.
+    Args:
+        send_request (Callable[[List[str]], dict]): Function sending a scoring request.
+        hpo_id_sets (List[List[str]]): The HPO id sets to request scores for.
+        requests (int): The number of requests to send.
+        concurrency (int): The number of requests in flight at once.
+    Returns:
+        LoadTestReport: The latency and throughput of the load test.
+    """
+    if not hpo_id_sets:
+        raise ValueError("no HPO id sets to send, the corpus has no cases")
+
+    def timed_request(index: int) -> float or None:
+        start = time.perf_counter()
+        try:
+            send_request(hpo_id_sets[index % len(hpo_id_sets)])
+        except (IOError, ValueError):
+            return None
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        timings = list(executor.map(timed_request, range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(timing for timing in timings if timing is not None)
+    return LoadTestReport(
+        requests=requests,
+        failed=requests - len(latencies),
+        p50_ms=percentile(latencies, 0.5),
+        p99_ms=percentile(latencies, 0.99),
+        throughput=len(latencies) / elapsed if elapsed > 0 else float("nan"),
+    )
@@ -0,0 +1,179 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import stat
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from pheval_phen2gene.tool_specific_configuration_parser import Staging
+
+STAGED_PREFIX = "phen2gene-data-"
+COMPLETE_MARKER = ".complete"
+
+
+def data_dir_fingerprint(data_dir: Path) -> str:
+    """
+    Fingerprint a data directory from the relative paths, sizes and modification times of its files.
+    Args:
+        data_dir (Path): Path to the Phen2Gene data directory.
+    Returns:
+        str: Hex digest identifying this version of the data directory.
+    """
+    fingerprint = hashlib.sha256()
+    for root, dirs, files in os.walk(data_dir, followlinks=True):
+        dirs.sort()
+        for file_name in sorted(files):
+            file_stat = os.stat(os.path.join(root, file_name))
+            relative_path = os.path.relpath(os.path.join(root, file_name), data_dir)
+            fingerprint.update(
+                f"{relative_path}\0{file_stat.st_size}\0{file_stat.st_mtime_ns}\n".encode()
+            )
+    return fingerprint.hexdigest()
+
+
+def file_checksum(file_path: Path) -> str:
+    """
+    Calculate the SHA-256 checksum of a file.
+    Args:
+        file_path (Path): Path to the file.
+    Returns:
+        str: Hex digest of the file contents.
+    """
+    checksum = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def _stage_file(source: Path, destination: Path, staging: Staging) -> None:
+    """Hard link or copy a single file into the staging area, verifying copies if configured."""
+    if staging.hard_link:
+        try:
+            os.link(source, destination)
+            return
+        except OSError:
+            pass
+    shutil.copy2(source, destination)
+    if staging.verify_checksums and file_checksum(source) != file_checksum(destination):
+        raise IOError(f"Checksum mismatch staging {source} to {destination}")
+    os.chmod(destination, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+
+def _copy_data_dir(data_dir: Path, destination: Path, staging: Staging) -> None:
+    """Recreate the data directory tree under the destination, staging every file."""
+    for root, _dirs, files in os.walk(data_dir, followlinks=True):
+        staged_root = destination.joinpath(os.path.relpath(root, data_dir))
+        staged_root.mkdir(parents=True, exist_ok=True)
+        for file_name in files:
+            _stage_file(Path(root, file_name), staged_root.joinpath(file_name), staging)
+
+
+def remove_staged_data_dir(staged_data_dir: Path) -> None:
+    """
+    Remove a staged data directory.
+    Args:
+        staged_data_dir (Path): Path to the staged data directory.
+    """
+    shutil.rmtree(staged_data_dir, ignore_errors=True)
+
+
+def staged_data_dir_lock(staged_data_dir: Path) -> Path:
+    """
+    Get the path of the lock file held by every run using a staged data directory.
+    Args:
+        staged_data_dir (Path): Path to the staged data directory.
+    Returns:
+        Path: Path to the lock file.
+    """
+    return staged_data_dir.with_name(f".{staged_data_dir.name}.lock")
+
+
+def remove_unused_staged_data_dir(staged_data_dir: Path) -> bool:
+    """
+    Remove a staged data directory unless another run holds its lock.
+    Args:
+        staged_data_dir (Path): Path to the staged data directory.
+    Returns:
+        bool: True if the staged data directory was removed.
+    """
+    with open(staged_data_dir_lock(staged_data_dir), "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        remove_staged_data_dir(staged_data_dir)
+        return True
+
+
+def remove_stale_staged_data_dirs(staging_dir: Path, current: Path) -> None:
+    """
+    Remove staged copies of other versions of the data directory that no run is using.
+    Args:
+        staging_dir (Path): Path to the node-local staging directory.
+        current (Path): Path to the staged copy in use.
+    """
+    for staged_data_dir in staging_dir.glob(f"{STAGED_PREFIX}*"):
+        if staged_data_dir != current:
+            remove_unused_staged_data_dir(staged_data_dir)
+
+
+def stage_data_dir(data_dir: Path, staging: Staging) -> Path:
+    """
+    Stage the Phen2Gene data directory to node-local storage once, reusing it across runs.
+    Concurrent runs on the same node race to publish their copy with an atomic rename; the losers
+    discard their copy and use the published one.
+    Args:
+        data_dir (Path): Path to the Phen2Gene data directory on shared storage.
+        staging (Staging): The staging configurations.
+    Returns:
+        Path: Path to the staged data directory.
+    """
+    staged_data_dir = staging.staging_dir.joinpath(
+        STAGED_PREFIX + data_dir_fingerprint(data_dir)[:16]
+    )
+    if not staged_data_dir.joinpath(COMPLETE_MARKER).exists():
+        print(f"staging {data_dir} to {staged_data_dir}")
+        staging.staging_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir = staging.staging_dir.joinpath(f".{staged_data_dir.name}.{os.getpid()}")
+        remove_staged_data_dir(tmp_dir)
+        _copy_data_dir(data_dir, tmp_dir, staging)
+        tmp_dir.joinpath(COMPLETE_MARKER).touch()
+        try:
+            os.rename(tmp_dir, staged_data_dir)
+        except OSError:
+            remove_staged_data_dir(tmp_dir)
+    if staging.cleanup == "stale":
+        remove_stale_staged_data_dirs(staging.staging_dir, staged_data_dir)
+    return staged_data_dir
+
+
+@contextmanager
+def use_staged_data_dir(data_dir: Path, staging: Staging) -> Iterator[Path]:
+    """
+    Stage the Phen2Gene data directory and hold a shared lock on the staged copy while it is in use.
+    With the after_run cleanup, the copy is removed on exit, even if the run failed, once no other
+    run on the node holds its lock.
+    Args:
+        data_dir (Path): Path to the Phen2Gene data directory on shared storage.
+        staging (Staging): The staging configurations.
+    Yields:
+        Path: Path to the staged data directory.
+    """
+    staged_data_dir = staging.staging_dir.joinpath(
+        STAGED_PREFIX + data_dir_fingerprint(data_dir)[:16]
+    )
+    staging.staging_dir.mkdir(parents=True, exist_ok=True)
+    with open(staged_data_dir_lock(staged_data_dir), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        try:
+            yield stage_data_dir(data_dir, staging)
+        finally:
+            if staging.cleanup == "after_run":
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    remove_staged_data_dir(staged_data_dir)
+                except BlockingIOError:
+                    print(f"keeping {staged_data_dir}, another run is using it")
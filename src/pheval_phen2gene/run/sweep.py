@@ -0,0 +1,214 @@
+import os
+from pathlib import Path
+from typing import Callable, Iterator, List
+
+from pheval_phen2gene.phenopacket_archive import resolve_phenopacket_dir
+from pheval_phen2gene.prepare.normalise_hpo import create_hpo_normaliser
+from pheval_phen2gene.prepare.prepare_commands import (
+    CaseRecord,
+    CommandWriter,
+    HpoIdInterner,
+    Phen2GeneCommandLineArguments,
+    Phen2GeneDockerArguments,
+    iter_case_records,
+)
+from pheval_phen2gene.result_index import create_result_index, update_result_statuses
+from pheval_phen2gene.run.parallel import (
+    Phen2GeneJob,
+    compressing_job_runner,
+    docker_job_runner,
+    local_job_runner,
+    run_jobs,
+)
+from pheval_phen2gene.tool_specific_configuration_parser import Phen2GeneToolSpecificConfigurations
+
+
+def write_case_job(
+    config: Phen2GeneToolSpecificConfigurations,
+    case_id: str,
+    hpo_ids: List[str],
+    output_dir: Path,
+    path_to_phen2gene_dir: Path,
+    data_dir: Path,
+    command_writer: CommandWriter,
+    extra_arguments: List[str] or None = None,
+) -> Phen2GeneJob:
+    """
+    Write the Phen2Gene command of a case to its batch file and create the job running it, either
+    locally or with docker as configured.
+    Args:
+        config (Phen2GeneToolSpecificConfigurations): Phen2Gene tool configurations.
+        case_id (str): Name of the case.
+        hpo_ids (List[str]): The HPO ids of the case.
+        output_dir (Path): Path to the directory Phen2Gene writes the result to.
+        path_to_phen2gene_dir (Path): Path to the Phen2Gene python executable.
+        data_dir (Path): Path to the Phen2Gene data directory.
+        command_writer (CommandWriter): Writer of the batch file.
+        extra_arguments (List[str] or None): Additional Phen2Gene command line arguments.
+    Returns:
+        Phen2GeneJob: The Phen2Gene job.
+    """
+    if config.environment == "docker":
+        arguments = Phen2GeneDockerArguments(
+            output_dir=output_dir,
+            output_file_name=Path(case_id),
+            hpo_ids=hpo_ids,
+            extra_arguments=extra_arguments,
+        )
+        command = CommandWriter.docker_command(arguments)
+        command_writer.write_docker_command(arguments)
+    else:
+        arguments = Phen2GeneCommandLineArguments(
+            path_to_phen2gene_dir=path_to_phen2gene_dir,
+            output_dir=output_dir,
+            output_file_name=Path(case_id),
+            hpo_ids=hpo_ids,
+            extra_arguments=extra_arguments,
+        )
+        command = CommandWriter.local_command(arguments, data_dir)
+        command_writer.write_local_command(arguments, data_dir)
+    return Phen2GeneJob(
+        case_id=case_id, hpo_count=len(hpo_ids), command=command, output_dir=output_dir
+    )
+
+
+def iter_sweep_jobs(
+    config: Phen2GeneToolSpecificConfigurations,
+    cases: List[CaseRecord],
+    interner: HpoIdInterner,
+    path_to_phen2gene_dir: Path,
+    data_dir: Path,
+    tool_input_commands_dir: Path,
+    file_prefix: str,
+    raw_results_dir: Path,
+) -> Iterator[Phen2GeneJob]:
+    """
+    Lazily create the jobs of every parameter set and case of a sweep, writing a batch file per set.
+    Args:
+        config (Phen2GeneToolSpecificConfigurations): Phen2Gene tool configurations.
+        cases (List[CaseRecord]): The cases parsed once from the corpus.
+        interner (HpoIdInterner): Interner of the observed HPO ids of the cases.
+        path_to_phen2gene_dir (Path): Path to the Phen2Gene python executable.
+        data_dir (Path): Path to the Phen2Gene data directory.
+        tool_input_commands_dir (Path): Path to the tool input commands directory.
+        file_prefix (str): Prefix for the batch files.
+        raw_results_dir (Path): Path to the raw results directory.
+    Yields:
+        Phen2GeneJob: A Phen2Gene job.
+    """
+    for parameter_set in config.sweep:
+        parameter_set_dir = raw_results_dir.joinpath(parameter_set.name)
+        parameter_set_dir.mkdir(parents=True, exist_ok=True)
+        result_index = create_result_index(parameter_set_dir, config.result_layout)
+        if result_index is not None:
+            result_index.write([])
+        command_writer = CommandWriter(
+            tool_input_commands_dir.joinpath(
+                f"{file_prefix}-{parameter_set.name}-phen2gene-batch.txt"
+            )
+        )
+        for case in cases:
+            hpo_ids = interner.decode(case.hpo_codes)
+            output_dir = (
+                parameter_set_dir
+                if result_index is None
+                else result_index.add_pending(case.output_file_name)
+            )
+            yield write_case_job(
+                config=config,
+                case_id=case.output_file_name,
+                hpo_ids=hpo_ids,
+                output_dir=output_dir,
+                path_to_phen2gene_dir=path_to_phen2gene_dir,
+                data_dir=data_dir,
+                command_writer=command_writer,
+                extra_arguments=parameter_set.phen2gene_arguments(),
+            )
+        command_writer.close()
+        if result_index is not None:
+            result_index.close()
+
+
+def create_job_runner(
+    config: Phen2GeneToolSpecificConfigurations,
+    input_dir: Path,
+    staged_data_dir: Path or None = None,
+) -> Callable[..., int]:
+    """
+    Create the function running Phen2Gene jobs in the configured environment, compressing every
+    raw result as soon as its command succeeds if compression is configured.
+    Args:
+        config (Phen2GeneToolSpecificConfigurations): Phen2Gene tool configurations.
+        input_dir (Path): Path to the input directory.
+        staged_data_dir (Path or None): Path to a node-local staged copy of the Phen2Gene data directory.
+    Returns:
+        Callable[..., int]: Function running a job in a worker slot, optionally with a
+            cancellation, and returning its exit code.
+    """
+    run_job = (
+        docker_job_runner(
+            data_dir=input_dir if staged_data_dir is None else staged_data_dir,
+            read_only=staged_data_dir is not None,
+            resources=config.resources,
+        )
+        if config.environment == "docker"
+        else local_job_runner(config.resources)
+    )
+    if config.compression is not None:
+        run_job = compressing_job_runner(run_job, config.compression)
+    return run_job
+
+
+def run_phen2gene_sweep(
+    config: Phen2GeneToolSpecificConfigurations,
+    input_dir: Path,
+    testdata_dir: Path,
+    tool_input_commands_dir: Path,
+    raw_results_dir: Path,
+    staged_data_dir: Path or None = None,
+) -> None:
+    """
+    Run every parameter set of a sweep against the corpus over a single worker pool.
+    The phenopackets are parsed once and shared by all parameter sets.
+    Args:
+        config (Phen2GeneToolSpecificConfigurations): Phen2Gene tool configurations.
+        input_dir (Path): Path to the input directory.
+        testdata_dir (Path): Path to the test data directory.
+        tool_input_commands_dir (Path): Path to the tool input commands directory.
+        raw_results_dir (Path): Path to the raw results directory.
+        staged_data_dir (Path or None): Path to a node-local staged copy of the Phen2Gene data directory.
+    """
+    interner = HpoIdInterner()
+    normaliser = create_hpo_normaliser(config.hpo_normalisation)
+    cases = list(
+        iter_case_records(resolve_phenopacket_dir(testdata_dir), None, interner, normaliser)
+    )
+    if normaliser is not None:
+        normaliser.report()
+        normaliser.write_report(
+            tool_input_commands_dir.joinpath(
+                f"{os.path.basename(testdata_dir)}-hpo-normalisation.tsv"
+            )
+        )
+    data_dir = input_dir.joinpath("lib") if staged_data_dir is None else staged_data_dir
+    jobs = iter_sweep_jobs(
+        config=config,
+        cases=cases,
+        interner=interner,
+        path_to_phen2gene_dir=input_dir.joinpath(config.phen2gene_python_executable),
+        data_dir=data_dir,
+        tool_input_commands_dir=tool_input_commands_dir,
+        file_prefix=os.path.basename(testdata_dir),
+        raw_results_dir=raw_results_dir,
+    )
+    run_job = create_job_runner(config, input_dir, staged_data_dir)
+    print(f"running phen2gene sweep of {len(config.sweep)} parameter sets over {len(cases)} cases")
+    failed = run_jobs(jobs, run_job, config.max_workers, config.speculation)
+    if failed:
+        print(f"{failed} phen2gene commands failed")
+    for parameter_set in config.sweep:
+        result_index = create_result_index(
+            raw_results_dir.joinpath(parameter_set.name), config.result_layout
+        )
+        if result_index is not None:
+            update_result_statuses(result_index, config.compression)
@@ -0,0 +1,242 @@
+import os
+import shlex
+import socket
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from pheval_phen2gene.file_io import open_file, uncompressed_path
+from pheval_phen2gene.run.run import compress_command_result
+
+LEASE_SEPARATOR = "@"
+
+
+@dataclass
+class ClaimedTask:
+    """
+    A task claimed from the work queue by a worker.
+    Args:
+        task_id (str): Identifier of the task.
+        command (str): The Phen2Gene command to run.
+        lease_path (Path): Path to the lease file held by the worker.
+    """
+
+    task_id: str
+    command: str
+    lease_path: Path
+
+
+def check_lease_name(name: str, kind: str) -> None:
+    """
+    Reject a task or worker id containing the lease separator, which would make its lease ambiguous.
+    Args:
+        name (str): The task or worker id.
+        kind (str): What the name identifies, for the error message.
+    """
+    if LEASE_SEPARATOR in name:
+        raise ValueError(f"{kind} {name!r} must not contain {LEASE_SEPARATOR!r}")
+
+
+class WorkQueue:
+    """
+    Lease-based work queue of Phen2Gene commands on a shared directory.
+
+    Every state transition is a single atomic rename within the queue directory, so any number of
+    workers on any number of nodes can share the queue without a lock server. A claimed task is
+    renamed into `claimed/` with the claim time in its name; the worker heartbeats the lease by
+    touching the file, and a lease that has not been touched within `lease_seconds` is renamed back
+    into `pending/` by whichever worker notices first.
+    """
+
+    def __init__(self, queue_dir: Path, lease_seconds: float = 300):
+        """
+        Initialise the WorkQueue class.
+        Args:
+            queue_dir (Path): Path to the shared queue directory.
+            lease_seconds (float): Seconds after the last heartbeat before a lease expires.
+        """
+        self.queue_dir = queue_dir
+        self.lease_seconds = lease_seconds
+        self.pending_dir = queue_dir.joinpath("pending")
+        self.claimed_dir = queue_dir.joinpath("claimed")
+        self.done_dir = queue_dir.joinpath("done")
+        self.failed_dir = queue_dir.joinpath("failed")
+        for directory in [self.pending_dir, self.claimed_dir, self.done_dir, self.failed_dir]:
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def enqueue(self, task_id: str, command: str) -> None:
+        """
+        Add a command to the queue.
+        Args:
+            task_id (str): Identifier of the task, unique within the queue, without the lease separator.
+            command (str): The Phen2Gene command to run.
+        """
+        check_lease_name(task_id, "task id")
+        tmp_path = self.queue_dir.joinpath(f".{task_id}.tmp")
+        with open(tmp_path, "w") as task_file:
+            task_file.write(command)
+        os.replace(tmp_path, self.pending_dir.joinpath(task_id))
+
+    def enqueue_batch(self, batch_file: Path) -> int:
+        """
+        Add every command in a batch file to the queue.
+        Args:
+            batch_file (Path): Path to the batch file of Phen2Gene commands.
+        Returns:
+            int: The number of commands enqueued.
+        """
+        enqueued = 0
+        batch_name = uncompressed_path(batch_file).stem
+        with open_file(batch_file) as batch:
+            for line_number, command in enumerate(batch):
+                if command.strip():
+                    self.enqueue(f"{batch_name}-{line_number:08d}", command.strip())
+                    enqueued += 1
+        return enqueued
+
+    def claim(self, worker_id: str) -> ClaimedTask or None:
+        """
+        Claim the next pending task.
+        Args:
+            worker_id (str): Identifier of the claiming worker, without the lease separator.
+        Returns:
+            ClaimedTask or None: The claimed task, or None if no task is pending.
+        """
+        check_lease_name(worker_id, "worker id")
+        for entry in os.scandir(self.pending_dir):
+            lease_path = self.claimed_dir.joinpath(
+                LEASE_SEPARATOR.join([entry.name, worker_id, str(time.time())])
+            )
+            try:
+                os.rename(entry.path, lease_path)
+            except FileNotFoundError:
+                continue
+            return ClaimedTask(
+                task_id=entry.name, command=lease_path.read_text(), lease_path=lease_path
+            )
+        return None
+
+    @staticmethod
+    def heartbeat(task: ClaimedTask) -> bool:
+        """
+        Renew the lease of a claimed task.
+        Args:
+            task (ClaimedTask): The claimed task.
+        Returns:
+            bool: False if the lease has been lost to another worker.
+        """
+        try:
+            os.utime(task.lease_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, task: ClaimedTask, succeeded: bool) -> bool:
+        """
+        Mark a claimed task as done or failed.
+        Args:
+            task (ClaimedTask): The claimed task.
+            succeeded (bool): Whether the command exited successfully.
+        Returns:
+            bool: False if the lease had already expired and the task was re-queued.
+        """
+        destination = self.done_dir if succeeded else self.failed_dir
+        try:
+            os.rename(task.lease_path, destination.joinpath(task.task_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def requeue_expired(self) -> int:
+        """
+        Return tasks with expired leases to the pending directory.
+        Returns:
+            int: The number of tasks re-queued.
+        """
+        requeued = 0
+        now = time.time()
+        for entry in os.scandir(self.claimed_dir):
+            task_id, _worker_id, claimed_at = entry.name.rsplit(LEASE_SEPARATOR, 2)
+            try:
+                last_heartbeat = max(entry.stat().st_mtime, float(claimed_at))
+                if now - last_heartbeat > self.lease_seconds:
+                    os.rename(entry.path, self.pending_dir.joinpath(task_id))
+                    requeued += 1
+            except FileNotFoundError:
+                continue
+        return requeued
+
+    def has_claimed(self) -> bool:
+        """Return whether any task is still held by a worker."""
+        return any(True for _ in os.scandir(self.claimed_dir))
+
+
+def default_worker_id() -> str:
+    """Return an identifier for this worker process, unique across nodes."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def run_local_command(command: str) -> int:
+    """
+    Run a Phen2Gene command locally.
+    Args:
+        command (str): The Phen2Gene command.
+    Returns:
+        int: The exit code of the command.
+    """
+    return subprocess.run(shlex.split(command), shell=False).returncode
+
+
+def _heartbeat_until(queue: WorkQueue, task: ClaimedTask, finished: threading.Event) -> None:
+    """Heartbeat a lease at a third of the lease time until the task is finished."""
+    while not finished.wait(queue.lease_seconds / 3):
+        if not queue.heartbeat(task):
+            print(f"lease on {task.task_id} lost")
+            return
+
+
+def run_worker(
+    queue: WorkQueue,
+    worker_id: str,
+    run_command: Callable[[str], int] = run_local_command,
+    poll_seconds: float = 10,
+    compression: str or None = None,
+) -> int:
+    """
+    Claim and run tasks from the queue until no work is left, compressing the raw result of every
+    succeeded command if configured.
+    Args:
+        queue (WorkQueue): The work queue.
+        worker_id (str): Identifier of this worker.
+        run_command (Callable[[str], int]): Function running a command and returning its exit code.
+        poll_seconds (float): Seconds to wait while other workers still hold leases.
+        compression (str or None): Compression of the raw results, either gzip, zstd or None.
+    Returns:
+        int: The number of tasks completed by this worker.
+    """
+    completed = 0
+    while True:
+        queue.requeue_expired()
+        task = queue.claim(worker_id)
+        if task is None:
+            if not queue.has_claimed():
+                return completed
+            time.sleep(poll_seconds)
+            continue
+        finished = threading.Event()
+        heartbeat = threading.Thread(
+            target=_heartbeat_until, args=(queue, task, finished), daemon=True
+        )
+        heartbeat.start()
+        try:
+            exit_code = run_command(task.command)
+        finally:
+            finished.set()
+            heartbeat.join()
+        if exit_code == 0:
+            compress_command_result(shlex.split(task.command), compression)
+        if queue.complete(task, succeeded=exit_code == 0):
+            completed += 1
@@ -1,12 +1,24 @@
 """Phen2Gene Runner"""
 
+from contextlib import nullcontext
 from dataclasses import dataclass
 from pathlib import Path
 
 from pheval.runners.runner import PhEvalRunner
 
-from pheval_phen2gene.post_process.post_process import post_process_results_format
+from pheval_phen2gene.phenopacket_archive import (
+    archive_directory,
+    resolve_phenopacket_dir,
+    restore_archived_directory,
+)
+from pheval_phen2gene.post_process.post_process import (
+    post_process_results_format,
+    post_process_sweep_results_format,
+)
+from pheval_phen2gene.run.fused import run_fused_pipeline
 from pheval_phen2gene.run.run import prepare_phen2gene_commands, run_phen2gene
+from pheval_phen2gene.run.stage_data import use_staged_data_dir
+from pheval_phen2gene.run.sweep import run_phen2gene_sweep
 from pheval_phen2gene.tool_specific_configuration_parser import Phen2GeneToolSpecificConfigurations
 
 
@@ -30,20 +42,58 @@ class Phen2GenePhEvalRunner(PhEvalRunner):
         tool_specific_configurations = Phen2GeneToolSpecificConfigurations.parse_obj(
             self.input_dir_config.tool_specific_configuration_options
         )
-        prepare_phen2gene_commands(
-            config=tool_specific_configurations,
-            tool_input_commands_dir=self.tool_input_commands_dir,
-            testdata_dir=self.testdata_dir,
-            data_dir=self.input_dir,
-            raw_results_dir=self.raw_results_dir,
-        )
-        run_phen2gene(
-            config=tool_specific_configurations,
-            testdata_dir=self.testdata_dir,
-            input_dir=self.input_dir,
-            raw_results_dir=self.raw_results_dir,
-            tool_input_commands_dir=self.tool_input_commands_dir,
+        # The in-process scorer loads its own knowledge base, so there is nothing to stage for it.
+        staging = (
+            tool_specific_configurations.staging
+            if tool_specific_configurations.scorer is None
+            else None
         )
+        with (
+            nullcontext()
+            if staging is None
+            else use_staged_data_dir(self.input_dir.joinpath("lib"), staging)
+        ) as staged_data_dir:
+            self._run(tool_specific_configurations, staged_data_dir)
+
+    def _run(
+        self,
+        tool_specific_configurations: Phen2GeneToolSpecificConfigurations,
+        staged_data_dir: Path or None,
+    ):
+        """Run Phen2Gene with the fused pipeline, a sweep or the prepared batch of commands."""
+        if tool_specific_configurations.scorer is not None:
+            run_fused_pipeline(
+                config=tool_specific_configurations,
+                testdata_dir=self.testdata_dir,
+                raw_results_dir=self.raw_results_dir,
+                output_dir=self.output_dir,
+            )
+        elif tool_specific_configurations.sweep is not None:
+            run_phen2gene_sweep(
+                config=tool_specific_configurations,
+                input_dir=self.input_dir,
+                testdata_dir=self.testdata_dir,
+                tool_input_commands_dir=self.tool_input_commands_dir,
+                raw_results_dir=self.raw_results_dir,
+                staged_data_dir=staged_data_dir,
+            )
+        else:
+            prepare_phen2gene_commands(
+                config=tool_specific_configurations,
+                tool_input_commands_dir=self.tool_input_commands_dir,
+                testdata_dir=self.testdata_dir,
+                data_dir=self.input_dir,
+                raw_results_dir=self.raw_results_dir,
+                staged_data_dir=staged_data_dir,
+            )
+            run_phen2gene(
+                config=tool_specific_configurations,
+                testdata_dir=self.testdata_dir,
+                input_dir=self.input_dir,
+                raw_results_dir=self.raw_results_dir,
+                tool_input_commands_dir=self.tool_input_commands_dir,
+                staged_data_dir=staged_data_dir,
+            )
 
     def post_process(self):
         """post_process"""
@@ -51,9 +101,36 @@ class Phen2GenePhEvalRunner(PhEvalRunner):
         tool_specific_configurations = Phen2GeneToolSpecificConfigurations.parse_obj(
             self.input_dir_config.tool_specific_configuration_options
         )
-        post_process_results_format(
-            raw_results_dir=self.raw_results_dir,
-            output_dir=self.output_dir,
-            phenopacket_dir=self.testdata_dir.joinpath("phenopackets"),
-            config=tool_specific_configurations,
+        raw_results_dirs = (
+            [self.raw_results_dir]
+            if tool_specific_configurations.sweep is None
+            else [
+                self.raw_results_dir.joinpath(parameter_set.name)
+                for parameter_set in tool_specific_configurations.sweep
+            ]
         )
+        for raw_results_dir in raw_results_dirs:
+            if restore_archived_directory(raw_results_dir):
+                print(f"restored {raw_results_dir} from its archive")
+        if tool_specific_configurations.scorer is not None:
+            print("results already standardised by the in-process scorer")
+        elif tool_specific_configurations.sweep is not None:
+            post_process_sweep_results_format(
+                raw_results_dir=self.raw_results_dir,
+                output_dir=self.output_dir,
+                phenopacket_dir=resolve_phenopacket_dir(self.testdata_dir),
+                config=tool_specific_configurations,
+            )
+        else:
+            post_process_results_format(
+                raw_results_dir=self.raw_results_dir,
+                output_dir=self.output_dir,
+                phenopacket_dir=resolve_phenopacket_dir(self.testdata_dir),
+                config=tool_specific_configurations,
+            )
+        if tool_specific_configurations.archive_raw_results and (
+            tool_specific_configurations.scorer is None
+            or tool_specific_configurations.keep_raw_results
+        ):
+            for raw_results_dir in raw_results_dirs:
+                archive_directory(raw_results_dir)
@@ -1,6 +1,33 @@
 from pathlib import Path
+from typing import List
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
+
+from pheval_phen2gene.file_io import COMPRESSION_SUFFIXES
+
+CANDIDATE_RANKS = ("preserve", "recompute")
+STAGING_CLEANUPS = ("never", "after_run", "stale")
+RESULT_LAYOUTS = ("flat", "partitioned")
+IO_PRIORITY_CLASSES = {"realtime": "1", "best-effort": "2", "idle": "3"}
+
+
+class CandidateGenes(BaseModel):
+    """
+    Candidate gene restriction configuration.
+    Attributes:
+        candidate_genes_dir (Path): Directory of per-case gene lists or VCFs, defaults to the phenopacket directory.
+        ranks (str): Either preserve the genome-wide ranks of the candidate genes or recompute them.
+    """
+
+    candidate_genes_dir: Path = Field(None)
+    ranks: str = Field("recompute")
+
+    @validator("ranks")
+    def check_ranks(cls, ranks: str) -> str:  # noqa: N805
+        """Reject ranks other than preserve and recompute."""
+        if ranks not in CANDIDATE_RANKS:
+            raise ValueError(f"ranks must be one of {', '.join(CANDIDATE_RANKS)}, not {ranks}")
+        return ranks
 
 
 class PostProcessing(BaseModel):
@@ -8,9 +35,131 @@ class PostProcessing(BaseModel):
     Postprocessing configuration.
     Attributes:
         score_order (str): The order of the results, either ascending or descending.
+        presorted_fast_path (bool): Rank results already sorted by Phen2Gene without re-sorting.
+        candidate_genes (CandidateGenes): Restrict results to per-case candidate genes.
+        batch_size (int): Post-process this many raw results together in a single frame.
     """
 
     score_order: str = Field(...)
+    presorted_fast_path: bool = Field(True)
+    candidate_genes: CandidateGenes = Field(None)
+    batch_size: int = Field(None)
+
+
+class Staging(BaseModel):
+    """
+    Node-local staging configuration for the Phen2Gene data directory.
+    Attributes:
+        staging_dir (Path): Fast node-local directory, such as on tmpfs, to stage the data directory to.
+        hard_link (bool): Hard link files instead of copying them where the filesystem allows it.
+        verify_checksums (bool): Verify copied files against SHA-256 checksums of the source.
+        cleanup (str): When to remove staged copies, either never, after_run or stale.
+    """
+
+    staging_dir: Path = Field(...)
+    hard_link: bool = Field(False)
+    verify_checksums: bool = Field(True)
+    cleanup: str = Field("never")
+
+    @validator("cleanup")
+    def check_cleanup(cls, cleanup: str) -> str:  # noqa: N805
+        """Reject cleanups other than never, after_run and stale."""
+        if cleanup not in STAGING_CLEANUPS:
+            raise ValueError(f"cleanup must be one of {', '.join(STAGING_CLEANUPS)}, not {cleanup}")
+        return cleanup
+
+
+class Resources(BaseModel):
+    """
+    Per-worker resource configuration for running Phen2Gene on shared nodes.
+    Attributes:
+        cpus_per_worker (int): Pin every worker to this many CPUs.
+        numa_spread (bool): Spread workers across NUMA nodes, keeping each worker within one node.
+        memory_limit_mb (int): Memory limit of every worker in megabytes.
+        nice (int): Nice increment of local workers.
+        io_priority (str): IO scheduling class of local workers, either idle, best-effort or realtime,
+            optionally with a level such as best-effort:7.
+    """
+
+    cpus_per_worker: int = Field(None)
+    numa_spread: bool = Field(False)
+    memory_limit_mb: int = Field(None)
+    nice: int = Field(None)
+    io_priority: str = Field(None)
+
+    @validator("io_priority")
+    def check_io_priority(cls, io_priority: str or None) -> str or None:  # noqa: N805
+        """Reject IO scheduling classes other than idle, best-effort and realtime and levels past 0-7."""
+        if io_priority is None:
+            return None
+        io_class, separator, level = io_priority.partition(":")
+        if io_class not in IO_PRIORITY_CLASSES:
+            raise ValueError(
+                f"io_priority class must be one of {', '.join(IO_PRIORITY_CLASSES)}, not {io_class}"
+            )
+        if separator and level not in [str(number) for number in range(8)]:
+            raise ValueError(f"io_priority level must be from 0 to 7, not {level}")
+        return io_priority
+
+
+class Speculation(BaseModel):
+    """
+    Speculative re-execution of straggling Phen2Gene jobs in parallel runs.
+    Attributes:
+        slowdown (float): Re-run a job on an idle worker once it has run this many times longer than
+            the median runtime of completed jobs with a similar HPO count.
+        min_samples (int): Completed jobs with a similar HPO count needed before a job is re-run.
+        min_runtime_seconds (float): Never re-run a job that has run for less than this.
+        check_interval_seconds (float): How often running jobs are checked for stragglers.
+    """
+
+    slowdown: float = Field(3.0)
+    min_samples: int = Field(5)
+    min_runtime_seconds: float = Field(10.0)
+    check_interval_seconds: float = Field(1.0)
+
+
+class HpoNormalisation(BaseModel):
+    """
+    Pre-flight HPO id normalisation configuration.
+    Attributes:
+        ontology (str): The oaklib selector of the HPO.
+        cache_file (Path): Path to the cached HPO lookup table, built from the ontology on first use.
+    """
+
+    ontology: str = Field("sqlite:obo:hp")
+    cache_file: Path = Field(None)
+
+
+class ParameterSet(BaseModel):
+    """
+    A named set of Phen2Gene parameters to run in a sweep.
+    Attributes:
+        name (str): Name of the parameter set, used to name its results directories, so it must not
+            contain path separators or "..".
+        weight_model (str): The Phen2Gene weighting model, one of sk, w, ic or u.
+        arguments (List[str]): Additional Phen2Gene command line arguments.
+    """
+
+    name: str = Field(...)
+    weight_model: str = Field(None)
+    arguments: List[str] = Field([])
+
+    @validator("name")
+    def check_name(cls, name: str) -> str:  # noqa: N805
+        """Reject names that are empty or not safe to use as a directory name."""
+        if not name or "/" in name or "\\" in name or ".." in name or name == ".":
+            raise ValueError(f"parameter set name must be a plain directory name, not {name!r}")
+        return name
+
+    def phen2gene_arguments(self) -> List[str]:
+        """
+        Get the Phen2Gene command line arguments of the parameter set.
+        Returns:
+            List[str]: The command line arguments.
+        """
+        weight_model = [] if self.weight_model is None else ["-w", self.weight_model]
+        return weight_model + self.arguments
 
 
 class Phen2GeneToolSpecificConfigurations(BaseModel):
@@ -20,8 +169,69 @@ class Phen2GeneToolSpecificConfigurations(BaseModel):
         environment (str): The environment to run Phen2Gene tool, either local or docker.
         phen2gene_python_executable (Path): The path to the Phen2Gene python executable
         post_process (PostProcessing): The post-processing configurations.
+        compression (str): Compression for batch files and raw results, either gzip, zstd or None.
+        archive_raw_results (bool): Move the raw results into a tar.gz archive after post-processing.
+        staging (Staging): Node-local staging of the Phen2Gene data directory.
+        sweep (List[ParameterSet]): Parameter sets to run against the corpus in a single sweep.
+        max_workers (int): The number of Phen2Gene commands to run in parallel in a sweep.
+        scorer (str): In-process Phen2Gene scoring function as module:function, fusing the run and
+            post-processing without intermediate result files.
+        keep_raw_results (bool): Write the raw Phen2Gene results of in-process scoring.
+        result_layout (str): Layout of the raw results directory, either flat or partitioned into
+            hashed subdirectories with an index of cases.
+        resources (Resources): CPU pinning, NUMA placement, memory limits and priorities of workers.
+        hpo_normalisation (HpoNormalisation): Resolve alternate and obsolete HPO ids to current
+            terms and drop unknown ids before running Phen2Gene.
+        speculation (Speculation): Speculatively re-run straggling jobs of a sweep on idle workers.
     """
 
     environment: str = Field(...)
     phen2gene_python_executable: Path = Field(...)
     post_process: PostProcessing = Field(...)
+    compression: str = Field(None)
+    archive_raw_results: bool = Field(False)
+    staging: Staging = Field(None)
+    sweep: List[ParameterSet] = Field(None)
+    max_workers: int = Field(1)
+    scorer: str = Field(None)
+    keep_raw_results: bool = Field(True)
+    result_layout: str = Field("flat")
+    resources: Resources = Field(None)
+    hpo_normalisation: HpoNormalisation = Field(None)
+    speculation: Speculation = Field(None)
+
+    @validator("sweep")
+    def check_sweep(
+        cls, sweep: List[ParameterSet] or None  # noqa: N805
+    ) -> List[ParameterSet] or None:
+        """Reject sweeps with parameter sets of the same name."""
+        names = [parameter_set.name for parameter_set in sweep or []]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"parameter set names must be unique: {', '.join(duplicates)}")
+        return sweep
+
+    @validator("scorer")
+    def check_scorer(cls, scorer: str or None, values: dict) -> str or None:  # noqa: N805
+        """Reject an in-process scorer combined with a sweep."""
+        if scorer is not None and values.get("sweep") is not None:
+            raise ValueError("scorer and sweep cannot both be set")
+        return scorer
+
+    @validator("result_layout")
+    def check_result_layout(cls, result_layout: str) -> str:  # noqa: N805
+        """Reject result layouts other than flat and partitioned."""
+        if result_layout not in RESULT_LAYOUTS:
+            raise ValueError(
+                f"result_layout must be one of {', '.join(RESULT_LAYOUTS)}, not {result_layout}"
+            )
+        return result_layout
+
+    @validator("compression")
+    def check_compression(cls, compression: str or None) -> str or None:  # noqa: N805
+        """Reject compressions other than gzip and zstd."""
+        if compression is not None and compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(
+                f"compression must be one of {', '.join(COMPRESSION_SUFFIXES)}, not {compression}"
+            )
+        return compression
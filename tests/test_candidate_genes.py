@@ -0,0 +1,82 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from pydantic import ValidationError
+
+from pheval_phen2gene.post_process.candidate_genes import (
+    find_candidate_genes_file,
+    read_candidate_genes,
+)
+from pheval_phen2gene.post_process.post_process import candidate_genes_dir
+from pheval_phen2gene.tool_specific_configuration_parser import Phen2GeneToolSpecificConfigurations
+
+example_vcf = """##fileformat=VCFv4.2
+##INFO=<ID=CSQ,Number=.,Type=String,Description="VEP. Format: Allele|Consequence|IMPACT|SYMBOL|Gene">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO
+19\t12891025\t.\tG\tA\t.\tPASS\tANN=A|missense_variant|MODERATE|GCDH|ENSG00000105607
+19\t51352000\t.\tC\tT\t.\tPASS\tCSQ=T|missense_variant|MODERATE|ETFB|ENSG00000105379
+15\t76311000\t.\tA\tG\t.\tPASS\tGENEINFO=ETFA:2108
+"""
+
+
+class TestCandidateGenes(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.candidate_genes_dir = Path(self.tmp_dir.name)
+        self.candidate_genes_dir.joinpath("case1.txt").write_text("GCDH\nETFB\n\n")
+        self.candidate_genes_dir.joinpath("case2.vcf").write_text(example_vcf)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_find_candidate_genes_file(self):
+        self.assertEqual(
+            find_candidate_genes_file("case2", self.candidate_genes_dir),
+            self.candidate_genes_dir.joinpath("case2.vcf"),
+        )
+        self.assertIsNone(find_candidate_genes_file("case3", self.candidate_genes_dir))
+
+    def test_read_gene_list(self):
+        self.assertEqual(
+            read_candidate_genes(self.candidate_genes_dir.joinpath("case1.txt")), {"GCDH", "ETFB"}
+        )
+
+    def test_read_vcf(self):
+        self.assertEqual(
+            read_candidate_genes(self.candidate_genes_dir.joinpath("case2.vcf")),
+            {"GCDH", "ETFB", "ETFA"},
+        )
+
+
+class TestCandidateGenesDir(unittest.TestCase):
+    @staticmethod
+    def config(candidate_genes: dict) -> Phen2GeneToolSpecificConfigurations:
+        return Phen2GeneToolSpecificConfigurations.parse_obj(
+            {
+                "environment": "local",
+                "phen2gene_python_executable": "phen2gene.py",
+                "post_process": {"score_order": "descending", "candidate_genes": candidate_genes},
+            }
+        )
+
+    def test_defaults_to_phenopacket_dir(self):
+        self.assertEqual(
+            candidate_genes_dir(Path("phenopackets"), self.config({})), Path("phenopackets")
+        )
+
+    def test_explicit_candidate_genes_dir(self):
+        self.assertEqual(
+            candidate_genes_dir(
+                Path("phenopackets.tar.gz"), self.config({"candidate_genes_dir": "candidates"})
+            ),
+            Path("candidates"),
+        )
+
+    def test_unknown_ranks(self):
+        with self.assertRaises(ValidationError):
+            self.config({"ranks": "preserved"})
+
+    def test_phenopacket_archive_requires_candidate_genes_dir(self):
+        with self.assertRaises(ValueError):
+            candidate_genes_dir(Path("phenopackets.tar.gz"), self.config({}))
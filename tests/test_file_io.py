@@ -0,0 +1,53 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from pheval_phen2gene.file_io import (
+    compress_file,
+    compressed_path,
+    is_compressed,
+    open_file,
+    uncompressed_path,
+)
+from pheval_phen2gene.post_process.post_process_results_format import read_phen2gene_result
+
+
+class TestCompressedPaths(unittest.TestCase):
+    def test_compressed_path(self):
+        self.assertEqual(compressed_path(Path("case.txt"), "gzip"), Path("case.txt.gz"))
+        self.assertEqual(compressed_path(Path("case.txt"), "zstd"), Path("case.txt.zst"))
+        self.assertEqual(compressed_path(Path("case.txt"), None), Path("case.txt"))
+
+    def test_is_compressed(self):
+        self.assertTrue(is_compressed(Path("case.gz")))
+        self.assertFalse(is_compressed(Path("case.json")))
+
+    def test_uncompressed_path(self):
+        self.assertEqual(uncompressed_path(Path("case.json.zst")), Path("case.json"))
+        self.assertEqual(uncompressed_path(Path("case.json")), Path("case.json"))
+
+
+class TestCompressFile(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.raw_result = Path(self.tmp_dir.name).joinpath("case")
+        self.raw_result.write_text(
+            "Rank\tGene\tID\tScore\tStatus\n1\tGCDH\t2639\t1.0\tSeedGene\n"
+            "2\tETFB\t2109\t0.298386\tSeedGene\n"
+        )
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_compress_file(self):
+        compressed = compress_file(self.raw_result, "gzip")
+        self.assertEqual(compressed, Path(self.tmp_dir.name).joinpath("case.gz"))
+        self.assertFalse(self.raw_result.exists())
+        with open_file(compressed) as result:
+            self.assertTrue(result.read().startswith("Rank\tGene"))
+
+    def test_read_compressed_phen2gene_result(self):
+        expected = read_phen2gene_result(self.raw_result)
+        self.assertTrue(
+            read_phen2gene_result(compress_file(self.raw_result, "gzip")).equals(expected)
+        )
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+
+import polars as pl
+
+from pheval_phen2gene.result_index import STANDARDISED, ResultIndex
+from pheval_phen2gene.run.fused import load_scorer, run_fused_pipeline, score_case
+from pheval_phen2gene.tool_specific_configuration_parser import (
+    Phen2GeneToolSpecificConfigurations,
+)
+
+
+def example_scorer(hpo_ids: List[str]) -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "Rank": [1, 2],
+            "Gene": ["GCDH", "PLXNA1"],
+            "ID": [2639, 5361],
+            "Score": [float(len(hpo_ids)), 0.5],
+            "Status": ["SeedGene", "Predicted"],
+        }
+    )
+
+
+def example_arrow_scorer(hpo_ids: List[str]):
+    return example_scorer(hpo_ids).to_arrow()
+
+
+class TestFusedPipeline(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.testdata_dir = Path(self.tmp_dir.name).joinpath("testdata")
+        self.testdata_dir.joinpath("phenopackets").mkdir(parents=True)
+        shutil.copy(
+            Path(os.path.dirname(__file__)).joinpath("input_dir/phenopacket.json"),
+            self.testdata_dir.joinpath("phenopackets"),
+        )
+        self.raw_results_dir = Path(self.tmp_dir.name).joinpath("raw_results")
+        self.raw_results_dir.mkdir()
+        self.output_dir = Path(self.tmp_dir.name).joinpath("output")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def config(
+        self, keep_raw_results: bool, result_layout: str = "flat"
+    ) -> Phen2GeneToolSpecificConfigurations:
+        return Phen2GeneToolSpecificConfigurations.parse_obj(
+            {
+                "environment": "local",
+                "phen2gene_python_executable": "phen2gene.py",
+                "post_process": {"score_order": "descending"},
+                "scorer": "tests.test_fused:example_scorer",
+                "keep_raw_results": keep_raw_results,
+                "result_layout": result_layout,
+            }
+        )
+
+    def test_load_scorer(self):
+        self.assertIs(load_scorer("tests.test_fused:example_scorer"), example_scorer)
+
+    def test_score_case_arrow(self):
+        self.assertEqual(
+            score_case(example_arrow_scorer, ["HP:0000256"]).get_column("Gene").to_list(),
+            ["GCDH", "PLXNA1"],
+        )
+
+    def test_run_fused_pipeline(self):
+        run_fused_pipeline(
+            self.config(True), self.testdata_dir, self.raw_results_dir, self.output_dir
+        )
+        result = pl.read_parquet(
+            self.output_dir.joinpath("pheval_gene_results/phenopacket-gene_result.parquet")
+        )
+        self.assertEqual(result.get_column("gene_symbol").to_list()[:2], ["GCDH", "PLXNA1"])
+        self.assertEqual(result.get_column("score").to_list()[:2], [2.0, 0.5])
+        self.assertEqual(
+            pl.read_csv(self.raw_results_dir.joinpath("phenopacket"), separator="\t").height, 2
+        )
+
+    def test_run_fused_pipeline_without_raw_results(self):
+        run_fused_pipeline(
+            self.config(False), self.testdata_dir, self.raw_results_dir, self.output_dir
+        )
+        self.assertEqual(list(self.raw_results_dir.iterdir()), [])
+        self.assertTrue(
+            self.output_dir.joinpath("pheval_gene_results/phenopacket-gene_result.parquet").exists()
+        )
+
+    def test_run_fused_pipeline_partitioned(self):
+        run_fused_pipeline(
+            self.config(True, "partitioned"),
+            self.testdata_dir,
+            self.raw_results_dir,
+            self.output_dir,
+        )
+        entry = ResultIndex(self.raw_results_dir).read()["phenopacket"]
+        self.assertEqual(entry.status, STANDARDISED)
+        self.assertTrue(self.raw_results_dir.joinpath(entry.raw_result).is_file())
+        self.assertTrue(self.output_dir.joinpath(entry.standardised_result).is_file())
@@ -0,0 +1,202 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import polars as pl
+from pheval.utils.phenopacket_utils import GeneIdentifierUpdater, create_gene_identifier_map
+
+from pheval_phen2gene.prepare.prepare_commands import (
+    CaseRecord,
+    HpoIdInterner,
+    iter_case_records,
+)
+from pheval_phen2gene.result_index import RESULT_INDEX, ResultIndex
+from pheval_phen2gene.run.incremental import (
+    CurrentIdentifiers,
+    KnowledgeBaseDiff,
+    diff_knowledge_bases,
+    find_raw_result,
+    identifiers_changed,
+    plan_incremental_rescore,
+    run_incremental_rescore,
+)
+from pheval_phen2gene.tool_specific_configuration_parser import Phen2GeneToolSpecificConfigurations
+
+
+class CountingGeneIdentifierUpdater(GeneIdentifierUpdater):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.lookups = 0
+
+    def find_identifier(self, gene_symbol: str) -> str:
+        self.lookups += 1
+        return super().find_identifier(gene_symbol)
+
+
+class TestDiffKnowledgeBases(unittest.TestCase):
+    def test_changed_term_file(self):
+        kb_diff = diff_knowledge_bases(
+            {"Knowledgebase/HP_0000256.candidate_gene_list": "a", "skewness.txt": "b"},
+            {"Knowledgebase/HP_0000256.candidate_gene_list": "c", "skewness.txt": "b"},
+        )
+        self.assertEqual(kb_diff.changed_terms, {"HP:0000256"})
+        self.assertFalse(kb_diff.global_change)
+
+    def test_added_and_removed_term_files(self):
+        kb_diff = diff_knowledge_bases(
+            {"Knowledgebase/HP_0000256.candidate_gene_list": "a"},
+            {"Knowledgebase/HP_0000486.candidate_gene_list": "a"},
+        )
+        self.assertEqual(kb_diff.changed_terms, {"HP:0000256", "HP:0000486"})
+
+    def test_changed_global_file(self):
+        kb_diff = diff_knowledge_bases({"skewness.txt": "a"}, {"skewness.txt": "b"})
+        self.assertEqual(kb_diff.changed_terms, set())
+        self.assertTrue(kb_diff.global_change)
+
+
+class TestFindRawResult(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.raw_results_dir = Path(self.tmp_dir.name)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_find_raw_result(self):
+        self.raw_results_dir.joinpath("case1").touch()
+        self.assertEqual(
+            find_raw_result(self.raw_results_dir, "case1"), self.raw_results_dir.joinpath("case1")
+        )
+
+    def test_find_compressed_raw_result(self):
+        self.raw_results_dir.joinpath("case1.gz").touch()
+        self.assertEqual(
+            find_raw_result(self.raw_results_dir, "case1"),
+            self.raw_results_dir.joinpath("case1.gz"),
+        )
+
+    def test_find_partitioned_raw_result(self):
+        self.raw_results_dir.joinpath(RESULT_INDEX).touch()
+        partition_dir = self.raw_results_dir.joinpath(ResultIndex.partition("case1"))
+        partition_dir.mkdir()
+        partition_dir.joinpath("case1").touch()
+        self.assertEqual(
+            find_raw_result(self.raw_results_dir, "case1"), partition_dir.joinpath("case1")
+        )
+
+    def test_missing_raw_result(self):
+        self.assertIsNone(find_raw_result(self.raw_results_dir, "case1"))
+
+
+class TestPlanIncrementalRescore(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.gene_identifier_updator = GeneIdentifierUpdater(
+            identifier_map=create_gene_identifier_map(), gene_identifier="ensembl_id"
+        )
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.previous_run_dir = Path(self.tmp_dir.name)
+        self.previous_run_dir.joinpath("raw_results").mkdir()
+        self.previous_run_dir.joinpath("raw_results/phenopacket").touch()
+        self.previous_run_dir.joinpath("pheval_gene_results").mkdir()
+        self.standardised_result = self.previous_run_dir.joinpath(
+            "pheval_gene_results/phenopacket-gene_result.parquet"
+        )
+        self.write_standardised_result("ENSG00000105607")
+        self.interner = HpoIdInterner()
+        self.cases = list(
+            iter_case_records(
+                Path(os.path.dirname(__file__)).joinpath("input_dir"), None, self.interner
+            )
+        )
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def write_standardised_result(self, gcdh_identifier: str, case_id: str = "phenopacket") -> None:
+        pl.DataFrame(
+            {
+                "rank": [1, 0],
+                "score": [1.0, 0.0],
+                "gene_symbol": ["GCDH", "ETFB"],
+                "gene_identifier": [gcdh_identifier, "ENSG00000000000"],
+            }
+        ).write_parquet(
+            self.previous_run_dir.joinpath(f"pheval_gene_results/{case_id}-gene_result.parquet")
+        )
+
+    def plan(self, kb_diff: KnowledgeBaseDiff):
+        return plan_incremental_rescore(
+            self.cases,
+            self.interner,
+            kb_diff,
+            self.previous_run_dir,
+            self.gene_identifier_updator,
+        )
+
+    def test_identifiers_changed(self):
+        current_identifiers = CurrentIdentifiers(self.gene_identifier_updator)
+        self.assertFalse(identifiers_changed(self.standardised_result, current_identifiers))
+        self.write_standardised_result("ENSG00000000001")
+        self.assertTrue(identifiers_changed(self.standardised_result, current_identifiers))
+
+    def test_identifiers_looked_up_once_per_gene(self):
+        updator = CountingGeneIdentifierUpdater(
+            identifier_map=self.gene_identifier_updator.identifier_map,
+            gene_identifier="ensembl_id",
+        )
+        for case_id in ["case1", "case2", "case3"]:
+            self.previous_run_dir.joinpath(f"raw_results/{case_id}").touch()
+            self.write_standardised_result("ENSG00000105607", case_id)
+        cases = [
+            CaseRecord(output_file_name=case_id, hpo_codes=self.cases[0].hpo_codes)
+            for case_id in ["case1", "case2", "case3"]
+        ]
+        plan = plan_incremental_rescore(
+            cases, self.interner, KnowledgeBaseDiff(), self.previous_run_dir, updator
+        )
+        self.assertEqual(plan.carry_over, ["case1", "case2", "case3"])
+        self.assertEqual(updator.lookups, 1)
+
+    def test_carry_over_unaffected_case(self):
+        plan = self.plan(KnowledgeBaseDiff(changed_terms={"HP:0001250"}))
+        self.assertEqual(plan.carry_over, ["phenopacket"])
+        self.assertEqual(plan.rescore, [])
+
+    def test_rescore_case_with_changed_term(self):
+        plan = self.plan(KnowledgeBaseDiff(changed_terms={"HP:0000256"}))
+        self.assertEqual(plan.rescore, ["phenopacket"])
+
+    def test_rescore_on_global_change(self):
+        plan = self.plan(KnowledgeBaseDiff(global_change=True))
+        self.assertEqual(plan.rescore, ["phenopacket"])
+
+    def test_rescore_case_without_previous_raw_result(self):
+        self.previous_run_dir.joinpath("raw_results/phenopacket").unlink()
+        plan = self.plan(KnowledgeBaseDiff())
+        self.assertEqual(plan.rescore, ["phenopacket"])
+
+    def test_repost_process_changed_identifiers(self):
+        self.write_standardised_result("ENSG00000000001")
+        plan = self.plan(KnowledgeBaseDiff())
+        self.assertEqual(plan.repost_process, ["phenopacket"])
+
+
+class TestRunIncrementalRescore(unittest.TestCase):
+    def test_reject_sweep(self):
+        config = Phen2GeneToolSpecificConfigurations.parse_obj(
+            {
+                "environment": "local",
+                "phen2gene_python_executable": "phen2gene.py",
+                "post_process": {"score_order": "descending"},
+                "sweep": [{"name": "unweighted", "weight_model": "u"}],
+            }
+        )
+        with self.assertRaises(ValueError):
+            run_incremental_rescore(
+                config, Path("input"), Path("testdata"), Path("lib"), Path("previous"), Path("out")
+            )
@@ -0,0 +1,139 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from pheval_phen2gene.prepare.normalise_hpo import (
+    HpoNormaliser,
+    build_hpo_lookup,
+    load_hpo_lookup,
+    read_hpo_lookup,
+    read_hpo_lookup_ontology,
+    write_hpo_lookup,
+)
+
+example_hpo_lookup = {
+    "HP:0000256": "HP:0000256",
+    "HP:0000486": "HP:0000486",
+    "HP:0001355": "HP:0000256",
+    "HP:0000999": "HP:0000486",
+}
+
+example_obo = """format-version: 1.2
+ontology: hp
+
+[Term]
+id: HP:0000256
+name: Macrocephaly
+alt_id: HP:0001355
+
+[Term]
+id: HP:0000486
+name: Strabismus
+
+[Term]
+id: HP:0000999
+name: obsolete replaced term
+is_obsolete: true
+replaced_by: HP:0000998
+
+[Term]
+id: HP:0000998
+name: obsolete intermediate term
+is_obsolete: true
+replaced_by: HP:0000486
+
+[Term]
+id: HP:0000997
+name: obsolete term without a replacement
+is_obsolete: true
+"""
+
+
+class TestHpoNormaliser(unittest.TestCase):
+    def setUp(self) -> None:
+        self.normaliser = HpoNormaliser(example_hpo_lookup)
+
+    def test_normalise_current_terms(self):
+        self.assertEqual(
+            self.normaliser.normalise(["HP:0000256", "HP:0000486"]), ["HP:0000256", "HP:0000486"]
+        )
+
+    def test_normalise_alternate_and_obsolete_ids(self):
+        self.assertEqual(
+            self.normaliser.normalise(["HP:0001355", "HP:0000999"]), ["HP:0000256", "HP:0000486"]
+        )
+        self.assertEqual(
+            dict(self.normaliser.replaced),
+            {("HP:0001355", "HP:0000256"): 1, ("HP:0000999", "HP:0000486"): 1},
+        )
+
+    def test_normalise_drops_unknown_ids(self):
+        self.assertEqual(self.normaliser.normalise(["HP:0000256", "HP:9999999"]), ["HP:0000256"])
+        self.assertEqual(dict(self.normaliser.dropped), {"HP:9999999": 1})
+
+    def test_normalise_skips_case_without_known_ids(self):
+        self.assertEqual(self.normaliser.normalise(["HP:9999999"], "case1"), [])
+        self.assertEqual(self.normaliser.skipped_cases, ["case1"])
+
+    def test_normalise_removes_duplicate_terms(self):
+        self.assertEqual(self.normaliser.normalise(["HP:0000256", "HP:0001355"]), ["HP:0000256"])
+
+    def test_write_report(self):
+        self.normaliser.normalise(["HP:0001355", "HP:9999999"], "case1")
+        self.normaliser.normalise(["HP:9999999"], "case2")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            report_file = Path(tmp_dir).joinpath("report.tsv")
+            self.normaliser.write_report(report_file)
+            self.assertEqual(
+                report_file.read_text().splitlines(),
+                [
+                    "hpo_id\tterm\tstatus\tcount",
+                    "HP:0001355\tHP:0000256\treplaced\t1",
+                    "HP:9999999\t\tdropped\t2",
+                    "case2\t\tskipped_case\t1",
+                ],
+            )
+
+
+class TestHpoLookup(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_file = Path(self.tmp_dir.name).joinpath("cache/hpo-lookup.tsv")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_write_read_hpo_lookup(self):
+        write_hpo_lookup(example_hpo_lookup, self.cache_file, "sqlite:obo:hp")
+        self.assertEqual(read_hpo_lookup(self.cache_file), example_hpo_lookup)
+        self.assertEqual(read_hpo_lookup_ontology(self.cache_file), "sqlite:obo:hp")
+
+    def test_load_cached_hpo_lookup(self):
+        write_hpo_lookup(example_hpo_lookup, self.cache_file, "sqlite:does-not-exist")
+        self.assertEqual(
+            load_hpo_lookup(self.cache_file, "sqlite:does-not-exist"), example_hpo_lookup
+        )
+
+    def test_rebuild_hpo_lookup_of_other_ontology(self):
+        obo_file = Path(self.tmp_dir.name).joinpath("hp.obo")
+        obo_file.write_text(example_obo)
+        write_hpo_lookup(example_hpo_lookup, self.cache_file, "sqlite:obo:hp")
+        lookup = load_hpo_lookup(self.cache_file, f"simpleobo:{obo_file}")
+        self.assertEqual(lookup["HP:0000998"], "HP:0000486")
+        self.assertEqual(read_hpo_lookup_ontology(self.cache_file), f"simpleobo:{obo_file}")
+
+    def test_build_hpo_lookup(self):
+        from oaklib import get_adapter
+
+        obo_file = Path(self.tmp_dir.name).joinpath("hp.obo")
+        obo_file.write_text(example_obo)
+        self.assertEqual(
+            build_hpo_lookup(get_adapter(f"simpleobo:{obo_file}")),
+            {
+                "HP:0000256": "HP:0000256",
+                "HP:0000486": "HP:0000486",
+                "HP:0001355": "HP:0000256",
+                "HP:0000998": "HP:0000486",
+                "HP:0000999": "HP:0000486",
+            },
+        )
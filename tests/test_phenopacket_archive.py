@@ -0,0 +1,76 @@
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+from pheval_phen2gene.phenopacket_archive import (
+    ArchivePhenopacketTruthSet,
+    archive_directory,
+    is_archive,
+    iter_phenopackets,
+    resolve_phenopacket_dir,
+    restore_archived_directory,
+)
+
+phenopacket_path = Path(os.path.dirname(__file__)).joinpath("input_dir/phenopacket.json")
+
+
+class TestIsArchive(unittest.TestCase):
+    def test_is_archive(self):
+        self.assertTrue(is_archive(Path("phenopackets.tar.gz")))
+        self.assertTrue(is_archive(Path("phenopackets.zip")))
+        self.assertFalse(is_archive(Path("phenopackets")))
+
+
+class TestPhenopacketArchive(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tar_archive = Path(self.tmp_dir.name).joinpath("phenopackets.tar.gz")
+        with tarfile.open(self.tar_archive, "w:gz") as archive:
+            archive.add(phenopacket_path, arcname="phenopackets/phenopacket.json")
+        self.zip_archive = Path(self.tmp_dir.name).joinpath("corpus.zip")
+        with zipfile.ZipFile(self.zip_archive, "w") as archive:
+            archive.write(phenopacket_path, arcname="phenopacket.json")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_resolve_phenopacket_dir(self):
+        self.assertEqual(resolve_phenopacket_dir(Path(self.tmp_dir.name)), self.tar_archive)
+
+    def test_iter_phenopackets(self):
+        for phenopacket_archive in [self.tar_archive, self.zip_archive]:
+            phenopackets = list(iter_phenopackets(phenopacket_archive))
+            self.assertEqual(len(phenopackets), 1)
+            self.assertEqual(phenopackets[0][0], "phenopacket.json")
+            self.assertEqual(
+                [hpo.type.id for hpo in phenopackets[0][1].phenotypic_features],
+                ["HP:0000256", "HP:0000486"],
+            )
+
+    def test_archive_truth_set(self):
+        truth_set = ArchivePhenopacketTruthSet(self.tar_archive)
+        self.assertEqual(list(truth_set.causative_genes.keys()), ["phenopacket"])
+        with self.assertRaises(FileNotFoundError):
+            truth_set.classified_gene("missing")
+
+    def test_archive_directory(self):
+        raw_results_dir = Path(self.tmp_dir.name).joinpath("raw_results")
+        raw_results_dir.mkdir()
+        raw_results_dir.joinpath("phenopacket").write_text("Rank\tGene\n")
+        archive_path = archive_directory(raw_results_dir)
+        self.assertFalse(raw_results_dir.joinpath("phenopacket").exists())
+        with tarfile.open(archive_path) as archive:
+            self.assertEqual(archive.getnames(), ["phenopacket"])
+
+    def test_restore_archived_directory(self):
+        raw_results_dir = Path(self.tmp_dir.name).joinpath("raw_results")
+        raw_results_dir.joinpath("ab").mkdir(parents=True)
+        raw_results_dir.joinpath("ab/phenopacket").write_text("Rank\tGene\n")
+        archive_path = archive_directory(raw_results_dir)
+        self.assertTrue(restore_archived_directory(raw_results_dir))
+        self.assertEqual(raw_results_dir.joinpath("ab/phenopacket").read_text(), "Rank\tGene\n")
+        self.assertFalse(archive_path.exists())
+        self.assertFalse(restore_archived_directory(raw_results_dir))
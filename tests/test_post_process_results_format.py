@@ -1,9 +1,20 @@
+import tempfile
 import unittest
+from pathlib import Path
 
 import polars as pl
+from pheval.post_processing.post_processing import SortOrder, _rank_results
 from pheval.utils.phenopacket_utils import GeneIdentifierUpdater, create_gene_identifier_map
 
-from pheval_phen2gene.post_process.post_process_results_format import extract_gene_results
+from pheval_phen2gene.post_process.post_process_results_format import (
+    extract_gene_results,
+    is_presorted,
+    iter_batches,
+    rank_phen2gene_result,
+    rank_phen2gene_results,
+    rank_presorted_results,
+    read_phen2gene_results,
+)
 
 example_phen2gene_result = pl.DataFrame(
     [
@@ -44,3 +55,120 @@ class TestExtractGeneResult(unittest.TestCase):
                 )
             )
         )
+
+
+class TestIsPresorted(unittest.TestCase):
+    def test_is_presorted_descending(self):
+        self.assertTrue(is_presorted(example_phen2gene_result, SortOrder.DESCENDING))
+
+    def test_is_presorted_ascending(self):
+        self.assertFalse(is_presorted(example_phen2gene_result, SortOrder.ASCENDING))
+
+    def test_is_presorted_unsorted(self):
+        self.assertFalse(is_presorted(example_phen2gene_result.reverse(), SortOrder.DESCENDING))
+
+
+class TestRankPresortedResults(unittest.TestCase):
+    def test_rank_presorted_results_ties(self):
+        results = pl.DataFrame(
+            {
+                "gene_symbol": ["A", "B", "C", "D", "E"],
+                "gene_identifier": ["1", "2", "3", "4", "5"],
+                "score": [1.0, 0.5, 0.5, 0.2, 0.1],
+            }
+        )
+        self.assertEqual(
+            rank_presorted_results(results)["rank"].to_list(),
+            _rank_results(results, SortOrder.DESCENDING)["rank"].to_list(),
+        )
+
+
+class TestRankPhen2GeneResult(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.gene_identifier_updator = GeneIdentifierUpdater(
+            identifier_map=create_gene_identifier_map(), gene_identifier="ensembl_id"
+        )
+
+    def test_rank_phen2gene_result_recompute_candidate_ranks(self):
+        ranked = rank_phen2gene_result(
+            phen2gene_result=example_phen2gene_result,
+            gene_identifier_updator=self.gene_identifier_updator,
+            sort_order=SortOrder.DESCENDING,
+            candidate_genes={"ETFA"},
+        )
+        self.assertEqual(ranked["gene_symbol"].to_list(), ["ETFA"])
+        self.assertEqual(ranked["gene_identifier"].to_list(), ["ENSG00000140374"])
+        self.assertEqual(ranked["rank"].to_list(), [1])
+
+    def test_rank_phen2gene_result_preserve_candidate_ranks(self):
+        ranked = rank_phen2gene_result(
+            phen2gene_result=example_phen2gene_result,
+            gene_identifier_updator=self.gene_identifier_updator,
+            sort_order=SortOrder.DESCENDING,
+            candidate_genes={"ETFA"},
+            preserve_candidate_ranks=True,
+        )
+        self.assertEqual(ranked.columns, ["gene_symbol", "gene_identifier", "score", "rank"])
+        self.assertEqual(ranked["rank"].to_list(), [3])
+
+
+class TestIterBatches(unittest.TestCase):
+    def test_iter_batches(self):
+        self.assertEqual(
+            list(iter_batches([Path(str(i)) for i in range(5)], 2)),
+            [[Path("0"), Path("1")], [Path("2"), Path("3")], [Path("4")]],
+        )
+
+
+class TestReadPhen2GeneResults(unittest.TestCase):
+    def test_read_phen2gene_results(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for case_id in ["case1", "case2"]:
+                example_phen2gene_result.write_csv(Path(tmp_dir).joinpath(case_id), separator="\t")
+            phen2gene_results = read_phen2gene_results(
+                [Path(tmp_dir).joinpath("case1"), Path(tmp_dir).joinpath("case2")]
+            )
+        self.assertEqual(phen2gene_results.height, 6)
+        self.assertEqual(phen2gene_results["case_id"].unique().sort().to_list(), ["case1", "case2"])
+        self.assertEqual(phen2gene_results["ID"].dtype, pl.String)
+
+
+class TestRankPhen2GeneResults(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.gene_identifier_updator = GeneIdentifierUpdater(
+            identifier_map=create_gene_identifier_map(), gene_identifier="ensembl_id"
+        )
+        cls.phen2gene_results = pl.concat(
+            [
+                example_phen2gene_result.with_columns(pl.lit("case1").alias("case_id")),
+                example_phen2gene_result.with_columns(
+                    pl.lit("case2").alias("case_id"), pl.col("Score").reverse()
+                ),
+            ]
+        )
+
+    def test_rank_phen2gene_results(self):
+        ranked = rank_phen2gene_results(
+            phen2gene_results=self.phen2gene_results,
+            gene_identifier_updator=self.gene_identifier_updator,
+            sort_order=SortOrder.DESCENDING,
+        )
+        self.assertEqual(ranked["rank"].to_list(), [1, 2, 3, 1, 2, 3])
+        self.assertEqual(
+            ranked.filter(pl.col("case_id") == "case2")["gene_symbol"].to_list(),
+            ["ETFA", "ETFB", "GCDH"],
+        )
+        self.assertEqual(ranked["gene_identifier"][0], "ENSG00000105607")
+
+    def test_rank_phen2gene_results_candidate_genes(self):
+        ranked = rank_phen2gene_results(
+            phen2gene_results=self.phen2gene_results,
+            gene_identifier_updator=self.gene_identifier_updator,
+            sort_order=SortOrder.DESCENDING,
+            candidate_genes={"case1": {"ETFA"}},
+            preserve_candidate_ranks=True,
+        )
+        self.assertEqual(ranked["case_id"].to_list(), ["case1", "case2", "case2", "case2"])
+        self.assertEqual(ranked["rank"].to_list(), [3, 1, 2, 3])
@@ -2,11 +2,15 @@ import os
 import unittest
 from pathlib import Path
 
+from pheval_phen2gene.prepare.normalise_hpo import HpoNormaliser
 from pheval_phen2gene.prepare.prepare_commands import (
+    CommandWriter,
+    HpoIdInterner,
     Phen2GeneCommandLineArguments,
     Phen2GeneDockerArguments,
     create_command_line_arguments,
     create_docker_arguments,
+    iter_case_records,
 )
 
 
@@ -84,3 +88,113 @@ class TestCreateDockerArguments(unittest.TestCase):
                 hpo_ids=["HP:0000256", "HP:0000486"],
             ),
         )
+
+
+class TestHpoIdInterner(unittest.TestCase):
+    def test_encode_decode(self):
+        interner = HpoIdInterner()
+        codes = interner.encode(["HP:0000256", "HP:0000486", "HP:0000256"])
+        self.assertEqual(list(codes), [0, 1, 0])
+        self.assertEqual(interner.decode(codes), ["HP:0000256", "HP:0000486", "HP:0000256"])
+
+    def test_decode_none(self):
+        self.assertIsNone(HpoIdInterner().decode(None))
+
+
+class TestIterCaseRecords(unittest.TestCase):
+    def test_iter_case_records_phenopacket_dir(self):
+        interner = HpoIdInterner()
+        records = list(
+            iter_case_records(
+                phenopacket_dir=Path(os.path.dirname(__file__)).joinpath("input_dir"),
+                input_dir=None,
+                interner=interner,
+            )
+        )
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].output_file_name, "phenopacket")
+        self.assertEqual(interner.decode(records[0].hpo_codes), ["HP:0000256", "HP:0000486"])
+
+    def test_iter_case_records_without_interner(self):
+        records = list(
+            iter_case_records(
+                phenopacket_dir=Path(os.path.dirname(__file__)).joinpath("input_dir"),
+                input_dir=None,
+            )
+        )
+        self.assertEqual(records[0].hpo_ids, ["HP:0000256", "HP:0000486"])
+        self.assertIsNone(records[0].hpo_codes)
+
+    def test_iter_case_records_normalised(self):
+        interner = HpoIdInterner()
+        records = list(
+            iter_case_records(
+                phenopacket_dir=Path(os.path.dirname(__file__)).joinpath("input_dir"),
+                input_dir=None,
+                interner=interner,
+                normaliser=HpoNormaliser({"HP:0000486": "HP:0000486"}),
+            )
+        )
+        self.assertEqual(interner.decode(records[0].hpo_codes), ["HP:0000486"])
+
+    def test_iter_case_records_skips_case_without_known_ids(self):
+        normaliser = HpoNormaliser({"HP:0001250": "HP:0001250"})
+        records = list(
+            iter_case_records(
+                phenopacket_dir=Path(os.path.dirname(__file__)).joinpath("input_dir"),
+                input_dir=None,
+                interner=HpoIdInterner(),
+                normaliser=normaliser,
+            )
+        )
+        self.assertEqual(records, [])
+        self.assertEqual(normaliser.skipped_cases, ["phenopacket"])
+
+
+class TestCommandWriter(unittest.TestCase):
+    def test_local_command_input_file(self):
+        self.assertEqual(
+            CommandWriter.local_command(
+                Phen2GeneCommandLineArguments(
+                    path_to_phen2gene_dir=Path("/path/to/phen2gene.py"),
+                    output_dir=Path("/path/to/output_dir"),
+                    output_file_name=Path("output_file"),
+                    input_file_path=Path("/path/to/input.txt"),
+                ),
+                data_dir=Path("/path/to/lib"),
+            ),
+            [
+                "python3",
+                str(Path("/path/to/phen2gene.py")),
+                "--file",
+                str(Path("/path/to/input.txt")),
+                "-out",
+                f"{Path('/path/to/output_dir')}{os.sep}",
+                "--name",
+                "output_file",
+                "-d",
+                str(Path("/path/to/lib")),
+            ],
+        )
+
+    def test_docker_command_hpo_ids(self):
+        self.assertEqual(
+            CommandWriter.docker_command(
+                Phen2GeneDockerArguments(
+                    output_dir=Path("/path/to/output_dir"),
+                    output_file_name=Path("output_file"),
+                    hpo_ids=["HP:0000256", "HP:0000486"],
+                )
+            ),
+            [
+                "--manual",
+                "HP:0000256",
+                "HP:0000486",
+                "-out",
+                "/phen2gene-results",
+                "--name",
+                "output_file",
+                "-d",
+                "/phen2gene-data",
+            ],
+        )
@@ -0,0 +1,61 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from pheval_phen2gene.run.resources import (
+    available_cpus,
+    docker_resource_options,
+    numa_nodes,
+    parse_cpu_list,
+    worker_cpu_set,
+)
+from pheval_phen2gene.tool_specific_configuration_parser import Resources
+
+
+class TestParseCpuList(unittest.TestCase):
+    def test_parse_cpu_list(self):
+        self.assertEqual(parse_cpu_list("0-3,8,10-11\n"), [0, 1, 2, 3, 8, 10, 11])
+
+
+class TestNumaNodes(unittest.TestCase):
+    def test_numa_nodes_without_sysfs(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.assertEqual(numa_nodes(Path(tmp_dir)), [available_cpus()])
+
+    def test_numa_nodes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            node_dir = Path(tmp_dir).joinpath("node0")
+            node_dir.mkdir()
+            node_dir.joinpath("cpulist").write_text(f"0-{max(available_cpus())}\n")
+            self.assertEqual(numa_nodes(Path(tmp_dir)), [available_cpus()])
+
+
+class TestWorkerCpuSet(unittest.TestCase):
+    nodes = [[0, 1, 2, 3], [4, 5, 6, 7]]
+
+    def test_worker_cpu_set_unpinned(self):
+        self.assertIsNone(worker_cpu_set(0, Resources(), self.nodes))
+
+    def test_worker_cpu_set(self):
+        resources = Resources(cpus_per_worker=2)
+        self.assertEqual(
+            [worker_cpu_set(slot, resources, self.nodes) for slot in range(5)],
+            [[0, 1], [2, 3], [4, 5], [6, 7], [0, 1]],
+        )
+
+    def test_worker_cpu_set_numa_spread(self):
+        resources = Resources(cpus_per_worker=2, numa_spread=True)
+        self.assertEqual(
+            [worker_cpu_set(slot, resources, self.nodes) for slot in range(4)],
+            [[0, 1], [4, 5], [2, 3], [6, 7]],
+        )
+
+
+class TestDockerResourceOptions(unittest.TestCase):
+    def test_docker_resource_options(self):
+        options = docker_resource_options(0, Resources(cpus_per_worker=1, memory_limit_mb=2048))
+        self.assertEqual(options["mem_limit"], "2048m")
+        self.assertEqual(options["cpuset_cpus"], str(available_cpus()[0]))
+
+    def test_docker_resource_options_unlimited(self):
+        self.assertEqual(docker_resource_options(0, Resources()), {})
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from pheval_phen2gene.prepare.prepare_commands import prepare_commands
+from pheval_phen2gene.result_index import (
+    COMPLETE,
+    FAILED,
+    PENDING,
+    IndexEntry,
+    ResultIndex,
+    update_result_statuses,
+)
+
+
+class TestResultIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.results_dir = Path(self.tmp_dir.name).joinpath("raw_results")
+        self.result_index = ResultIndex(self.results_dir)
+
+    def tearDown(self) -> None:
+        self.result_index.close()
+        self.tmp_dir.cleanup()
+
+    def test_partition(self):
+        self.assertEqual(ResultIndex.partition("case1"), ResultIndex.partition("case1"))
+        self.assertEqual(len(ResultIndex.partition("case1")), 2)
+
+    def test_add_pending(self):
+        partition_dir = self.result_index.add_pending("case1")
+        self.assertTrue(partition_dir.is_dir())
+        self.assertEqual(partition_dir.parent, self.results_dir)
+        self.assertEqual(
+            self.result_index.read()["case1"],
+            IndexEntry("case1", f"{partition_dir.name}/case1", "", PENDING),
+        )
+
+    def test_read_latest_entry(self):
+        self.result_index.add(IndexEntry("case1", "ab/case1", "", PENDING))
+        self.result_index.add(IndexEntry("case1", "ab/case1", "", COMPLETE))
+        self.assertEqual(self.result_index.read()["case1"].status, COMPLETE)
+
+    def test_update_result_statuses(self):
+        self.result_index.add_pending("case1")
+        self.result_index.add_pending("case2")
+        self.result_index.raw_result("case1").write_text("Rank\tGene\tID\tScore\tStatus\n")
+        update_result_statuses(self.result_index, "gzip")
+        entries = self.result_index.read()
+        self.assertEqual(entries["case1"].status, COMPLETE)
+        self.assertTrue(entries["case1"].raw_result.endswith("case1.gz"))
+        self.assertTrue(self.results_dir.joinpath(entries["case1"].raw_result).is_file())
+        self.assertEqual(entries["case2"].status, FAILED)
+
+
+class TestPrepareCommandsPartitioned(unittest.TestCase):
+    def test_prepare_commands_partitioned(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results_dir = Path(tmp_dir).joinpath("raw_results")
+            prepare_commands(
+                environment="local",
+                file_prefix="corpus",
+                output_dir=Path(tmp_dir),
+                results_dir=results_dir,
+                data_dir=Path("lib"),
+                phenopacket_dir=Path(os.path.dirname(__file__)).joinpath("input_dir"),
+                path_to_phen2gene_dir=Path("phen2gene.py"),
+                result_layout="partitioned",
+            )
+            entry = ResultIndex(results_dir).read()["phenopacket"]
+            self.assertEqual(entry.status, PENDING)
+            partition_dir = results_dir.joinpath(ResultIndex.partition("phenopacket"))
+            self.assertTrue(partition_dir.is_dir())
+            self.assertIn(
+                f"-out {partition_dir}{os.sep} ",
+                Path(tmp_dir).joinpath("corpus-phen2gene-batch.txt").read_text(),
+            )
@@ -0,0 +1,49 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from pheval_phen2gene.file_io import open_file
+from pheval_phen2gene.run.run import command_raw_result, run_phen2gene_local
+
+example_phen2gene = """import pathlib, sys
+out, name = sys.argv[sys.argv.index("-out") + 1], sys.argv[sys.argv.index("--name") + 1]
+pathlib.Path(out, name).write_text("Rank\\tGene\\n")
+"""
+
+
+class TestCommandRawResult(unittest.TestCase):
+    def test_local_command_raw_result(self):
+        self.assertEqual(
+            command_raw_result(["python3", "phen2gene.py", "-out", "results/", "--name", "case1"]),
+            Path("results/case1"),
+        )
+
+    def test_docker_command_raw_result(self):
+        self.assertEqual(
+            command_raw_result(
+                ["--manual", "HP:0000256", "-out", "/phen2gene-results/ab", "--name", "case1"],
+                Path("raw_results"),
+            ),
+            Path("raw_results/ab/case1"),
+        )
+
+
+class TestRunPhen2GeneLocal(unittest.TestCase):
+    def test_compress_each_raw_result(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            phen2gene = tmp_path.joinpath("phen2gene.py")
+            phen2gene.write_text(example_phen2gene)
+            raw_results_dir = tmp_path.joinpath("raw_results")
+            raw_results_dir.mkdir()
+            with open_file(tmp_path.joinpath("corpus-phen2gene-batch.txt.gz"), "wt") as batch:
+                for case_id in ["case1", "case2"]:
+                    batch.write(
+                        f"{sys.executable} {phen2gene} --manual HP:0000256 "
+                        f"-out {raw_results_dir}/ --name {case_id}\n"
+                    )
+            run_phen2gene_local(tmp_path.joinpath("corpus"), tmp_path, compression="gzip")
+            self.assertEqual(
+                sorted(path.name for path in raw_results_dir.iterdir()), ["case1.gz", "case2.gz"]
+            )
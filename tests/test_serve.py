@@ -0,0 +1,104 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import polars as pl
+from pheval.post_processing.post_processing import SortOrder
+from pheval.utils.phenopacket_utils import GeneIdentifierUpdater, create_gene_identifier_map
+
+from pheval_phen2gene.run.serve import (
+    MicroBatcher,
+    create_server,
+    load_test,
+    percentile,
+    request_score,
+)
+
+scored: List[List[str]] = []
+
+
+def example_scorer(hpo_ids: List[str]) -> pl.DataFrame:
+    if "HP:9999999" in hpo_ids:
+        raise ValueError("unknown term")
+    scored.append(hpo_ids)
+    return pl.DataFrame(
+        {
+            "Rank": [1, 2],
+            "Gene": ["GCDH", "ETFB"],
+            "ID": [2639, 2109],
+            "Score": [float(len(hpo_ids)), 0.5],
+            "Status": ["SeedGene", "SeedGene"],
+        }
+    )
+
+
+class TestMicroBatcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.gene_identifier_updator = GeneIdentifierUpdater(
+            identifier_map=create_gene_identifier_map(), gene_identifier="ensembl_id"
+        )
+
+    def setUp(self) -> None:
+        scored.clear()
+        self.batcher = MicroBatcher(
+            example_scorer, self.gene_identifier_updator, SortOrder.DESCENDING, max_wait_seconds=0.1
+        )
+
+    def tearDown(self) -> None:
+        self.batcher.close()
+
+    def test_score(self):
+        result = self.batcher.score(["HP:0000256", "HP:0000486"])
+        self.assertEqual(result.columns, ["rank", "score", "gene_symbol", "gene_identifier"])
+        self.assertEqual(result["gene_identifier"][0], "ENSG00000105607")
+        self.assertEqual(result["score"].to_list(), [2.0, 0.5])
+
+    def test_score_batch_scores_identical_requests_once(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(self.batcher.score, [["HP:0000256"]] * 4))
+        self.assertTrue(all(result.equals(results[0]) for result in results))
+        self.assertLess(len(scored), 4)
+
+    def test_score_error(self):
+        with self.assertRaises(ValueError):
+            self.batcher.score(["HP:9999999"])
+        self.assertEqual(self.batcher.score(["HP:0000256"]).height, 2)
+
+
+class TestScoringServer(unittest.TestCase):
+    def test_request_score(self):
+        batcher = MicroBatcher(
+            example_scorer,
+            GeneIdentifierUpdater(
+                identifier_map=create_gene_identifier_map(), gene_identifier="ensembl_id"
+            ),
+            SortOrder.DESCENDING,
+        )
+        server = create_server(batcher, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            response = request_score(["HP:0000256"], port=server.server_port)
+        finally:
+            server.shutdown()
+            server.server_close()
+            batcher.close()
+        self.assertEqual(response["gene_results"][0]["gene_symbol"], "GCDH")
+        self.assertEqual(response["gene_results"][0]["rank"], 1)
+
+
+class TestLoadTest(unittest.TestCase):
+    def test_percentile(self):
+        self.assertEqual(percentile([float(i) for i in range(1, 101)], 0.99), 99.0)
+        self.assertEqual(percentile([float(i) for i in range(1, 101)], 0.5), 50.0)
+
+    def test_load_test(self):
+        report = load_test(lambda hpo_ids: {}, [["HP:0000256"]], requests=20, concurrency=4)
+        self.assertEqual(report.requests, 20)
+        self.assertEqual(report.failed, 0)
+        self.assertGreater(report.throughput, 0)
+
+    def test_load_test_empty_corpus(self):
+        with self.assertRaises(ValueError):
+            load_test(lambda hpo_ids: {}, [], requests=20, concurrency=4)
@@ -0,0 +1,79 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from pheval_phen2gene.run.stage_data import (
+    COMPLETE_MARKER,
+    data_dir_fingerprint,
+    stage_data_dir,
+    use_staged_data_dir,
+)
+from pheval_phen2gene.tool_specific_configuration_parser import Staging
+
+
+class TestStageDataDir(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = Path(self.tmp_dir.name).joinpath("lib")
+        self.data_dir.joinpath("Knowledgebase").mkdir(parents=True)
+        self.data_dir.joinpath("Knowledgebase/HP_0000256.candidate_gene_list").write_text("GCDH\n")
+        self.staging = Staging(staging_dir=Path(self.tmp_dir.name).joinpath("staging"))
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_stage_data_dir(self):
+        staged_data_dir = stage_data_dir(self.data_dir, self.staging)
+        self.assertTrue(staged_data_dir.joinpath(COMPLETE_MARKER).exists())
+        self.assertEqual(
+            staged_data_dir.joinpath("Knowledgebase/HP_0000256.candidate_gene_list").read_text(),
+            "GCDH\n",
+        )
+
+    def test_stage_data_dir_reused(self):
+        self.assertEqual(
+            stage_data_dir(self.data_dir, self.staging),
+            stage_data_dir(self.data_dir, self.staging),
+        )
+
+    def test_stage_data_dir_keeps_other_versions(self):
+        other_data_dir = stage_data_dir(self.data_dir, self.staging)
+        self.data_dir.joinpath("weights").write_text("1.0\n")
+        stage_data_dir(self.data_dir, self.staging)
+        self.assertTrue(other_data_dir.exists())
+
+    def test_stage_data_dir_removes_stale(self):
+        staging = Staging(staging_dir=self.staging.staging_dir, cleanup="stale")
+        stale_data_dir = stage_data_dir(self.data_dir, staging)
+        self.data_dir.joinpath("weights").write_text("1.0\n")
+        staged_data_dir = stage_data_dir(self.data_dir, staging)
+        self.assertNotEqual(stale_data_dir, staged_data_dir)
+        self.assertFalse(stale_data_dir.exists())
+
+    def test_stage_data_dir_keeps_stale_in_use(self):
+        staging = Staging(staging_dir=self.staging.staging_dir, cleanup="stale")
+        with use_staged_data_dir(self.data_dir, self.staging) as stale_data_dir:
+            self.data_dir.joinpath("weights").write_text("1.0\n")
+            stage_data_dir(self.data_dir, staging)
+            self.assertTrue(stale_data_dir.exists())
+
+    def test_use_staged_data_dir_after_run(self):
+        staging = Staging(staging_dir=self.staging.staging_dir, cleanup="after_run")
+        with self.assertRaises(RuntimeError):
+            with use_staged_data_dir(self.data_dir, staging) as staged_data_dir:
+                self.assertTrue(staged_data_dir.joinpath(COMPLETE_MARKER).exists())
+                raise RuntimeError("failed run")
+        self.assertFalse(staged_data_dir.exists())
+
+    def test_use_staged_data_dir_after_run_keeps_shared_copy(self):
+        staging = Staging(staging_dir=self.staging.staging_dir, cleanup="after_run")
+        with use_staged_data_dir(self.data_dir, staging) as staged_data_dir:
+            with use_staged_data_dir(self.data_dir, staging):
+                pass
+            self.assertTrue(staged_data_dir.joinpath(COMPLETE_MARKER).exists())
+        self.assertFalse(staged_data_dir.exists())
+
+    def test_data_dir_fingerprint(self):
+        fingerprint = data_dir_fingerprint(self.data_dir)
+        self.data_dir.joinpath("weights").write_text("1.0\n")
+        self.assertNotEqual(fingerprint, data_dir_fingerprint(self.data_dir))
@@ -0,0 +1,253 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from typing import List
+
+from pheval_phen2gene.prepare.prepare_commands import (
+    CommandWriter,
+    HpoIdInterner,
+    iter_case_records,
+)
+from pheval_phen2gene.run.parallel import (
+    ATTEMPTS_DIR,
+    Cancellation,
+    Phen2GeneJob,
+    RuntimeTracker,
+    compressing_job_runner,
+    retarget_job,
+    run_jobs,
+    run_local_job,
+)
+from pheval_phen2gene.run.sweep import iter_sweep_jobs, write_case_job
+from pheval_phen2gene.tool_specific_configuration_parser import (
+    Phen2GeneToolSpecificConfigurations,
+    Speculation,
+)
+
+config = Phen2GeneToolSpecificConfigurations.parse_obj(
+    {
+        "environment": "local",
+        "phen2gene_python_executable": "phen2gene.py",
+        "post_process": {"score_order": "descending"},
+        "sweep": [
+            {"name": "skewness", "weight_model": "sk"},
+            {"name": "unweighted", "weight_model": "u"},
+        ],
+    }
+)
+
+
+class TestIterSweepJobs(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.interner = HpoIdInterner()
+        self.cases = list(
+            iter_case_records(
+                Path(os.path.dirname(__file__)).joinpath("input_dir"), None, self.interner
+            )
+        )
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_iter_sweep_jobs(self):
+        jobs = list(
+            iter_sweep_jobs(
+                config=config,
+                cases=self.cases,
+                interner=self.interner,
+                path_to_phen2gene_dir=Path("phen2gene.py"),
+                data_dir=Path("lib"),
+                tool_input_commands_dir=Path(self.tmp_dir.name),
+                file_prefix="corpus",
+                raw_results_dir=Path(self.tmp_dir.name).joinpath("raw_results"),
+            )
+        )
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual([job.command[-2:] for job in jobs], [["-w", "sk"], ["-w", "u"]])
+        self.assertEqual(jobs[1].output_dir.name, "unweighted")
+        self.assertEqual(jobs[0].hpo_count, 2)
+        self.assertTrue(
+            Path(self.tmp_dir.name).joinpath("corpus-skewness-phen2gene-batch.txt").exists()
+        )
+
+    def test_write_docker_case_job(self):
+        batch_file = Path(self.tmp_dir.name).joinpath("batch.txt")
+        command_writer = CommandWriter(batch_file)
+        job = write_case_job(
+            config=Phen2GeneToolSpecificConfigurations.parse_obj(
+                {
+                    "environment": "docker",
+                    "phen2gene_python_executable": "phen2gene.py",
+                    "post_process": {"score_order": "descending"},
+                }
+            ),
+            case_id="case",
+            hpo_ids=["HP:0000256"],
+            output_dir=Path(self.tmp_dir.name),
+            path_to_phen2gene_dir=Path("phen2gene.py"),
+            data_dir=Path("lib"),
+            command_writer=command_writer,
+        )
+        command_writer.close()
+        self.assertEqual(job.command[:4], ["--manual", "HP:0000256", "-out", "/phen2gene-results"])
+        self.assertEqual(job.output_dir, Path(self.tmp_dir.name))
+        self.assertIn("/phen2gene-data", batch_file.read_text())
+
+
+speculation = Speculation(
+    slowdown=2, min_samples=3, min_runtime_seconds=0.05, check_interval_seconds=0.01
+)
+
+
+class TestRunJobs(unittest.TestCase):
+    def test_run_jobs(self):
+        jobs = [
+            Phen2GeneJob(case_id=str(i), hpo_count=1, command=[], output_dir=Path("."))
+            for i in range(10)
+        ]
+        self.assertEqual(run_jobs(jobs, lambda job, slot: int(job.case_id) % 2, max_workers=3), 5)
+
+    def speculative_jobs(self, output_dir: Path, command: List[str]) -> List[Phen2GeneJob]:
+        return [
+            Phen2GeneJob(
+                case_id=case_id,
+                hpo_count=2,
+                command=command + ["-out", f"{output_dir}{os.sep}", "--name", case_id],
+                output_dir=output_dir,
+            )
+            for case_id in ["1", "2", "3", "4", "slow"]
+        ]
+
+    def test_run_jobs_speculatively(self):
+        cancelled = threading.Event()
+        attempts = []
+
+        def run_job(job: Phen2GeneJob, worker_slot: int, cancellation: Cancellation) -> int:
+            attempts.append(job.case_id)
+            if job.case_id == "slow" and attempts.count("slow") == 1:
+                # The straggler never returns unless it is cancelled.
+                cancellation.register(cancelled.set)
+                cancelled.wait(60)
+                return -9
+            job.output_dir.joinpath(job.case_id).write_text("speculative")
+            return 0
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_dir = Path(tmp_dir).joinpath("results")
+            output_dir.mkdir()
+            start = time.monotonic()
+            self.assertEqual(
+                run_jobs(self.speculative_jobs(output_dir, []), run_job, 2, speculation), 0
+            )
+            self.assertLess(time.monotonic() - start, 10)
+            self.assertTrue(cancelled.is_set())
+            self.assertEqual(attempts.count("slow"), 2)
+            self.assertEqual(output_dir.joinpath("slow").read_text(), "speculative")
+            self.assertEqual(
+                sorted(path.name for path in output_dir.iterdir()), ["1", "2", "3", "4", "slow"]
+            )
+            self.assertEqual(list(Path(tmp_dir, ATTEMPTS_DIR).iterdir()), [])
+
+    def test_run_local_jobs_speculatively_kills_straggler(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_dir = Path(tmp_dir).joinpath("results")
+            output_dir.mkdir()
+            started = Path(tmp_dir).joinpath("started")
+            started.mkdir()
+            # The first attempt of the slow case hangs, every other attempt writes its result.
+            script = (
+                "import sys, time, pathlib\n"
+                "out, name = sys.argv[sys.argv.index('-out') + 1], sys.argv[-1]\n"
+                f"marker = pathlib.Path({str(started)!r}, name)\n"
+                "if name == 'slow' and not marker.exists():\n"
+                "    marker.touch()\n"
+                "    time.sleep(600)\n"
+                "pathlib.Path(out, name).write_text('result')\n"
+            )
+            start = time.monotonic()
+            self.assertEqual(
+                run_jobs(
+                    self.speculative_jobs(output_dir, [sys.executable, "-c", script]),
+                    run_local_job,
+                    2,
+                    speculation,
+                ),
+                0,
+            )
+            self.assertLess(time.monotonic() - start, 30)
+            self.assertEqual(
+                sorted(path.name for path in output_dir.iterdir()), ["1", "2", "3", "4", "slow"]
+            )
+            self.assertEqual(list(Path(tmp_dir, ATTEMPTS_DIR).iterdir()), [])
+
+    def test_run_jobs_speculatively_failed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            jobs = [
+                Phen2GeneJob(
+                    case_id=str(i),
+                    hpo_count=1,
+                    command=[],
+                    output_dir=Path(tmp_dir).joinpath("results"),
+                )
+                for i in range(10)
+            ]
+            self.assertEqual(
+                run_jobs(
+                    jobs, lambda job, slot, cancellation: int(job.case_id) % 2, 3, Speculation()
+                ),
+                5,
+            )
+
+
+class TestRuntimeTracker(unittest.TestCase):
+    def test_is_straggler(self):
+        tracker = RuntimeTracker(Speculation(slowdown=3, min_samples=2, min_runtime_seconds=1))
+        tracker.record(hpo_count=4, runtime=2.0)
+        self.assertFalse(tracker.is_straggler(hpo_count=4, elapsed=10.0))
+        tracker.record(hpo_count=5, runtime=4.0)
+        self.assertTrue(tracker.is_straggler(hpo_count=4, elapsed=10.0))
+        self.assertFalse(tracker.is_straggler(hpo_count=4, elapsed=8.0))
+        self.assertFalse(tracker.is_straggler(hpo_count=8, elapsed=10.0))
+
+    def test_min_runtime(self):
+        tracker = RuntimeTracker(Speculation(slowdown=1, min_samples=1, min_runtime_seconds=5))
+        tracker.record(hpo_count=2, runtime=0.1)
+        self.assertFalse(tracker.is_straggler(hpo_count=2, elapsed=1.0))
+
+
+class TestCompressingJobRunner(unittest.TestCase):
+    def test_compress_succeeded_jobs(self):
+        def run_job(job: Phen2GeneJob, worker_slot: int, cancellation: Cancellation) -> int:
+            job.output_dir.joinpath(job.case_id).write_text("Rank\tGene\n")
+            return 0 if job.case_id == "succeeded" else 1
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_dir = Path(tmp_dir)
+            run_compressed_job = compressing_job_runner(run_job, "gzip")
+            for case_id in ["succeeded", "failed"]:
+                run_compressed_job(
+                    Phen2GeneJob(case_id=case_id, hpo_count=1, command=[], output_dir=output_dir),
+                    0,
+                )
+            self.assertEqual(
+                sorted(path.name for path in output_dir.iterdir()), ["failed", "succeeded.gz"]
+            )
+
+
+class TestRetargetJob(unittest.TestCase):
+    def test_retarget_job(self):
+        job = Phen2GeneJob(
+            case_id="case1",
+            hpo_count=1,
+            command=["python3", "phen2gene.py", "-out", f"{Path('results')}{os.sep}"],
+            output_dir=Path("results"),
+        )
+        retargeted = retarget_job(job, Path("results/.attempt"))
+        self.assertEqual(retargeted.command[-1], f"{Path('results/.attempt')}{os.sep}")
+        self.assertEqual(retargeted.output_dir, Path("results/.attempt"))
+        self.assertEqual(job.output_dir, Path("results"))
@@ -0,0 +1,77 @@
+import unittest
+
+from pydantic import ValidationError
+
+from pheval_phen2gene.tool_specific_configuration_parser import (
+    Phen2GeneToolSpecificConfigurations,
+    Resources,
+    Staging,
+)
+
+
+def parse_config(**options) -> Phen2GeneToolSpecificConfigurations:
+    return Phen2GeneToolSpecificConfigurations.parse_obj(
+        {
+            "environment": "local",
+            "phen2gene_python_executable": "phen2gene.py",
+            "post_process": {"score_order": "descending"},
+            **options,
+        }
+    )
+
+
+class TestPhen2GeneToolSpecificConfigurations(unittest.TestCase):
+    def test_compression(self):
+        self.assertEqual(parse_config(compression="zstd").compression, "zstd")
+        self.assertIsNone(parse_config().compression)
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValidationError):
+            parse_config(compression="bzip2")
+
+    def test_result_layout(self):
+        self.assertEqual(parse_config().result_layout, "flat")
+        self.assertEqual(parse_config(result_layout="partitioned").result_layout, "partitioned")
+
+    def test_unknown_result_layout(self):
+        with self.assertRaises(ValidationError):
+            parse_config(result_layout="partition")
+
+    def test_sweep(self):
+        config = parse_config(sweep=[{"name": "skewness"}, {"name": "unweighted"}])
+        self.assertEqual(
+            [parameter_set.name for parameter_set in config.sweep], ["skewness", "unweighted"]
+        )
+
+    def test_duplicate_parameter_set_names(self):
+        with self.assertRaises(ValidationError):
+            parse_config(sweep=[{"name": "skewness"}, {"name": "skewness"}])
+
+    def test_unsafe_parameter_set_names(self):
+        for name in ["", "..", "../skewness", "sweeps/skewness"]:
+            with self.assertRaises(ValidationError):
+                parse_config(sweep=[{"name": name}])
+
+    def test_scorer_and_sweep(self):
+        with self.assertRaises(ValidationError):
+            parse_config(scorer="scoring:score_hpo_ids", sweep=[{"name": "skewness"}])
+
+
+class TestStaging(unittest.TestCase):
+    def test_default_cleanup(self):
+        self.assertEqual(Staging(staging_dir="/dev/shm/phen2gene").cleanup, "never")
+
+    def test_unknown_cleanup(self):
+        with self.assertRaises(ValidationError):
+            Staging(staging_dir="/dev/shm/phen2gene", cleanup="always")
+
+
+class TestResources(unittest.TestCase):
+    def test_io_priority(self):
+        for io_priority in ["idle", "best-effort:7", "realtime:0"]:
+            self.assertEqual(Resources(io_priority=io_priority).io_priority, io_priority)
+
+    def test_invalid_io_priority(self):
+        for io_priority in ["low", "best_effort:7", "best-effort:8", "best-effort:"]:
+            with self.assertRaises(ValidationError):
+                Resources(io_priority=io_priority)
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from pheval_phen2gene.run.work_queue import WorkQueue, run_worker
+
+
+class TestWorkQueue(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.queue = WorkQueue(Path(self.tmp_dir.name), lease_seconds=60)
+        self.queue.enqueue("case-1", "python3 phen2gene.py --manual HP:0000256")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_claim(self):
+        task = self.queue.claim("worker-1")
+        self.assertEqual(task.task_id, "case-1")
+        self.assertEqual(task.command, "python3 phen2gene.py --manual HP:0000256")
+        self.assertIsNone(self.queue.claim("worker-2"))
+
+    def test_complete(self):
+        task = self.queue.claim("worker-1")
+        self.assertTrue(self.queue.complete(task, succeeded=True))
+        self.assertTrue(self.queue.done_dir.joinpath("case-1").exists())
+        self.assertFalse(self.queue.has_claimed())
+
+    def test_requeue_expired(self):
+        task = self.queue.claim("worker-1")
+        os.utime(task.lease_path, (0, 0))
+        self.queue.lease_seconds = 0
+        time.sleep(0.01)
+        self.assertEqual(self.queue.requeue_expired(), 1)
+        self.assertFalse(self.queue.heartbeat(task))
+        self.assertFalse(self.queue.complete(task, succeeded=True))
+        self.assertEqual(self.queue.claim("worker-2").task_id, "case-1")
+
+    def test_run_worker(self):
+        self.queue.enqueue("case-2", "python3 phen2gene.py --manual HP:0000486")
+        commands = []
+        completed = run_worker(
+            self.queue, "worker-1", run_command=lambda c: commands.append(c) or 0
+        )
+        self.assertEqual(completed, 2)
+        self.assertEqual(len(commands), 2)
+        self.assertFalse(self.queue.has_claimed())
+
+    def test_run_worker_compresses_raw_results(self):
+        raw_results_dir = Path(self.tmp_dir.name).joinpath("raw_results")
+        raw_results_dir.mkdir()
+        queue = WorkQueue(Path(self.tmp_dir.name).joinpath("queue"), lease_seconds=60)
+        queue.enqueue("case-1", f"python3 phen2gene.py -out {raw_results_dir}/ --name case1")
+
+        def run_command(command: str) -> int:
+            raw_results_dir.joinpath("case1").write_text("Rank\tGene\n")
+            return 0
+
+        run_worker(queue, "worker-1", run_command=run_command, compression="gzip")
+        self.assertEqual([path.name for path in raw_results_dir.iterdir()], ["case1.gz"])
+
+    def test_reject_lease_separator_in_worker_id(self):
+        with self.assertRaises(ValueError):
+            self.queue.claim("user@host")
+        self.assertFalse(self.queue.has_claimed())